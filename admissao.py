@@ -0,0 +1,92 @@
+# Controle de admissão da API: limites de taxa (baldes de tokens por usuário e global) e comportas por classe
+# de rota (auth, leitura, escrita) com fila limitada. Sob sobrecarga o servidor recusa rápido (429/503 com
+# Retry-After) em vez de deixar todo mundo esperar até o timeout do cliente.
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+
+
+class Recusada(Exception):
+    def __init__(self, status: int, motivo: str, retry_after: float):
+        super().__init__(motivo)
+        self.status = status
+        self.motivo = motivo
+        self.retry_after = max(1, math.ceil(retry_after)) # Retry-After só aceita segundos inteiros
+
+
+class BaldeTokens:
+    # taxa: tokens repostos por segundo; capacidade: rajada máxima
+    def __init__(self, taxa: float, capacidade: float):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.atualizado = time.monotonic()
+
+    # consome um token; devolve 0 se conseguiu ou quantos segundos faltam para o próximo
+    def consumir(self) -> float:
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.taxa
+
+
+class LimitadorTaxa:
+    # um balde por chave (usuário ou IP), mais um global; guarda no máximo max_chaves baldes (os menos usados saem)
+    def __init__(self, taxa_chave: float, rajada_chave: float, taxa_global: float, rajada_global: float, max_chaves: int = 10000):
+        self.taxa_chave = taxa_chave
+        self.rajada_chave = rajada_chave
+        self.global_ = BaldeTokens(taxa_global, rajada_global)
+        self.baldes = OrderedDict()
+        self.max_chaves = max_chaves
+
+    def verificar(self, chave: str):
+        balde = self.baldes.get(chave)
+        if balde is None:
+            balde = self.baldes[chave] = BaldeTokens(self.taxa_chave, self.rajada_chave)
+            if len(self.baldes) > self.max_chaves:
+                self.baldes.popitem(last=False)
+        else:
+            self.baldes.move_to_end(chave)
+        espera = balde.consumir()
+        if espera:
+            raise Recusada(429, "limite_usuario", espera)
+        espera = self.global_.consumir()
+        if espera:
+            raise Recusada(429, "limite_global", espera)
+
+
+class Comporta:
+    # no máximo `simultaneas` requisições dentro e `fila` esperando; quem não cabe na fila ou espera mais
+    # que `espera_maxima` segundos é recusado com 503
+    def __init__(self, nome: str, simultaneas: int, fila: int, espera_maxima: float):
+        self.nome = nome
+        self.simultaneas = simultaneas
+        self.fila = fila
+        self.espera_maxima = espera_maxima
+        self.semaforo = asyncio.Semaphore(simultaneas)
+        self.em_uso = 0
+        self.aguardando = 0
+
+    async def entrar(self):
+        if self.semaforo.locked():
+            if self.aguardando >= self.fila:
+                raise Recusada(503, "fila_cheia", self.espera_maxima)
+            self.aguardando += 1
+            try:
+                await asyncio.wait_for(self.semaforo.acquire(), self.espera_maxima)
+            except asyncio.TimeoutError:
+                raise Recusada(503, "espera_esgotada", self.espera_maxima)
+            finally:
+                self.aguardando -= 1
+        else:
+            await self.semaforo.acquire()
+        self.em_uso += 1
+
+    def sair(self):
+        self.em_uso -= 1
+        self.semaforo.release()
@@ -0,0 +1,144 @@
+# Benchmark da interface (Tkinter) do cliente, sem servidor
+#
+# Uso:
+#   python benchmark_cliente.py                       # 1k, 10k e 100k linhas
+#   python benchmark_cliente.py --tamanhos 1000 50000 --repeticoes 5 --saida cliente.json
+#
+# Monta a tela de alunos com caches sintéticos e mede os caminhos quentes da interface:
+# preencher_tabela, filtrar, _executar_callback_com_selecao, atualizar_combos e a troca de página,
+# além da memória ocupada pelos caches (linhas compactas + índices) e do tempo até a primeira tela
+# (do import do sistema.py até a tela de login desenhada). As requisições não saem (não há servidor), mas são
+# contadas: a coluna "req." diz quantas cada caminho dispararia.
+# Em Linux sem DISPLAY, sobe um Xvfb (display virtual) só para a medição.
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+XVFB_DISPLAY = ":99"
+
+
+# sobe o Xvfb quando não há display (servidores de CI); devolve o processo para encerrar no fim
+def garantir_display():
+    if os.name == "nt" or os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        raise SystemExit("Sem DISPLAY e sem Xvfb instalado (apt install xvfb)")
+    processo = subprocess.Popen(["Xvfb", XVFB_DISPLAY, "-screen", "0", "1280x800x24", "-nolisten", "tcp"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = XVFB_DISPLAY
+    time.sleep(0.5) # tempo para o Xvfb aceitar conexões
+    return processo
+
+
+# caches no mesmo formato que o servidor devolve; ~1 curso para cada 50 alunos e 4 turmas por curso
+def gerar_caches(total_alunos: int):
+    total_cursos = max(1, total_alunos // 50)
+    cursos = [{"id": i, "curso": f"Curso {i:05d}", "sigla": f"C{i:05d}", "area": "Tecnologia",
+               "descricao": "Descrição longa do curso " * 5, "versao": i} for i in range(total_cursos)]
+    turmas = [{"id": i, "turma": f"T{i:06d}", "curso_sigla": cursos[i // 4]["sigla"], "descricao": "Turma", "versao": i}
+              for i in range(total_cursos * 4)]
+    alunos = [{"id": i, "aluno": f"Aluno {i:07d}", "ra": f"RA{i:07d}", "email": f"aluno{i}@escola.local",
+               "curso_sigla": turmas[i % len(turmas)]["curso_sigla"], "turma": turmas[i % len(turmas)]["turma"], "versao": i}
+              for i in range(total_alunos)]
+    return cursos, turmas, alunos
+
+
+# requisicoes: lista onde o http_em_thread falso anota cada requisição; o resultado traz quantas saíram por repetição
+def medir(funcao, repeticoes: int, root, requisicoes: list):
+    tempos = []
+    antes = len(requisicoes)
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        root.update_idletasks() # inclui o desenho que o Tk faria no próximo ciclo
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {"mediana": statistics.median(tempos), "min": min(tempos), "max": max(tempos),
+            "requisicoes": (len(requisicoes) - antes) / repeticoes}
+
+
+def rodar(tamanhos, repeticoes):
+    import tkinter as tk
+    from sistema import SistemaAcademico
+
+    root = tk.Tk()
+    root.geometry("1280x800")
+    app = SistemaAcademico(root, conectar=False)
+    root.update() # roda o after_idle que registra a primeira tela
+    resultados = {"primeira_tela_ms": round(app.tempo_primeira_tela * 1000, 1)}
+    print(f"Primeira tela: {resultados['primeira_tela_ms']:.0f} ms")
+    requisicoes = [] # sem servidor: nenhuma requisição sai daqui, mas cada uma é contada por caminho
+    app.http_em_thread = lambda metodo, url, *args, **kwargs: requisicoes.append((metodo, url))
+    app.token = "benchmark" # logado: as páginas sincronizam como no uso real
+    app.montar_interface()
+    app.mostrar_pagina("alunos")
+    app.esconder_loading() # sem servidor a primeira carga nunca termina
+    root.update()
+
+    tree = app.tree_alunos
+    chaves = app.get_colunas_e_chaves("alunos")["chaves"]
+    for tamanho in tamanhos:
+        cursos, turmas, alunos = gerar_caches(tamanho)
+        tracemalloc.start()
+        for entidade, dados in (("cursos", cursos), ("turmas", turmas), ("alunos", alunos)):
+            app.atualizar_cache(entidade, dados, versao=1) # também refaz os índices; com versão, como depois da 1ª carga
+        memoria_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del cursos, turmas, alunos # daqui em diante só as linhas compactas do app
+        alunos = app.cache_alunos
+
+        def selecionar_e_recarregar():
+            filhos = tree.get_children()
+            if filhos:
+                tree.selection_set(filhos[len(filhos) // 2])
+            app._executar_callback_com_selecao("alunos", alunos, tree)
+
+        def trocar_pagina(): # a página de cursos é montada na primeira vez; nas seguintes só volta a aparecer
+            app.mostrar_pagina("cursos")
+            app.mostrar_pagina("alunos")
+
+        casos = {
+            "preencher_tabela": lambda: app.preencher_tabela(tree, alunos, chaves),
+            "filtrar (1 letra)": lambda: app.filtrar("alunos", "a"),
+            "filtrar (seletivo)": lambda: app.filtrar("alunos", f"Aluno {tamanho // 2:07d}"),
+            "filtrar (limpar)": lambda: app.filtrar("alunos", ""),
+            "recarregar com seleção": selecionar_e_recarregar,
+            "atualizar_combos": app.atualizar_combos,
+            "trocar de página": trocar_pagina,
+        }
+        tempos = {nome: medir(funcao, repeticoes, root, requisicoes) for nome, funcao in casos.items()}
+        resultados[tamanho] = {**tempos, "memoria_cache_mb": round(memoria_mb, 1)}
+
+        print(f"\n{tamanho} alunos ({len(app.cache_cursos)} cursos, {len(app.cache_turmas)} turmas), caches: {memoria_mb:.1f} MB")
+        print(f"  {'caminho':<26}{'mediana ms':>12}{'mín ms':>10}{'máx ms':>10}{'req.':>6}")
+        for nome, r in tempos.items():
+            print(f"  {nome:<26}{r['mediana']:>12.1f}{r['min']:>10.1f}{r['max']:>10.1f}{r['requisicoes']:>6.1f}")
+    root.destroy()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da interface do cliente do Sistema Acadêmico")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000], help="quantidades de alunos no cache")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", help="grava o resultado em JSON nesse arquivo")
+    args = parser.parse_args()
+
+    xvfb = garantir_display()
+    try:
+        resultados = rodar(args.tamanhos, args.repeticoes)
+    finally:
+        if xvfb:
+            xvfb.terminate()
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
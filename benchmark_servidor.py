@@ -0,0 +1,308 @@
+# Benchmark de carga do servidor (FastAPI + Socket.IO)
+#
+# Uso (com o servidor rodando e o mesmo .env do servidor):
+#   python benchmark_servidor.py --semear --cursos 2000 --alunos 40000
+#   python benchmark_servidor.py --usuarios 50 --clientes-sio 200 --duracao 60 --saida resultado.json
+#
+# Semeia o PostgreSQL com dados sintéticos (prefixo "BENCH", reprodutível pela --semente),
+# dispara login, listagens e CRUD em paralelo, conecta N clientes Socket.IO e mede
+# vazão, latências p50/p95/p99 por operação e o atraso de entrega dos eventos (fan-out).
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+from psycopg2.extras import execute_values
+import requests
+import socketio
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=".env", encoding="utf-8", override=True)
+
+PREFIXO = "BENCH"
+SENHA = "bench-senha"
+AREAS = ["Exatas", "Humanas", "Biológicas", "Tecnologia", "Saúde"]
+ESQUEMA_USUARIOS = os.getenv("ESQUEMA_USUARIOS", "public") # mesma tabela de usuários do servidor
+
+
+def conectar_banco():
+    return psycopg2.connect(dbname=os.getenv("DB_NAME"), user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+                            host=os.getenv("DB_HOST"), port=os.getenv("DB_PORT"))
+
+
+# apaga os dados de benchmark anteriores (o ON DELETE CASCADE leva turmas, alunos e matérias junto)
+def limpar(conn):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM cursos WHERE sigla LIKE %s", (f"{PREFIXO}%",))
+        cur.execute("DELETE FROM chatbot_respostas WHERE pergunta LIKE %s", (f"{PREFIXO}%",))
+        cur.execute(f"DELETE FROM {ESQUEMA_USUARIOS}.users WHERE username LIKE %s", (f"{PREFIXO.lower()}\\_%",))
+    conn.commit()
+
+
+def semear(args):
+    rnd = random.Random(args.semente)
+    conn = conectar_banco()
+    limpar(conn)
+    inicio = time.perf_counter()
+    with conn.cursor() as cur:
+        cursos = [(f"{PREFIXO} Curso {i:05d}", f"{PREFIXO}{i:05d}", rnd.choice(AREAS), "x" * rnd.randint(20, 400))
+                  for i in range(args.cursos)]
+        execute_values(cur, "INSERT INTO cursos (curso, sigla, area, descricao) VALUES %s", cursos, page_size=1000)
+
+        turmas = [(f"{PREFIXO}-T{c:05d}-{t}", sigla, "y" * rnd.randint(0, 120))
+                  for c, (_, sigla, _, _) in enumerate(cursos) for t in range(args.turmas_por_curso)]
+        execute_values(cur, "INSERT INTO turmas (turma, curso_sigla, descricao) VALUES %s", turmas, page_size=1000)
+
+        alunos = []
+        for i in range(args.alunos):
+            turma, sigla, _ = rnd.choice(turmas)
+            alunos.append((f"{PREFIXO} Aluno {i:07d}", f"{PREFIXO}RA{i:07d}", f"aluno{i}@bench.local", sigla, turma))
+        execute_values(cur, "INSERT INTO alunos (aluno, ra, email, curso_sigla, turma) VALUES %s", alunos, page_size=2000)
+
+        materias = []
+        for i in range(args.materias):
+            turma, sigla, _ = rnd.choice(turmas)
+            materias.append((f"{PREFIXO} Matéria {i:06d}", f"Professor {i % 300}", f"prof{i % 300}@bench.local", sigla, turma, "z" * rnd.randint(0, 300)))
+        execute_values(cur, "INSERT INTO materias (materia, professor, email, curso_sigla, turma, descricao) VALUES %s", materias, page_size=2000)
+    conn.commit()
+    conn.close()
+    print(f"Semeado em {time.perf_counter() - inicio:.1f}s: {len(cursos)} cursos, {len(turmas)} turmas, "
+          f"{len(alunos)} alunos, {len(materias)} matérias")
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))]
+
+
+# recusadas pelo controle de admissão do servidor (limite de taxa ou fila cheia): não são erro da operação
+STATUS_RECUSADA = (429, 503)
+
+
+# latências (ms), erros e recusas por operação, compartilhados entre as threads; as recusas ficam fora das
+# latências (voltam na hora e puxariam os percentis para baixo)
+class Medicoes:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.erros = defaultdict(int)
+        self.recusadas = defaultdict(int)
+        self.fanout = []
+
+    def registrar(self, operacao, ms, ok, recusada=False):
+        with self.lock:
+            if recusada:
+                self.recusadas[operacao] += 1
+                return
+            self.latencias[operacao].append(ms)
+            if not ok:
+                self.erros[operacao] += 1
+
+    def registrar_fanout(self, ms):
+        with self.lock:
+            self.fanout.append(ms)
+
+
+class Trabalhador(threading.Thread):
+    def __init__(self, numero, args, medicoes, turmas, fim):
+        super().__init__(daemon=True)
+        self.numero, self.args, self.medicoes, self.turmas, self.fim = numero, args, medicoes, turmas, fim
+        self.rnd = random.Random(args.semente + numero)
+        self.http = requests.Session()
+        self.usuario = f"{PREFIXO.lower()}_{numero}"
+        self.contador = 0
+
+    def medir(self, operacao, metodo, caminho, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            r = self.http.request(metodo, f"{self.args.url}{caminho}", timeout=30, **kwargs)
+            ok = r.status_code < 400
+        except requests.RequestException:
+            r, ok = None, False
+        recusada = r is not None and r.status_code in STATUS_RECUSADA
+        self.medicoes.registrar(operacao, (time.perf_counter() - inicio) * 1000, ok, recusada)
+        return r if ok else None
+
+    def login(self):
+        r = self.medir("login", "POST", "/login", json={"username": self.usuario, "password": SENHA})
+        if r is not None:
+            self.http.headers["Authorization"] = f"Bearer {r.json()['access_token']}"
+        return r is not None
+
+    def crud(self):
+        self.contador += 1
+        turma, sigla = self.rnd.choice(self.turmas)
+        ra = f"{PREFIXO}W{self.numero:03d}X{self.contador:07d}"
+        dados = {"aluno": f"{PREFIXO} Carga {self.numero} {self.contador}", "ra": ra, "email": f"{ra.lower()}@bench.local",
+                 "curso_sigla": sigla, "turma": turma}
+        if self.medir("criar_aluno", "POST", "/alunos", json=dados) is None:
+            return
+        r = self.medir("listar_alunos_since", "GET", f"/alunos?formato=colunas&since={self.ultima_versao}")
+        if r is None:
+            return
+        corpo = r.json()
+        self.ultima_versao = corpo.get("versao", self.ultima_versao)
+        ids = [linha[0] for linha in corpo["rows"] if linha[2] == ra]
+        if not ids:
+            return
+        dados["email"] = f"alterado.{dados['email']}"
+        self.medir("alterar_aluno", "PUT", f"/alunos/{ids[0]}", json=dados)
+        self.medir("excluir_aluno", "DELETE", f"/alunos/{ids[0]}")
+
+    def run(self):
+        self.http.post(f"{self.args.url}/register", json={"username": self.usuario, "password": SENHA}, timeout=30)
+        if not self.login():
+            return
+        self.ultima_versao = 0
+        listagens = ["/alunos", "/cursos", "/turmas", "/materias", "/chatbot_respostas"]
+        while not self.fim.is_set():
+            sorteio = self.rnd.random()
+            if sorteio < self.args.peso_login:
+                self.login()
+            elif sorteio < self.args.peso_login + self.args.peso_escrita:
+                self.crud()
+            else:
+                caminho = self.rnd.choice(listagens)
+                self.medir(f"listar{caminho.replace('/', '_')}", "GET", f"{caminho}?formato=colunas")
+
+
+# clientes Socket.IO que só escutam; o atraso é medido a partir do início da requisição da sonda.
+# Conectam com o token da sonda para entrar na sala do mesmo campus (sem token não recebem eventos)
+def conectar_clientes_sio(args, medicoes, sonda, token):
+    clientes = []
+    def ao_receber(data):
+        if sonda["inicio"]:
+            medicoes.registrar_fanout((time.perf_counter() - sonda["inicio"]) * 1000)
+    for _ in range(args.clientes_sio):
+        cliente = socketio.Client(reconnection=False)
+        cliente.on("atualizar_chatbot", ao_receber)
+        try:
+            cliente.connect(args.url, transports=["websocket"], auth={"token": token})
+            clientes.append(cliente)
+        except socketio.exceptions.ConnectionError as e:
+            print(f"Cliente Socket.IO não conectou: {e}")
+            break
+    return clientes
+
+
+# sessão HTTP já logada da sonda, ou None
+def logar_sonda(args):
+    http = requests.Session()
+    http.post(f"{args.url}/register", json={"username": f"{PREFIXO.lower()}_sonda", "password": SENHA}, timeout=30)
+    r = http.post(f"{args.url}/login", json={"username": f"{PREFIXO.lower()}_sonda", "password": SENHA}, timeout=30)
+    if r.status_code != 200:
+        print("Sonda não conseguiu logar; fan-out não será medido")
+        return None
+    http.headers["Authorization"] = f"Bearer {r.json()['access_token']}"
+    return http
+
+
+# escreve em chatbot_respostas (que nenhum trabalhador toca) para gerar eventos isolados
+def rodar_sonda(args, http, sonda, fim):
+    numero = 0
+    while not fim.wait(args.intervalo_sonda):
+        numero += 1
+        sonda["inicio"] = time.perf_counter()
+        http.post(f"{args.url}/chatbot_respostas", json={"pergunta": f"{PREFIXO} sonda {numero}", "resposta": "-"}, timeout=30)
+
+
+def relatorio(medicoes, duracao, clientes_sio):
+    resultado = {"duracao_s": duracao, "clientes_sio": clientes_sio, "operacoes": {}}
+    total = 0
+    print(f"\n{'operação':<28}{'qtde':>8}{'req/s':>9}{'erros':>7}{'recus.':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'máx ms':>9}")
+    for operacao in sorted(medicoes.latencias.keys() | medicoes.recusadas.keys()):
+        valores = medicoes.latencias[operacao]
+        total += len(valores)
+        linha = {"qtde": len(valores), "req_s": len(valores) / duracao, "erros": medicoes.erros[operacao],
+                 "recusadas": medicoes.recusadas[operacao],
+                 "p50": percentil(valores, 50), "p95": percentil(valores, 95), "p99": percentil(valores, 99),
+                 "max": max(valores, default=0.0), "media": statistics.fmean(valores) if valores else 0.0}
+        resultado["operacoes"][operacao] = linha
+        print(f"{operacao:<28}{linha['qtde']:>8}{linha['req_s']:>9.1f}{linha['erros']:>7}{linha['recusadas']:>7}"
+              f"{linha['p50']:>9.1f}{linha['p95']:>9.1f}{linha['p99']:>9.1f}{linha['max']:>9.1f}")
+    resultado["req_s_total"] = total / duracao
+    resultado["recusadas_total"] = sum(medicoes.recusadas.values())
+    print(f"\nTotal: {total} requisições, {resultado['req_s_total']:.1f} req/s")
+    if resultado["recusadas_total"]:
+        print(f"{resultado['recusadas_total']} requisições recusadas com 429/503 pelo controle de admissão; para medir a "
+              f"capacidade do servidor, suba-o com LIMITE_USUARIO_RPS/LIMITE_GLOBAL_RPS (e as filas) acima da carga")
+    if medicoes.fanout:
+        resultado["fanout_ms"] = {"entregas": len(medicoes.fanout), "p50": percentil(medicoes.fanout, 50),
+                                  "p95": percentil(medicoes.fanout, 95), "p99": percentil(medicoes.fanout, 99), "max": max(medicoes.fanout)}
+        f = resultado["fanout_ms"]
+        print(f"Fan-out Socket.IO ({clientes_sio} clientes, {f['entregas']} entregas): "
+              f"p50 {f['p50']:.1f} ms, p95 {f['p95']:.1f} ms, p99 {f['p99']:.1f} ms, máx {f['max']:.1f} ms")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga do servidor do Sistema Acadêmico")
+    parser.add_argument("--url", default=os.getenv("BENCH_URL", "http://localhost:8000"))
+    parser.add_argument("--semear", action="store_true", help="recria os dados sintéticos antes de medir")
+    parser.add_argument("--limpar", action="store_true", help="apaga os dados sintéticos ao final")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--cursos", type=int, default=2000)
+    parser.add_argument("--turmas-por-curso", type=int, default=3)
+    parser.add_argument("--alunos", type=int, default=40000)
+    parser.add_argument("--materias", type=int, default=12000)
+    parser.add_argument("--usuarios", type=int, default=20, help="trabalhadores HTTP simultâneos")
+    parser.add_argument("--clientes-sio", type=int, default=100, help="clientes Socket.IO só escutando")
+    parser.add_argument("--duracao", type=float, default=30.0, help="segundos de carga")
+    parser.add_argument("--peso-login", type=float, default=0.05)
+    parser.add_argument("--peso-escrita", type=float, default=0.20)
+    parser.add_argument("--intervalo-sonda", type=float, default=1.0, help="segundos entre eventos da sonda de fan-out")
+    parser.add_argument("--saida", help="grava o resultado em JSON nesse arquivo")
+    args = parser.parse_args()
+
+    if args.semear:
+        semear(args)
+
+    conn = conectar_banco()
+    with conn.cursor() as cur:
+        cur.execute("SELECT turma, curso_sigla FROM turmas WHERE turma LIKE %s", (f"{PREFIXO}%",))
+        turmas = cur.fetchall()
+    conn.close()
+    if not turmas:
+        raise SystemExit("Sem dados de benchmark; rode com --semear")
+
+    medicoes = Medicoes()
+    sonda = {"inicio": None}
+    http_sonda = logar_sonda(args)
+    clientes = []
+    if http_sonda is not None:
+        clientes = conectar_clientes_sio(args, medicoes, sonda, http_sonda.headers["Authorization"][7:])
+    fim = threading.Event()
+    threads = [Trabalhador(i, args, medicoes, turmas, fim) for i in range(args.usuarios)]
+    if http_sonda is not None:
+        threads.append(threading.Thread(target=rodar_sonda, args=(args, http_sonda, sonda, fim), daemon=True))
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duracao)
+    fim.set()
+    for t in threads:
+        t.join(timeout=35)
+    duracao = time.perf_counter() - inicio
+    for cliente in clientes:
+        cliente.disconnect()
+
+    resultado = relatorio(medicoes, duracao, len(clientes))
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+    if args.limpar:
+        conn = conectar_banco()
+        limpar(conn)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# Buffer dos últimos eventos Socket.IO de um campus, com número de sequência, para o cliente que reconecta
+# receber só o que perdeu (usado pelo servidor.py, um por campus). A época identifica o processo: uma sequência
+# de antes de um restart nunca é confundida com a atual.
+
+from collections import deque
+from typing import Dict, List
+
+
+class BufferEventos:
+    def __init__(self, tamanho: int, epoca: str):
+        self.epoca = epoca
+        self.seq = 0
+        self.recentes = deque(maxlen=tamanho) # (seq, evento, dados)
+
+    # numera o evento e guarda; devolve os dados que vão para os clientes, já com o "seq"
+    def registrar(self, evento: str, dados: Dict | None = None) -> Dict:
+        self.seq += 1
+        dados = {**(dados or {}), "seq": self.seq}
+        self.recentes.append((self.seq, evento, dados))
+        return dados
+
+    # eventos depois de ultimo_seq, ou None quando a lacuna já saiu do buffer (ou o servidor reiniciou)
+    def desde(self, ultimo_seq: int, epoca: str | None) -> List[Dict] | None:
+        if epoca != self.epoca or ultimo_seq > self.seq:
+            return None
+        if ultimo_seq < self.seq and (not self.recentes or self.recentes[0][0] > ultimo_seq + 1):
+            return None
+        return [{"evento": evento, **dados} for n, evento, dados in self.recentes if n > ultimo_seq]
@@ -0,0 +1,199 @@
+# Grade de horários: choques de professor, sala e turma com índices de intervalos por dia. Para cada
+# (recurso, dia) o índice guarda os horários ordenados pelo início, com o maior fim acumulado ao lado; conferir
+# um horário é uma busca binária mais os vizinhos que de fato se sobrepõem, O(log n + k). Um lote inteiro
+# (importação do semestre) é ordenado e varrido uma vez por recurso/dia, O(n log n). Usado pelo servidor.py.
+# Horários são [inicio, fim) em minutos desde 00:00; dia_semana 1 = segunda ... 7 = domingo.
+
+import bisect
+from typing import Dict, Iterable, List, NamedTuple
+
+RECURSOS = ("professor", "sala", "turma")
+
+
+class Horario(NamedTuple):
+    id: int | None
+    materia_id: int
+    professor: str
+    turma: str
+    sala: str
+    dia_semana: int
+    inicio: int
+    fim: int
+
+
+# aula a encaixar pelo solver (duração em minutos)
+class Aula(NamedTuple):
+    materia_id: int
+    professor: str
+    turma: str
+    duracao: int
+
+
+# "Sala  101" e "sala 101" são a mesma sala (idem professor)
+def _normalizar(texto: str) -> str:
+    return " ".join(texto.split()).casefold()
+
+
+class _Faixa:
+    # horários de um recurso num dia, em listas paralelas ordenadas pelo início; maior_fim[i] = max(fins[:i + 1])
+    __slots__ = ("inicios", "fins", "ids", "maior_fim")
+
+    def __init__(self, ordenados: List[Horario] = ()):
+        self.inicios = [h.inicio for h in ordenados]
+        self.fins = [h.fim for h in ordenados]
+        self.ids = [h.id for h in ordenados]
+        self.maior_fim = []
+        maior = 0
+        for fim in self.fins:
+            maior = max(maior, fim)
+            self.maior_fim.append(maior)
+
+    # ids dos horários que se sobrepõem a [inicio, fim): só quem começa antes do fim e, entre esses, a partir
+    # do primeiro ponto em que algum termina depois do início
+    def sobrepostos(self, inicio: int, fim: int) -> List[int]:
+        limite = bisect.bisect_left(self.inicios, fim)
+        primeiro = bisect.bisect_right(self.maior_fim, inicio, 0, limite)
+        return [self.ids[i] for i in range(primeiro, limite) if self.fins[i] > inicio]
+
+    # maior fim entre os que se sobrepõem a [inicio, fim), ou None se o recurso está livre
+    def ocupado_ate(self, inicio: int, fim: int) -> int | None:
+        limite = bisect.bisect_left(self.inicios, fim)
+        primeiro = bisect.bisect_right(self.maior_fim, inicio, 0, limite)
+        return max((f for f in self.fins[primeiro:limite] if f > inicio), default=None)
+
+    def inserir(self, h: Horario):
+        i = bisect.bisect_right(self.inicios, h.inicio)
+        self.inicios.insert(i, h.inicio)
+        self.fins.insert(i, h.fim)
+        self.ids.insert(i, h.id)
+        self.maior_fim.insert(i, 0)
+        self._acumular(i)
+
+    def remover(self, horario_id: int):
+        i = self.ids.index(horario_id)
+        for lista in (self.inicios, self.fins, self.ids, self.maior_fim):
+            del lista[i]
+        self._acumular(i)
+
+    # refaz o maior fim acumulado a partir de i; para quando um valor não muda (dali em diante nada muda)
+    def _acumular(self, i: int):
+        for j in range(i, len(self.fins)):
+            novo = max(self.maior_fim[j - 1] if j else 0, self.fins[j])
+            if j > i and novo == self.maior_fim[j]:
+                break
+            self.maior_fim[j] = novo
+
+
+class GradeHorarios:
+    def __init__(self, horarios: Iterable[Horario] = ()):
+        self.horarios: Dict[int, Horario] = {}
+        self.faixas: Dict[tuple, _Faixa] = {} # (recurso, valor normalizado, dia) -> _Faixa
+        grupos = {}
+        for h in horarios:
+            self.horarios[h.id] = h
+            for chave in self._chaves(h):
+                grupos.setdefault(chave, []).append(h)
+        for chave, lista in grupos.items(): # carga inicial: ordena uma vez em vez de inserir um a um
+            lista.sort(key=lambda h: h.inicio)
+            self.faixas[chave] = _Faixa(lista)
+
+    @staticmethod
+    def _chaves(h: Horario):
+        return [(recurso, _normalizar(getattr(h, recurso)), h.dia_semana) for recurso in RECURSOS]
+
+    def adicionar(self, h: Horario):
+        self.horarios[h.id] = h
+        for chave in self._chaves(h):
+            faixa = self.faixas.get(chave)
+            if faixa is None:
+                faixa = self.faixas[chave] = _Faixa()
+            faixa.inserir(h)
+
+    def remover(self, horario_id: int):
+        h = self.horarios.pop(horario_id)
+        for chave in self._chaves(h):
+            self.faixas[chave].remover(horario_id)
+
+    # choques de h com a grade, um por recurso e horário: {"recurso", "valor", "com": horário existente};
+    # o próprio h (mesmo id) não conta, assim alterar um horário não choca com a versão antiga dele
+    def conflitos(self, h: Horario) -> List[Dict]:
+        encontrados = []
+        for recurso, valor, dia in self._chaves(h):
+            faixa = self.faixas.get((recurso, valor, dia))
+            if faixa is None:
+                continue
+            for outro in faixa.sobrepostos(h.inicio, h.fim):
+                if outro != h.id:
+                    encontrados.append({"recurso": recurso, "valor": getattr(h, recurso), "com": self.horarios[outro]._asdict()})
+        return encontrados
+
+    # choques de um lote novo: cada um contra a grade (com_grade=False ignora a grade atual, ex.: importação que
+    # substitui tudo) e os do lote entre si, ordenando e varrendo cada recurso/dia. Cada choque traz a "posicao"
+    # no lote; "com" é um horário da grade ou outro do lote (com a "posicao" dele)
+    def conflitos_lote(self, novos: List[Horario], com_grade: bool = True) -> List[Dict]:
+        encontrados = []
+        grupos = {}
+        for posicao, h in enumerate(novos):
+            if com_grade:
+                encontrados += [{"posicao": posicao, **c} for c in self.conflitos(h)]
+            for chave in self._chaves(h):
+                grupos.setdefault(chave, []).append(posicao)
+        for (recurso, _, _), posicoes in grupos.items():
+            posicoes.sort(key=lambda p: novos[p].inicio)
+            aberto = posicoes[0] # quem termina mais tarde entre os já vistos
+            for p in posicoes[1:]:
+                if novos[p].inicio < novos[aberto].fim:
+                    encontrados.append({"posicao": p, "recurso": recurso, "valor": getattr(novos[p], recurso),
+                                        "com": {"posicao": aberto, **novos[aberto]._asdict()}})
+                if novos[p].fim > novos[aberto].fim:
+                    aberto = p
+        encontrados.sort(key=lambda c: c["posicao"])
+        return encontrados
+
+    # solver guloso: encaixa as aulas pedidas sem chocar com a grade nem entre si. As mais difíceis primeiro
+    # (professor com mais carga, aula mais longa); cada uma vai para o dia em que a matéria tem menos aulas, no
+    # primeiro início da grade de `passo` minutos em que professor e turma estão livres, na primeira sala livre.
+    # Não grava nada: devolve as propostas (ids negativos) e as aulas que não couberam
+    def propor(self, aulas: List[Aula], dias: List[int], inicio_dia: int, fim_dia: int, passo: int,
+               salas: List[str]) -> tuple:
+        carga = {}
+        for a in aulas:
+            carga[_normalizar(a.professor)] = carga.get(_normalizar(a.professor), 0) + a.duracao
+        por_dia = {} # (materia_id, dia) -> aulas já na grade ou propostas
+        for h in self.horarios.values():
+            por_dia[h.materia_id, h.dia_semana] = por_dia.get((h.materia_id, h.dia_semana), 0) + 1
+        salas = [(sala, _normalizar(sala)) for sala in salas]
+        tentativa = GradeHorarios() # só as propostas; a grade real não muda
+        propostas, sobras = [], []
+        for a in sorted(aulas, key=lambda a: (-carga[_normalizar(a.professor)], -a.duracao)):
+            ordem_dias = sorted(dias, key=lambda d: (por_dia.get((a.materia_id, d), 0), d))
+            proposta = next((h for dia in ordem_dias
+                             if (h := self._encaixar(tentativa, a, dia, inicio_dia, fim_dia, passo, salas)) is not None), None)
+            if proposta is None:
+                sobras.append(a._asdict())
+                continue
+            proposta = proposta._replace(id=-(len(propostas) + 1))
+            tentativa.adicionar(proposta)
+            propostas.append(proposta)
+            por_dia[a.materia_id, proposta.dia_semana] = por_dia.get((a.materia_id, proposta.dia_semana), 0) + 1
+        return propostas, sobras
+
+    # primeiro encaixe da aula no dia, ou None; quando professor ou turma estão ocupados, pula direto para o
+    # primeiro início da grade depois do fim de quem ocupa (em vez de testar passo a passo)
+    def _encaixar(self, tentativa, a: Aula, dia: int, inicio_dia: int, fim_dia: int, passo: int, salas: List[tuple]):
+        grades = (self, tentativa) # as faixas do dia são buscadas uma vez, não a cada início testado
+        ocupantes = [f for grade in grades for chave in (("professor", _normalizar(a.professor), dia), ("turma", _normalizar(a.turma), dia))
+                     if (f := grade.faixas.get(chave)) is not None]
+        faixas_salas = [(sala, [f for grade in grades if (f := grade.faixas.get(("sala", chave, dia))) is not None])
+                        for sala, chave in salas]
+        inicio = inicio_dia
+        while inicio + a.duracao <= fim_dia:
+            fim = inicio + a.duracao
+            ocupado = max((t for f in ocupantes if (t := f.ocupado_ate(inicio, fim)) is not None), default=None)
+            if ocupado is None:
+                for sala, faixas in faixas_salas:
+                    if all(f.ocupado_ate(inicio, fim) is None for f in faixas):
+                        return Horario(None, a.materia_id, a.professor, a.turma, sala, dia, inicio, fim)
+                ocupado = inicio + 1 # nenhuma sala livre nesse início: tenta o próximo
+            inicio = inicio_dia + -(-(ocupado - inicio_dia) // passo) * passo # arredonda para cima na grade
+        return None
@@ -0,0 +1,83 @@
+# Inicia o servidor, espera ele avisar que está pronto e abre a interface; ao fechar a interface, encerra o servidor.
+#
+# Uso:
+#   python iniciar.py                 # abre dist/sistema.exe se existir, senão python sistema.py
+#   python iniciar.py --timeout 60 --log backend.log
+#
+# Em vez de testar a porta de tempos em tempos, lê a saída do servidor e segue assim que aparece a linha
+# MARCA_PRONTO (pool aberto, esquema conferido, caches e bcrypt aquecidos). A saída do servidor continua indo para o log.
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+MARCA_PRONTO = "SERVIDOR PRONTO" # mesma constante do servidor.py (não importamos o servidor para não abrir o banco aqui)
+
+
+def comando_interface():
+    exe = os.path.join(PASTA, "dist", "sistema.exe")
+    if os.path.exists(exe):
+        return [exe]
+    return [sys.executable, os.path.join(PASTA, "sistema.py")]
+
+
+# copia a saída do servidor para o log e sinaliza o evento quando a linha de pronto aparece; o log é desta
+# thread: ela o fecha quando a saída acaba (servidor encerrado), depois da última linha
+def acompanhar_saida(processo, log, pronto: threading.Event):
+    try:
+        for linha in processo.stdout:
+            log.write(linha)
+            log.flush()
+            if MARCA_PRONTO in linha:
+                pronto.set()
+    finally:
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inicia o servidor e a interface do Sistema Acadêmico")
+    parser.add_argument("--timeout", type=float, default=30, help="segundos de espera pelo servidor")
+    parser.add_argument("--log", default=os.path.join(PASTA, "backend.log"), help="arquivo com a saída do servidor")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    print("[1/3] Iniciando servidor FastAPI + WebSocket...")
+    log = open(args.log, "w", encoding="utf-8")
+    servidor = subprocess.Popen([sys.executable, "-u", os.path.join(PASTA, "servidor.py")], cwd=PASTA,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8", errors="replace")
+    pronto = threading.Event()
+    leitor = threading.Thread(target=acompanhar_saida, args=(servidor, log, pronto), daemon=True)
+    leitor.start()
+    try:
+        print(f"[2/3] Aguardando o servidor ficar pronto (máx. {args.timeout:.0f}s)...")
+        limite = time.monotonic() + args.timeout
+        while not pronto.wait(0.1):
+            if servidor.poll() is not None or time.monotonic() >= limite:
+                motivo = "encerrou" if servidor.poll() is not None else f"não ficou pronto em {args.timeout:.0f}s"
+                print(f"[ERRO] O servidor {motivo}. Verifique o banco, a porta 8000 e o log em {args.log}")
+                return 1
+        print(f"[OK] Servidor pronto em {time.perf_counter() - inicio:.1f}s")
+
+        print("[3/3] Abrindo interface gráfica...")
+        subprocess.run(comando_interface(), cwd=PASTA)
+    finally:
+        if servidor.poll() is None:
+            print("[FECHANDO] Encerrando servidor...")
+            servidor.terminate()
+            try:
+                servidor.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                servidor.kill()
+                servidor.wait()
+        # com o servidor fora, a saída dele chega ao fim: o leitor grava o que faltava e fecha o log
+        leitor.join(timeout=5)
+    print("[OK] Sistema encerrado com sucesso.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
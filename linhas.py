@@ -0,0 +1,83 @@
+# Linhas compactas para os caches do cliente (sistema.py): cada linha é uma tupla, sem um dict por linha
+# repetindo as chaves, mas lida como um dict só de leitura (linha["turma"], linha.get("descricao"),
+# "versao" in linha). Assim o cache, os índices, a busca e a tabela compartilham o mesmo objeto.
+# Valores que se repetem em milhares de linhas (sigla, turma, ...) são internados: todos os alunos
+# de uma turma apontam para a mesma string em vez de uma cópia por linha.
+
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+# colunas com poucos valores distintos, que valem a pena internar
+INTERNAR = frozenset({"sigla", "curso_sigla", "turma", "area", "professor"})
+
+
+class Linha(tuple):
+    __slots__ = ()
+    colunas = () # nomes das colunas, na ordem da tupla (definidos por tipo_linha)
+    posicoes = {} # coluna -> índice na tupla
+    internar = () # índices das colunas de INTERNAR
+
+    def __getitem__(self, chave):
+        if chave.__class__ is str:
+            try:
+                return tuple.__getitem__(self, self.posicoes[chave])
+            except KeyError:
+                raise KeyError(chave) from None
+        return tuple.__getitem__(self, chave)
+
+    def get(self, chave, padrao=None):
+        posicao = self.posicoes.get(chave)
+        return padrao if posicao is None else tuple.__getitem__(self, posicao)
+
+    # como num dict: "in" procura entre as colunas, não entre os valores
+    def __contains__(self, chave) -> bool:
+        return chave in self.posicoes
+
+    def keys(self):
+        return self.colunas
+
+    def items(self):
+        return zip(self.colunas, tuple.__iter__(self))
+
+    def __repr__(self) -> str:
+        return f"Linha({dict(self.items())!r})"
+
+
+# um tipo por conjunto de colunas (na prática, um por tabela)
+@lru_cache(maxsize=None)
+def tipo_linha(colunas: tuple) -> type:
+    return type("Linha", (Linha,), {"__slots__": (), "colunas": colunas, "posicoes": {c: i for i, c in enumerate(colunas)},
+                                    "internar": tuple(i for i, c in enumerate(colunas) if c in INTERNAR)})
+
+
+def _nova(tipo: type, valores) -> Linha:
+    if tipo.internar:
+        valores = list(valores)
+        for i in tipo.internar:
+            if valores[i].__class__ is str:
+                valores[i] = sys.intern(valores[i])
+    return tuple.__new__(tipo, valores)
+
+
+# linhas no formato do servidor com ?formato=colunas: {"cols": [...], "rows": [[...], ...]}
+def de_colunas(colunas: Iterable[str], rows: Iterable) -> List[Linha]:
+    tipo = tipo_linha(tuple(colunas))
+    return [_nova(tipo, r) for r in rows]
+
+
+# aceita linhas já compactas e dicts (árvore de cursos, cache antigo, benchmark); devolve só Linha
+def compactar(dados: Iterable) -> List[Linha]:
+    dados = dados if isinstance(dados, list) else list(dados)
+    if all(isinstance(d, Linha) for d in dados):
+        return dados
+    return [d if isinstance(d, Linha) else _nova(tipo_linha(tuple(d)), d.values()) for d in dados]
+
+
+# o inverso de de_colunas, para gravar no cache local (as chaves não se repetem por linha também no disco)
+def para_colunas(linhas: List[Linha]) -> Dict:
+    if not linhas:
+        return {"cols": [], "rows": []}
+    colunas = linhas[0].colunas
+    return {"cols": list(colunas),
+            "rows": [list(l) if l.colunas is colunas else [l.get(c) for c in colunas] for l in linhas]}
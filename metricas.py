@@ -0,0 +1,147 @@
+# Métricas no formato texto do Prometheus (contadores, medidores e histogramas)
+# Implementação mínima e thread-safe, usada pelo servidor.py para o endpoint /metrics.
+
+import bisect
+import threading
+
+# limites (em segundos) dos histogramas de latência
+BUCKETS_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes, valores, extra="") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.lock = threading.Lock()
+        self.valores = {}
+
+    def _chave(self, rotulos: dict) -> tuple:
+        return tuple(rotulos.get(r, "") for r in self.rotulos)
+
+    def exportar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        with self.lock:
+            itens = list(self.valores.items())
+        for chave, valor in itens:
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_numero(valor)}")
+        return linhas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self.lock:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    # funcao: calcula o valor na hora da coleta (ex.: conexões em uso no pool); devolve número ou {rótulos: número}
+    def __init__(self, nome: str, ajuda: str, rotulos=(), funcao=None):
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao
+
+    def set(self, valor, **rotulos):
+        with self.lock:
+            self.valores[self._chave(rotulos)] = valor
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self.lock:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    def dec(self, valor=1, **rotulos):
+        self.inc(-valor, **rotulos)
+
+    def exportar(self) -> list:
+        if self.funcao is not None:
+            resultado = self.funcao()
+            with self.lock:
+                if isinstance(resultado, dict):
+                    self.valores = {(k if isinstance(k, tuple) else (k,)): v for k, v in resultado.items()}
+                else:
+                    self.valores = {(): resultado}
+        return super().exportar()
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos=(), buckets=BUCKETS_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self.lock:
+            contagens, soma, total = self.valores.get(chave) or ([0] * len(self.buckets), 0.0, 0)
+            if indice < len(self.buckets):
+                contagens[indice] += 1
+            self.valores[chave] = (contagens, soma + valor, total + 1)
+
+    def exportar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        with self.lock:
+            itens = [(chave, (list(c), s, t)) for chave, (c, s, t) in self.valores.items()]
+        for chave, (contagens, soma, total) in itens:
+            acumulado = 0
+            for limite, qtde in zip(self.buckets, contagens):
+                acumulado += qtde
+                le = 'le="' + _numero(limite) + '"'
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le)} {acumulado}")
+            le = 'le="+Inf"'
+            linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le)} {total}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, chave)} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, chave)} {total}")
+        return linhas
+
+
+class Registro:
+    def __init__(self):
+        self.metricas = []
+
+    def _registrar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos=()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome: str, ajuda: str, rotulos=(), funcao=None) -> Medidor:
+        return self._registrar(Medidor(nome, ajuda, rotulos, funcao))
+
+    def histograma(self, nome: str, ajuda: str, rotulos=(), buckets=BUCKETS_PADRAO) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def exportar(self) -> str:
+        linhas = []
+        for metrica in self.metricas:
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+registro = Registro() # registro global do processo
@@ -11,9 +11,10 @@ from psycopg2 import pool # reutiliza conexões
 from dotenv import load_dotenv # permite carregar variáveis de ambiente de um arquivo .env
 import os # interagir com o sistema operacional
 # fastapi: framework web; status: códigos http (200, 404, etc); httpexception: erros personalizados; depends: injeção de dependência (ex: autenticação)
-from fastapi import FastAPI, status, HTTPException, Depends 
+from fastapi import FastAPI, status, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware # compacta as respostas que não passam por resposta_lista
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm # autenticação via token jwt e formulário de login
-from pydantic import BaseModel # validação automática de dados
+from pydantic import BaseModel, Field # validação automática de dados
 from jose import JWTError, jwt # cria e verifica tokens jwt
 from passlib.context import CryptContext # segurança para senhas
 import socketio # websocket em tempo real
@@ -23,18 +24,160 @@ import uvicorn # servidor ASGI (roda FastAPI)
 import logging
 from datetime import datetime, timedelta
 
+# métricas (/metrics) e execução do bcrypt fora do event loop
+import re
+import time
+INICIO_PROCESSO = time.perf_counter() # referência para o tempo de startup
+import asyncio
+from functools import lru_cache
+from contextvars import ContextVar
+import uuid
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from metricas import registro
+from vigia_loop import VigiaEventLoop
+from amostrador import Amostrador
+from admissao import LimitadorTaxa, Comporta, Recusada
+from eventos import BufferEventos
+from tarefas import FilaTarefas
+from grade_horarios import GradeHorarios, Horario, Aula
+from contextlib import contextmanager
+
+# serialização e compressão das listagens
+import json
+import gzip
+try:
+    import orjson # encoder JSON rápido (opcional); sem ele usa o json da biblioteca padrão
+except ImportError:
+    orjson = None
+try:
+    import msgpack # formato binário compacto (opcional)
+except ImportError:
+    msgpack = None
+try:
+    import brotli # compressão brotli (opcional); sem ele só gzip
+except ImportError:
+    brotli = None
+
 # configuração básica
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+load_dotenv(dotenv_path=".env", encoding="utf-8", override=True) # carrega o arquivo .env com as configurações
+
+# compressão: respostas menores que isso vão sem compactar
+COMPRESSAO_MIN_BYTES = int(os.getenv("COMPRESSAO_MIN_BYTES", "1024"))
+
+# serializador do Socket.IO: "default" (JSON) ou "msgpack"; cliente e servidor precisam usar o mesmo
+SIO_SERIALIZER = os.getenv("SIO_SERIALIZER", "default")
+
+# requisições acima disso (ms) vão para o log de lentas com o detalhamento por fase e os SQLs executados
+REQUISICAO_LENTA_MS = float(os.getenv("REQUISICAO_LENTA_MS", "500"))
+logger_lentas = logging.getLogger("servidor.lentas")
+
+# vigia do event loop: acima desse atraso (ms) registra a pilha de quem travou o loop; 0 desliga
+VIGIA_LOOP_LIMITE_MS = float(os.getenv("VIGIA_LOOP_LIMITE_MS", "250"))
+vigia_loop = VigiaEventLoop(limite=VIGIA_LOOP_LIMITE_MS / 1000) if VIGIA_LOOP_LIMITE_MS > 0 else None
+
+# profiler por amostragem: PERFIL_INICIO_SEGUNDOS amostra os primeiros N segundos após subir (grava em PERFIL_PASTA);
+# POST /admin/perfil amostra uma janela sob demanda, só para os usuários listados em PERFIL_USUARIOS
+PERFIL_INICIO_SEGUNDOS = float(os.getenv("PERFIL_INICIO_SEGUNDOS", "0"))
+PERFIL_PASTA = os.getenv("PERFIL_PASTA", ".")
+PERFIL_USUARIOS = {u.strip() for u in os.getenv("PERFIL_USUARIOS", "").split(",") if u.strip()}
+amostrador = Amostrador()
+
+# últimos eventos Socket.IO com número de sequência, para o cliente que reconecta receber só o que perdeu
+# (ver eventos.py); a época muda a cada processo
+SIO_BUFFER_EVENTOS = int(os.getenv("SIO_BUFFER_EVENTOS", "1000"))
+EPOCA_EVENTOS = uuid.uuid4().hex
+
+# bcrypt é lento de propósito: roda num pool de threads próprio para não travar o event loop
+BCRYPT_THREADS = int(os.getenv("BCRYPT_THREADS", "2"))
+executor_bcrypt = ThreadPoolExecutor(max_workers=BCRYPT_THREADS, thread_name_prefix="bcrypt")
+
+# métricas expostas em /metrics
+METRICA_REQUISICOES = registro.contador("http_requisicoes_total", "Requisições HTTP por rota", ("metodo", "rota", "status"))
+METRICA_LATENCIA = registro.histograma("http_latencia_segundos", "Latência das requisições HTTP por rota", ("metodo", "rota"))
+METRICA_SQL = registro.histograma("db_consulta_segundos", "Tempo de execução por comando SQL", ("comando", "banco"))
+METRICA_SQL_ERROS = registro.contador("db_erros_total", "Comandos SQL que falharam", ("comando",))
+METRICA_CHECKOUT = registro.histograma("db_pool_checkout_segundos", "Tempo para obter uma conexão do pool")
+METRICA_SIO_CLIENTES = registro.medidor("sio_clientes_conectados", "Clientes Socket.IO conectados")
+METRICA_SIO_EMITS = registro.contador("sio_emits_total", "Eventos Socket.IO emitidos", ("evento", "campus"))
+METRICA_SIO_RETOMADAS = registro.contador("sio_retomadas_total", "Reconexões Socket.IO por resultado", ("resultado",))
+METRICA_BCRYPT_FILA = registro.medidor("bcrypt_fila", "Operações bcrypt aguardando ou em execução")
+METRICA_BCRYPT = registro.histograma("bcrypt_segundos", "Duração das operações bcrypt (incluindo a espera na fila)", ("operacao",))
+
+# campi atendidos por este processo: "id[=esquema]" separados por vírgula. Cada campus tem o próprio esquema no
+# PostgreSQL (padrão campus_<id>), o próprio pool de conexões, as próprias comportas de admissão e a própria sala
+# no Socket.IO; o campus de cada requisição vem do token (claim "campus"). Sem CAMPI, um campus só, no esquema public
+CAMPI = {}
+for _item in os.getenv("CAMPI", "padrao=public").split(","):
+    _campus, _, _esquema = _item.strip().lower().partition("=")
+    if _campus:
+        CAMPI[_campus] = _esquema.strip() or f"campus_{_campus}"
+if not all(re.fullmatch(r"[a-z0-9_]{1,40}", nome) for nome in (*CAMPI, *CAMPI.values())):
+    raise SystemExit("CAMPI inválido: use só letras minúsculas, números e _ (ex.: CAMPI=central=public,norte)")
+# usuários (login) ficam num esquema só, comum a todos os campi: a mesma conta entra em qualquer campus (o token leva
+# o campus escolhido no login) e um campus novo já nasce com os usuários existentes. Padrão public, onde já estavam
+ESQUEMA_USUARIOS = os.getenv("ESQUEMA_USUARIOS", "public").strip().lower()
+if not re.fullmatch(r"[a-z0-9_]{1,40}", ESQUEMA_USUARIOS):
+    raise SystemExit("ESQUEMA_USUARIOS inválido: use só letras minúsculas, números e _")
+TABELA_USUARIOS = f"{ESQUEMA_USUARIOS}.users"
+CAMPUS_PADRAO = os.getenv("CAMPUS_PADRAO", next(iter(CAMPI))).lower() # tokens antigos, sem a claim, e login sem campus
+if CAMPUS_PADRAO not in CAMPI:
+    raise SystemExit(f"CAMPUS_PADRAO={CAMPUS_PADRAO} não está em CAMPI")
+campus_atual: ContextVar[str] = ContextVar("campus_atual", default=CAMPUS_PADRAO) # definido por get_current_user e login
+
+def sala_campus(campus: str) -> str:
+    return f"campus:{campus}"
+
+# conexões de um usuário (todas as janelas abertas dele no campus); recebem o andamento das tarefas que ele pediu
+def sala_usuario(campus: str, usuario: str) -> str:
+    return f"usuario:{campus}:{usuario}"
+
+# últimos eventos de cada campus; cada campus tem a sua sequência
+eventos_campus = {campus: BufferEventos(SIO_BUFFER_EVENTOS, EPOCA_EVENTOS) for campus in CAMPI}
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1")) # conexões abertas já no startup
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "5")) # por campus: é o orçamento de conexões de cada um (e o tamanho das comportas)
+
+# admissão: requisições por segundo por usuário (ou IP, antes do login) e no total, e quantas podem estar
+# em andamento/na fila por classe de rota; o que passar disso é recusado na hora com 429/503 e Retry-After
+LIMITE_USUARIO_RPS = float(os.getenv("LIMITE_USUARIO_RPS", "20"))
+LIMITE_USUARIO_RAJADA = float(os.getenv("LIMITE_USUARIO_RAJADA", "40"))
+LIMITE_GLOBAL_RPS = float(os.getenv("LIMITE_GLOBAL_RPS", "300"))
+LIMITE_GLOBAL_RAJADA = float(os.getenv("LIMITE_GLOBAL_RAJADA", "600"))
+FILA_ESPERA_MS = float(os.getenv("FILA_ESPERA_MS", "2000"))
+limitador = LimitadorTaxa(LIMITE_USUARIO_RPS, LIMITE_USUARIO_RAJADA, LIMITE_GLOBAL_RPS, LIMITE_GLOBAL_RAJADA)
+# auth é limitada pelo bcrypt (do processo todo); leitura e escrita pelo pool do campus (no máximo uma requisição
+# em andamento por conexão), então cada campus tem as suas e um campus sobrecarregado não ocupa a vez dos outros
+comporta_auth = Comporta("auth", BCRYPT_THREADS * 2, int(os.getenv("FILA_AUTH", "20")), FILA_ESPERA_MS / 1000)
+comportas = {campus: {
+    "leitura": Comporta("leitura", DB_POOL_MAX, int(os.getenv("FILA_LEITURA", "50")), FILA_ESPERA_MS / 1000),
+    "escrita": Comporta("escrita", DB_POOL_MAX, int(os.getenv("FILA_ESCRITA", "20")), FILA_ESPERA_MS / 1000),
+} for campus in CAMPI}
+ROTAS_SEM_ADMISSAO = ("/health/", "/metrics", "/admin/")
+METRICA_REJEITADAS = registro.contador("http_rejeitadas_total", "Requisições recusadas pelo controle de admissão",
+                                       ("classe", "campus", "motivo"))
+
+def ocupacao_comportas() -> dict:
+    ocupacao = {("auth", "", "em_andamento"): comporta_auth.em_uso, ("auth", "", "na_fila"): comporta_auth.aguardando}
+    for campus, classes in comportas.items():
+        for classe, c in classes.items():
+            ocupacao.update({(classe, campus, "em_andamento"): c.em_uso, (classe, campus, "na_fila"): c.aguardando})
+    return ocupacao
+
+registro.medidor("http_em_andamento", "Requisições em andamento e na fila por classe de rota e campus",
+                 ("classe", "campus", "estado"), funcao=ocupacao_comportas)
+
 # FastAPI + Socket.IO integrados
 app = FastAPI()
-sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*") # permite qualquer origem (cliente.py)
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESSAO_MIN_BYTES)
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*", serializer=SIO_SERIALIZER) # permite qualquer origem (cliente.py)
 app_sio = socketio.ASGIApp(sio, app)
 
-load_dotenv(dotenv_path=".env", encoding="utf-8", override=True) # carrega o arquivo .env com as configurações
-
 # banco de dados
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
@@ -44,6 +187,7 @@ DB_PORT = os.getenv("DB_PORT")
 
 # JWT
 SECRET_KEY = os.getenv("SECRET_KEY") # chave secreta para tokens
+ALGORITHM = os.getenv("ALGORITHM", "HS256") # algoritmo de assinatura do token
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login") # pega o token do cabeçalho
 
@@ -60,35 +204,307 @@ db_config = {
     "port": DB_PORT
 }
 
-connection_pool = psycopg2.pool.SimpleConnectionPool(minconn=1, maxconn=5, **db_config) # cria um pool de conexão
+pools = {} # campus -> pool do primário; criados por abrir_pool() no startup, não no import
+
+# conexão que já nasce no esquema do campus (search_path na abertura, sem SET a cada checkout)
+def config_campus(config: dict, campus: str) -> dict:
+    return {**config, "options": f"-c search_path={CAMPI[campus]}"}
+
+# réplicas de leitura: "host[:porta],host[:porta]" com o mesmo banco/usuário/senha do primário
+DB_REPLICAS = [r.strip() for r in os.getenv("DB_REPLICAS", "").split(",") if r.strip()]
+DB_REPLICA_POOL_MAX = int(os.getenv("DB_REPLICA_POOL_MAX", str(DB_POOL_MAX)))
+REPLICA_LAG_MAX_MS = int(os.getenv("REPLICA_LAG_MAX_MS", "1000")) # acima disso a réplica sai do rodízio
+REPLICA_INTERVALO_MS = int(os.getenv("REPLICA_INTERVALO_MS", "2000")) # de quanto em quanto tempo o atraso é medido
+# depois de gravar, o usuário lê do primário por esse tempo (vê a própria alteração mesmo com a réplica atrasada)
+REPLICA_APOS_ESCRITA_MS = int(os.getenv("REPLICA_APOS_ESCRITA_MS", str(REPLICA_LAG_MAX_MS + REPLICA_INTERVALO_MS)))
+
+# atraso da réplica em segundos: 0 quando já aplicou tudo o que recebeu (primário parado não conta como atraso);
+# NULL se ainda não aplicou nada. Fora de recuperação (ex.: réplica lógica) conta como em dia
+SQL_ATRASO_REPLICA = """
+    SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+class Replica:
+    def __init__(self, endereco: str):
+        host, _, porta = endereco.partition(":")
+        self.nome = endereco
+        self.config = {**db_config, "host": host, "port": porta or DB_PORT}
+        # um pool por campus, aberto no primeiro uso (ThreadedConnectionPool: usado pelo loop e pela thread de verificação)
+        self.pools = {}
+        self.lock = threading.Lock()
+        self.atraso = None # segundos; None = fora do ar ou ainda não verificada
+
+    @property
+    def disponivel(self) -> bool:
+        return bool(self.pools) and self.atraso is not None and self.atraso * 1000 <= REPLICA_LAG_MAX_MS
+
+    def pool_do(self, campus: str):
+        with self.lock:
+            pool_campus = self.pools.get(campus)
+            if pool_campus is None:
+                pool_campus = self.pools[campus] = psycopg2.pool.ThreadedConnectionPool(
+                    minconn=0, maxconn=DB_REPLICA_POOL_MAX, **config_campus(self.config, campus))
+            return pool_campus
+
+    # o atraso é do servidor, não do esquema: mede pela conexão do campus padrão
+    def verificar(self):
+        pool_campus = self.pool_do(CAMPUS_PADRAO)
+        conn = pool_campus.getconn()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(SQL_ATRASO_REPLICA)
+            atraso = cursor.fetchone()[0]
+            cursor.close()
+            conn.rollback()
+        except Exception:
+            pool_campus.putconn(conn, close=True)
+            raise
+        pool_campus.putconn(conn)
+        return float("inf") if atraso is None else float(atraso)
+
+replicas = [Replica(r) for r in DB_REPLICAS]
+
+# versão do esquema criado por _criar_tabelas; aumente sempre que mudar a DDL para ela rodar de novo no próximo boot
+VERSAO_ESQUEMA = 7
+
+# registros de exclusão mais velhos que isso são apagados (uma thread confere de hora em hora; 0 guarda para sempre);
+# quem sincroniza com uma marca anterior ao último apagado recebe a tabela inteira, com "completo"
+EXCLUSOES_RETENCAO_DIAS = float(os.getenv("EXCLUSOES_RETENCAO_DIAS", "30"))
+EXCLUSOES_INTERVALO_SEGUNDOS = 3600
+
+# etapas do startup; /health/ready só responde 200 quando todas terminaram
+PRONTIDAO = {"pool": False, "esquema": False, "caches": False, "bcrypt": False}
+MARCA_PRONTO = "SERVIDOR PRONTO" # linha de log que o iniciar.py espera para abrir a interface
+
+# cada pool tem DB_POOL_MAX conexões para as requisições mais uma por thread de tarefa (que segura a sua durante
+# toda a tarefa e não pode tirar a vez das requisições)
+def abrir_pool():
+    for campus in CAMPI:
+        if campus not in pools: # cria um pool de conexão por campus (Threaded: o loop e as threads das tarefas usam juntos)
+            pools[campus] = psycopg2.pool.ThreadedConnectionPool(minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX + TAREFAS_SIMULTANEAS,
+                                                                 **config_campus(db_config, campus))
+    PRONTIDAO["pool"] = True
+
+# ocupação dos pools lida na hora da coleta (_used/_pool são internos do psycopg2, sem API pública)
+def ocupacao_pools() -> dict:
+    todos = [("primario", campus, p) for campus, p in pools.items()]
+    todos += [(r.nome, campus, p) for r in replicas for campus, p in list(r.pools.items())]
+    ocupacao = {}
+    for banco, campus, p in todos:
+        ocupacao.update({(banco, campus, "em_uso"): len(p._used), (banco, campus, "livres"): len(p._pool),
+                         (banco, campus, "maximo"): p.maxconn})
+    return ocupacao
+
+registro.medidor("db_pool_conexoes", "Conexões do pool por estado", ("banco", "campus", "estado"), funcao=ocupacao_pools)
+registro.medidor("db_replica_atraso_segundos", "Atraso medido de cada réplica (-1 = fora do ar)", ("replica",),
+                 funcao=lambda: {r.nome: -1 if r.atraso is None else r.atraso for r in replicas})
+METRICA_LEITURAS = registro.contador("db_leituras_total", "Leituras roteáveis por destino e motivo", ("banco", "motivo"))
+
+# tempo gasto por fase dentro de uma requisição (Server-Timing e log de lentas);
+# fica num ContextVar, então cada requisição enxerga só o próprio rastro
+class RastroRequisicao:
+    MAX_SQL = 50 # guarda no máximo esse número de comandos por requisição
+
+    def __init__(self):
+        self.fases = {}
+        self.sql = []
+
+    def somar(self, fase: str, segundos: float):
+        self.fases[fase] = self.fases.get(fase, 0.0) + segundos
+
+    def registrar_sql(self, sql: str, params, segundos: float):
+        if len(self.sql) < self.MAX_SQL:
+            self.sql.append({"sql": " ".join(sql.split()), "params": formato_params(params), "ms": round(segundos * 1000, 2)})
+
+rastro_atual: ContextVar[RastroRequisicao | None] = ContextVar("rastro_atual", default=None)
+usuario_atual: ContextVar[str | None] = ContextVar("usuario_atual", default=None) # definido por get_current_user
+
+def medir_fase(fase: str, segundos: float):
+    rastro = rastro_atual.get()
+    if rastro is not None:
+        rastro.somar(fase, segundos)
+
+# só os tipos dos parâmetros (ex.: "(str, int)"); os valores podem ter senha/dados pessoais e não vão para o log
+def formato_params(params) -> str:
+    if not params:
+        return "()"
+    return "(" + ", ".join(type(p).__name__ for p in params) + ")"
+
+# rótulo curto do comando para as métricas, ex.: "SELECT alunos", "UPDATE turmas"
+@lru_cache(maxsize=512)
+def rotulo_sql(sql: str) -> str:
+    verbo = sql.split(None, 1)[0].upper() if sql.strip() else "?"
+    tabela = re.search(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", sql, re.IGNORECASE)
+    return f"{verbo} {tabela.group(1)}" if tabela else verbo
 
 
 # gerenciador do banco
 class DadosSistemaServidor:
     def __init__(self):
+        self.rodizio = itertools.count() # round-robin entre as réplicas disponíveis
+        self.escritas = {} # (campus, usuário) -> time.monotonic() da última gravação (leitura das próprias escritas)
+        self.verificador = None
+        self.limpeza = None
+
+    # pool e esquema ficam para o startup (preparar), assim importar o módulo não depende do banco
+    def preparar(self):
+        abrir_pool()
+        for campus in CAMPI: # cada campus no seu esquema, com a sua versão em schema_versao
+            token = campus_atual.set(campus)
+            try:
+                self.verificar_esquema()
+            finally:
+                campus_atual.reset(token)
+        PRONTIDAO["esquema"] = True
+        if replicas and self.verificador is None:
+            self.verificador = threading.Thread(target=self._verificar_replicas, name="replicas", daemon=True)
+            self.verificador.start()
+        if EXCLUSOES_RETENCAO_DIAS > 0 and self.limpeza is None:
+            self.limpeza = threading.Thread(target=self._limpar_exclusoes_periodicamente, name="exclusoes", daemon=True)
+            self.limpeza.start()
+
+    def _limpar_exclusoes_periodicamente(self):
+        while True:
+            for campus in CAMPI:
+                campus_atual.set(campus)
+                try:
+                    apagadas = self.limpar_exclusoes()
+                    if apagadas:
+                        logger.info(f"Campus {campus}: {apagadas} registro(s) de exclusão antigos apagados")
+                except psycopg2.Error as e:
+                    logger.warning(f"Campus {campus}: limpeza de exclusões falhou ({str(e).strip()})")
+            time.sleep(EXCLUSOES_INTERVALO_SEGUNDOS)
+
+    # apaga os registros de exclusão mais velhos que a retenção e guarda em horizonte_exclusoes o maior xid apagado:
+    # um ?since= até ele pode ter perdido exclusões, então recebe a tabela inteira (ver consultar_lista)
+    def limpar_exclusoes(self) -> int:
+        with self.transacao() as executar:
+            apagadas, maior = executar("""
+                WITH apagadas AS (
+                    DELETE FROM exclusoes WHERE excluido_em < now() - make_interval(secs => %s) RETURNING xid
+                )
+                SELECT count(*), max(xid::text::bigint) FROM apagadas
+            """, (EXCLUSOES_RETENCAO_DIAS * 86400,))[0]
+            if apagadas:
+                executar("UPDATE horizonte_exclusoes SET xid = %s::text::xid8 WHERE xid < %s::text::xid8", (maior, maior))
+        return apagadas
+
+    # mede o atraso de cada réplica periodicamente; réplica fora do ar ou atrasada demais sai do rodízio
+    # (as leituras voltam para o primário) e entra de novo sozinha quando alcança
+    def _verificar_replicas(self):
+        while True:
+            for replica in replicas:
+                disponivel = replica.disponivel
+                try:
+                    replica.atraso = replica.verificar()
+                except psycopg2.Error as e:
+                    replica.atraso = None
+                    if disponivel:
+                        logger.warning(f"Réplica {replica.nome} fora do ar ({str(e).strip()}); leituras no primário")
+                if replica.disponivel != disponivel:
+                    situacao = "disponível" if replica.disponivel else "fora do rodízio"
+                    atraso = "?" if replica.atraso is None else f"{replica.atraso * 1000:.0f} ms"
+                    logger.info(f"Réplica {replica.nome} {situacao} (atraso {atraso})")
+            time.sleep(REPLICA_INTERVALO_MS / 1000)
+
+    # onde fazer uma leitura que tolera um pequeno atraso: uma réplica em dia ou None (primário).
+    # Quem gravou há pouco lê do primário; use o mesmo destino para todas as consultas de uma resposta
+    def destino_leitura(self) -> Replica | None:
+        if not replicas:
+            return None
+        usuario = usuario_atual.get()
+        chave = (campus_atual.get(), usuario)
+        escrita = self.escritas.get(chave) if usuario else None
+        if escrita is not None:
+            if (time.monotonic() - escrita) * 1000 < REPLICA_APOS_ESCRITA_MS:
+                METRICA_LEITURAS.inc(banco="primario", motivo="escrita_recente")
+                return None
+            self.escritas.pop(chave, None)
+        disponiveis = [r for r in replicas if r.disponivel]
+        if not disponiveis:
+            METRICA_LEITURAS.inc(banco="primario", motivo="replicas_indisponiveis")
+            return None
+        replica = disponiveis[next(self.rodizio) % len(disponiveis)]
+        METRICA_LEITURAS.inc(banco=replica.nome, motivo="replica")
+        return replica
+
+    # lê a versão gravada em schema_versao; a DDL completa só roda quando ela é diferente de VERSAO_ESQUEMA
+    def verificar_esquema(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT to_regclass('schema_versao') IS NOT NULL")
+            versao = None
+            if cursor.fetchone()[0]:
+                cursor.execute("SELECT max(versao) FROM schema_versao")
+                versao = cursor.fetchone()[0]
+            conn.rollback()
+        finally:
+            cursor.close()
+            self.release_connection(conn)
+        if versao == VERSAO_ESQUEMA:
+            logger.info(f"Campus {campus_atual.get()}: esquema já na versão {versao}; DDL dispensada")
+            return
+        logger.info(f"Campus {campus_atual.get()}: esquema na versão {versao}, esperada {VERSAO_ESQUEMA}: criando/atualizando tabelas")
         self._criar_tabelas()
 
-    def get_connection(self):
-        return connection_pool.getconn()
+    # conexão do campus da requisição (campus_atual), no primário ou na réplica `destino`
+    def get_connection(self, destino: Replica | None = None):
+        campus = campus_atual.get()
+        if campus not in pools: # requisição chegou antes do startup terminar
+            raise HTTPException(status_code=503, detail="Servidor iniciando", headers={"Retry-After": "1"})
+        inicio = time.perf_counter()
+        try:
+            conn = (destino.pool_do(campus) if destino else pools[campus]).getconn()
+        except psycopg2.pool.PoolError:
+            if destino is not None: # réplica esgotada: _conexao_leitura tenta o primário
+                raise
+            raise HTTPException(status_code=503, detail="Servidor ocupado; tente novamente em instantes", headers={"Retry-After": "1"})
+        duracao = time.perf_counter() - inicio
+        METRICA_CHECKOUT.observe(duracao)
+        medir_fase("checkout", duracao)
+        return conn
 
-    def release_connection(self, conn):
-        connection_pool.putconn(conn)
+    def release_connection(self, conn, destino: Replica | None = None, descartar: bool = False):
+        campus = campus_atual.get()
+        (destino.pool_do(campus) if destino else pools[campus]).putconn(conn, close=descartar)
 
     def _criar_tabelas(self):
         conn = self.get_connection()
         cursor = conn.cursor()
-        print("Usuário atual:", conn.get_dsn_parameters()['user'])
-        cursor.execute("SELECT current_user, current_schema();")
-        print("Resultado:", cursor.fetchone())
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('sistema_academico_esquema'))") # um processo por vez cria o esquema
+        esquema = CAMPI[campus_atual.get()]
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {esquema}") # o search_path da conexão já aponta para ele
 
         # SERIAL PRIMARY KEY: id automático;  UNIQUE: evita duplicar; TEXT NOT NULL: texto obrigatório;
         # FOREIGN KEY: referência; ON DELETE CASCADE: apaga dependências
-        cursor.execute(""" 
-            CREATE TABLE IF NOT EXISTS users (
+        cursor.execute(f"""
+            CREATE SCHEMA IF NOT EXISTS {ESQUEMA_USUARIOS};
+            CREATE TABLE IF NOT EXISTS {TABELA_USUARIOS} (
                 id SERIAL PRIMARY KEY,
                 username VARCHAR(50) UNIQUE NOT NULL,
                 hashed_password TEXT NOT NULL
             );
+        """)
+        # a versão 6 criava users em cada esquema de campus: as contas vão para a tabela comum e a do campus sai.
+        # Nome que já existe na comum fica com a senha de lá
+        if esquema != ESQUEMA_USUARIOS:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{esquema}.users",))
+            if cursor.fetchone()[0]:
+                cursor.execute(f"""
+                    INSERT INTO {TABELA_USUARIOS} (username, hashed_password)
+                    SELECT username, hashed_password FROM {esquema}.users ON CONFLICT (username) DO NOTHING
+                """)
+                levados = cursor.rowcount
+                cursor.execute(f"SELECT count(*) FROM {esquema}.users")
+                repetidos = cursor.fetchone()[0] - levados
+                cursor.execute(f"DROP TABLE {esquema}.users")
+                logger.info(f"Campus {campus_atual.get()}: {levados} usuário(s) levados para {TABELA_USUARIOS}"
+                            + (f"; {repetidos} já existiam lá e ficaram com a senha de lá" if repetidos else ""))
+
+        cursor.execute(""" 
             CREATE TABLE IF NOT EXISTS cursos (
                 id SERIAL PRIMARY KEY,
                 curso TEXT NOT NULL UNIQUE,
@@ -129,32 +545,269 @@ class DadosSistemaServidor:
                 pergunta TEXT NOT NULL,
                 resposta TEXT NOT NULL
             );
+            -- grade de horários: professor e turma vêm da matéria; inicio/fim em minutos desde 00:00,
+            -- dia_semana 1 = segunda ... 7 = domingo
+            CREATE TABLE IF NOT EXISTS horarios (
+                id SERIAL PRIMARY KEY,
+                materia_id INTEGER NOT NULL REFERENCES materias(id) ON DELETE CASCADE,
+                dia_semana SMALLINT NOT NULL CHECK (dia_semana BETWEEN 1 AND 7),
+                inicio SMALLINT NOT NULL,
+                fim SMALLINT NOT NULL,
+                sala TEXT NOT NULL,
+                CHECK (inicio >= 0 AND inicio < fim AND fim <= 1440)
+            );
+            CREATE INDEX IF NOT EXISTS idx_horarios_materia ON horarios (materia_id);
         """)
+
+        # versionamento: toda linha inserida/alterada recebe um número novo da sequência global (versao, usado no
+        # If-Match) e o id da transação que a gravou (xid); toda exclusão (inclusive em cascata) deixa um registro em
+        # exclusoes com o xid de quem excluiu. O ?since= compara xids: ver MARCA_SINCRONIZACAO
+        cursor.execute("""
+            CREATE SEQUENCE IF NOT EXISTS versao_seq;
+            CREATE TABLE IF NOT EXISTS exclusoes (
+                tabela TEXT NOT NULL,
+                registro_id INTEGER NOT NULL,
+                versao BIGINT NOT NULL
+            );
+            ALTER TABLE exclusoes
+                ADD COLUMN IF NOT EXISTS xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+                ADD COLUMN IF NOT EXISTS excluido_em TIMESTAMPTZ NOT NULL DEFAULT now();
+            DROP INDEX IF EXISTS idx_exclusoes_versao;
+            CREATE INDEX IF NOT EXISTS idx_exclusoes_xid ON exclusoes (tabela, xid);
+            CREATE INDEX IF NOT EXISTS idx_exclusoes_excluido_em ON exclusoes (excluido_em);
+            -- maior xid entre os registros de exclusão já apagados (uma linha só)
+            CREATE TABLE IF NOT EXISTS horizonte_exclusoes (xid xid8 NOT NULL);
+            INSERT INTO horizonte_exclusoes (xid) SELECT '0'::xid8 WHERE NOT EXISTS (SELECT 1 FROM horizonte_exclusoes);
+            CREATE OR REPLACE FUNCTION marcar_versao() RETURNS trigger AS $$
+            BEGIN
+                NEW.versao := nextval('versao_seq');
+                NEW.xid := pg_current_xact_id();
+                NEW.atualizado_em := now();
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+            CREATE OR REPLACE FUNCTION registrar_exclusao() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO exclusoes (tabela, registro_id, versao) VALUES (TG_TABLE_NAME, OLD.id, nextval('versao_seq'));
+                RETURN OLD;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+        for tabela in TABELAS_VERSIONADAS:
+            cursor.execute(f"""
+                ALTER TABLE {tabela}
+                    ADD COLUMN IF NOT EXISTS versao BIGINT NOT NULL DEFAULT nextval('versao_seq'),
+                    ADD COLUMN IF NOT EXISTS xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+                    ADD COLUMN IF NOT EXISTS atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now();
+                DROP INDEX IF EXISTS idx_{tabela}_versao;
+                CREATE INDEX IF NOT EXISTS idx_{tabela}_xid ON {tabela} (xid);
+                DROP TRIGGER IF EXISTS trg_{tabela}_versao ON {tabela};
+                CREATE TRIGGER trg_{tabela}_versao BEFORE UPDATE ON {tabela}
+                    FOR EACH ROW EXECUTE FUNCTION marcar_versao();
+                DROP TRIGGER IF EXISTS trg_{tabela}_exclusao ON {tabela};
+                CREATE TRIGGER trg_{tabela}_exclusao AFTER DELETE ON {tabela}
+                    FOR EACH ROW EXECUTE FUNCTION registrar_exclusao();
+            """)
+
+        # contagens por curso/turma mantidas por triggers a cada escrita em cursos/turmas/alunos/materias,
+        # para o painel responder sem varrer as tabelas; na primeira vez são preenchidas a partir dos dados atuais
+        cursor.execute("SELECT to_regclass('contagens_curso') IS NULL")
+        preencher_contagens = cursor.fetchone()[0]
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS contagens_curso (
+                curso_sigla TEXT PRIMARY KEY REFERENCES cursos(sigla) ON DELETE CASCADE ON UPDATE CASCADE,
+                turmas INTEGER NOT NULL DEFAULT 0,
+                alunos INTEGER NOT NULL DEFAULT 0,
+                materias INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS contagens_turma (
+                turma TEXT PRIMARY KEY REFERENCES turmas(turma) ON DELETE CASCADE ON UPDATE CASCADE,
+                curso_sigla TEXT NOT NULL,
+                alunos INTEGER NOT NULL DEFAULT 0,
+                materias INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_contagens_turma_curso ON contagens_turma (curso_sigla);
+            CREATE INDEX IF NOT EXISTS idx_materias_turma ON materias (turma);
+            CREATE INDEX IF NOT EXISTS idx_alunos_turma ON alunos (turma, aluno);
+            CREATE OR REPLACE FUNCTION contar_curso() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO contagens_curso (curso_sigla) VALUES (NEW.sigla) ON CONFLICT DO NOTHING;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            CREATE OR REPLACE FUNCTION contar_turma() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' THEN
+                    IF OLD.curso_sigla IS DISTINCT FROM NEW.curso_sigla THEN
+                        UPDATE contagens_curso SET turmas = turmas - 1 WHERE curso_sigla = OLD.curso_sigla;
+                        UPDATE contagens_curso SET turmas = turmas + 1 WHERE curso_sigla = NEW.curso_sigla;
+                        -- a troca de nome da turma já foi propagada pelo ON UPDATE CASCADE
+                        UPDATE contagens_turma SET curso_sigla = NEW.curso_sigla WHERE turma IN (OLD.turma, NEW.turma);
+                    END IF;
+                ELSIF TG_OP = 'INSERT' THEN
+                    UPDATE contagens_curso SET turmas = turmas + 1 WHERE curso_sigla = NEW.curso_sigla;
+                    INSERT INTO contagens_turma (turma, curso_sigla) VALUES (NEW.turma, NEW.curso_sigla) ON CONFLICT DO NOTHING;
+                ELSE
+                    UPDATE contagens_curso SET turmas = turmas - 1 WHERE curso_sigla = OLD.curso_sigla;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            -- alunos e materias: a coluna de contagem tem o mesmo nome da tabela
+            CREATE OR REPLACE FUNCTION contar_inscricao() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' AND OLD.turma IS NOT DISTINCT FROM NEW.turma
+                        AND OLD.curso_sigla IS NOT DISTINCT FROM NEW.curso_sigla THEN
+                    RETURN NULL;
+                END IF;
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    EXECUTE format('UPDATE contagens_turma SET %1$I = %1$I - 1 WHERE turma = $1', TG_TABLE_NAME) USING OLD.turma;
+                    EXECUTE format('UPDATE contagens_curso SET %1$I = %1$I - 1 WHERE curso_sigla = $1', TG_TABLE_NAME) USING OLD.curso_sigla;
+                END IF;
+                IF TG_OP IN ('UPDATE', 'INSERT') THEN
+                    EXECUTE format('UPDATE contagens_turma SET %1$I = %1$I + 1 WHERE turma = $1', TG_TABLE_NAME) USING NEW.turma;
+                    EXECUTE format('UPDATE contagens_curso SET %1$I = %1$I + 1 WHERE curso_sigla = $1', TG_TABLE_NAME) USING NEW.curso_sigla;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS trg_cursos_contagem ON cursos;
+            CREATE TRIGGER trg_cursos_contagem AFTER INSERT ON cursos
+                FOR EACH ROW EXECUTE FUNCTION contar_curso();
+            DROP TRIGGER IF EXISTS trg_turmas_contagem ON turmas;
+            CREATE TRIGGER trg_turmas_contagem AFTER INSERT OR UPDATE OR DELETE ON turmas
+                FOR EACH ROW EXECUTE FUNCTION contar_turma();
+            DROP TRIGGER IF EXISTS trg_alunos_contagem ON alunos;
+            CREATE TRIGGER trg_alunos_contagem AFTER INSERT OR UPDATE OR DELETE ON alunos
+                FOR EACH ROW EXECUTE FUNCTION contar_inscricao();
+            DROP TRIGGER IF EXISTS trg_materias_contagem ON materias;
+            CREATE TRIGGER trg_materias_contagem AFTER INSERT OR UPDATE OR DELETE ON materias
+                FOR EACH ROW EXECUTE FUNCTION contar_inscricao();
+        """)
+        if preencher_contagens:
+            cursor.execute(SQL_RECALCULAR_CONTAGENS)
+
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_versao (versao INTEGER NOT NULL)")
+        cursor.execute("DELETE FROM schema_versao")
+        cursor.execute("INSERT INTO schema_versao (versao) VALUES (%s)", (VERSAO_ESQUEMA,))
         conn.commit()
         cursor.close()
         self.release_connection(conn)
 
-    def executar(self, sql, params=()):
+    def _medir_sql(self, sql, params, duracao, banco="primario"):
+        METRICA_SQL.observe(duracao, comando=rotulo_sql(sql), banco=banco)
+        rastro = rastro_atual.get()
+        if rastro is not None:
+            rastro.somar("sql", duracao)
+            rastro.registrar_sql(sql, params, duracao)
+
+    def executar(self, sql, params=()): # devolve o número de linhas afetadas
         conn = self.get_connection()
         cursor = conn.cursor()
+        inicio = time.perf_counter()
         try:
             cursor.execute(sql, params)
             conn.commit()
+            usuario = usuario_atual.get()
+            if usuario and replicas:
+                self.escritas[(campus_atual.get(), usuario)] = time.monotonic()
+            return cursor.rowcount
         except Exception as e:
             conn.rollback()
+            METRICA_SQL_ERROS.inc(comando=rotulo_sql(sql))
             raise e
         finally:
+            self._medir_sql(sql, params, time.perf_counter() - inicio)
             cursor.close()
             self.release_connection(conn)
 
-    def consultar(self, sql, params=()):
+    # várias gravações numa transação só (tarefas em segundo plano): commit no fim, rollback se algo falhar.
+    # O executar entregue devolve as linhas de um SELECT/RETURNING ou o número de linhas afetadas
+    @contextmanager
+    def transacao(self):
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute(sql, params)
-        results = cursor.fetchall()
-        cursor.close()
-        self.release_connection(conn)
-        return results
+        def executar(sql, params=()):
+            inicio = time.perf_counter()
+            try:
+                cursor.execute(sql, params)
+            except Exception:
+                METRICA_SQL_ERROS.inc(comando=rotulo_sql(sql))
+                raise
+            finally:
+                self._medir_sql(sql, params, time.perf_counter() - inicio)
+            return cursor.fetchall() if cursor.description is not None else cursor.rowcount
+        try:
+            yield executar
+            conn.commit()
+            usuario = usuario_atual.get()
+            if usuario and replicas:
+                self.escritas[(campus_atual.get(), usuario)] = time.monotonic()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(conn)
+
+    # conexão da réplica, ou do primário se ela saiu do rodízio, está sem conexão livre ou não conecta
+    def _conexao_leitura(self, destino: Replica | None):
+        if destino is not None and destino.disponivel:
+            try:
+                return self.get_connection(destino), destino
+            except psycopg2.OperationalError as e:
+                destino.atraso = None
+                logger.warning(f"Réplica {destino.nome} não conecta ({str(e).strip()}); leituras no primário")
+            except psycopg2.pool.PoolError:
+                METRICA_LEITURAS.inc(banco="primario", motivo="replica_esgotada")
+        return self.get_connection(), None
+
+    # destino: réplica de destino_leitura() ou None (primário); se a réplica falhar, tira do rodízio e repete no primário
+    def consultar(self, sql, params=(), destino: Replica | None = None):
+        conn, destino = self._conexao_leitura(destino)
+        cursor = conn.cursor()
+        inicio = time.perf_counter()
+        descartar = False
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        except psycopg2.OperationalError as e:
+            if destino is None:
+                conn.rollback()
+                METRICA_SQL_ERROS.inc(comando=rotulo_sql(sql))
+                raise
+            descartar = True
+            destino.atraso = None
+            logger.warning(f"Réplica {destino.nome} falhou ({str(e).strip()}); repetindo no primário")
+        except Exception:
+            conn.rollback()
+            METRICA_SQL_ERROS.inc(comando=rotulo_sql(sql))
+            raise
+        finally:
+            self._medir_sql(sql, params, time.perf_counter() - inicio, destino.nome if destino else "primario")
+            cursor.close()
+            self.release_connection(conn, destino, descartar)
+        return self.consultar(sql, params)
+
+# reconstrói as contagens do painel a partir das tabelas (só na criação; depois os triggers mantêm)
+SQL_RECALCULAR_CONTAGENS = """
+    DELETE FROM contagens_turma;
+    DELETE FROM contagens_curso;
+    INSERT INTO contagens_curso (curso_sigla, turmas, alunos, materias)
+        SELECT c.sigla,
+               (SELECT count(*) FROM turmas t WHERE t.curso_sigla = c.sigla),
+               (SELECT count(*) FROM alunos a WHERE a.curso_sigla = c.sigla),
+               (SELECT count(*) FROM materias m WHERE m.curso_sigla = c.sigla)
+        FROM cursos c;
+    INSERT INTO contagens_turma (turma, curso_sigla, alunos, materias)
+        SELECT t.turma, t.curso_sigla,
+               (SELECT count(*) FROM alunos a WHERE a.turma = t.turma),
+               (SELECT count(*) FROM materias m WHERE m.turma = t.turma)
+        FROM turmas t;
+"""
+
+# tabelas com controle de versão (colunas versao/atualizado_em)
+TABELAS_VERSIONADAS = ("cursos", "turmas", "alunos", "materias", "chatbot_respostas", "horarios")
 
 db_servidor = DadosSistemaServidor() # instância global
 
@@ -162,6 +815,7 @@ db_servidor = DadosSistemaServidor() # instância global
 class LoginData(BaseModel):
     username: str
     password: str
+    campus: str | None = None # None: CAMPUS_PADRAO
 
 class AlunoCreate(BaseModel):
     aluno: str
@@ -193,6 +847,257 @@ class ChatbotRespostaCreate(BaseModel):
     pergunta: str
     resposta: str
 
+class HorarioCreate(BaseModel):
+    materia_id: int
+    dia_semana: int = Field(ge=1, le=7) # 1 = segunda ... 7 = domingo
+    inicio: int = Field(ge=0, lt=1440) # minutos desde 00:00 (450 = 07:30)
+    fim: int = Field(gt=0, le=1440)
+    sala: str
+
+class AulaPedido(BaseModel):
+    materia_id: int
+    duracao: int = Field(gt=0, le=1440) # minutos
+    quantidade: int = Field(1, ge=1, le=20) # aulas dessa matéria na semana
+
+class PropostaPedido(BaseModel):
+    aulas: list[AulaPedido]
+    dias: list[int] = [1, 2, 3, 4, 5]
+    inicio_dia: int = Field(420, ge=0, lt=1440) # janela do dia em que as aulas podem ser encaixadas
+    fim_dia: int = Field(1320, gt=0, le=1440)
+    passo: int = Field(30, ge=5, le=240) # inícios possíveis: inicio_dia, inicio_dia + passo, ...
+    salas: list[str] | None = None # None: as salas que já aparecem na grade
+
+# colunas devolvidas pelas listagens, na mesma ordem do SELECT
+COLUNAS_ALUNOS = ("id", "aluno", "ra", "email", "curso_sigla", "turma", "versao")
+COLUNAS_CURSOS = ("id", "curso", "sigla", "area", "descricao", "versao")
+COLUNAS_TURMAS = ("id", "turma", "curso_sigla", "descricao", "versao")
+COLUNAS_MATERIAS = ("id", "materia", "professor", "email", "curso_sigla", "turma", "descricao", "versao")
+COLUNAS_CHATBOT = ("id", "pergunta", "resposta", "versao")
+COLUNAS_HORARIOS = ("id", "materia_id", "dia_semana", "inicio", "fim", "sala", "versao")
+
+# textos longos saem nas listagens só como prévia (o mesmo corte que a tabela do cliente mostra);
+# o texto completo vem do detalhe, GET /<entidade>/{id}
+PREVIAS = {"descricao": 80, "resposta": 100}
+# coluna extra das listagens de tabelas com prévia: as colunas cortadas naquela linha, separadas por vírgula, ou NULL
+# (o caso comum, que quase não pesa na resposta). O cliente não precisa adivinhar pelo "..." nem conhecer os limites
+COLUNA_CORTADOS = "cortados"
+
+def expressao_lista(coluna: str, prefixo: str = "") -> str:
+    limite = PREVIAS.get(coluna)
+    campo = f"{prefixo}{coluna}"
+    if limite is None:
+        return campo
+    return f"CASE WHEN length({campo}) > {limite} THEN left({campo}, {limite - 3}) || '...' ELSE {campo} END"
+
+# colunas da listagem: as da tabela mais "cortados" quando alguma delas tem prévia (mesma ordem do campos_lista)
+def colunas_lista(colunas: tuple) -> tuple:
+    return colunas + (COLUNA_CORTADOS,) if PREVIAS.keys() & set(colunas) else colunas
+
+def campos_lista(colunas: tuple, prefixo: str = "") -> str:
+    campos = [expressao_lista(c, prefixo) for c in colunas]
+    cortes = [f"CASE WHEN length({prefixo}{c}) > {PREVIAS[c]} THEN '{c}' END" for c in colunas if c in PREVIAS]
+    if cortes:
+        campos.append(f"NULLIF(concat_ws(',', {', '.join(cortes)}), '')")
+    return ", ".join(campos)
+
+# colunas do painel (contagens mantidas pelos triggers)
+COLUNAS_PAINEL_CURSOS = ("curso_sigla", "curso", "turmas", "alunos", "materias")
+COLUNAS_PAINEL_TURMAS = ("turma", "curso_sigla", "alunos", "materias")
+COLUNAS_PAINEL_MATERIAS = ("id", "materia", "professor")
+
+# campos dos alunos/matérias aninhados na árvore de cursos
+ARVORE_ALUNOS = ("id", "aluno", "ra")
+ARVORE_MATERIAS = ("id", "materia", "professor")
+
+# formato das listagens: "objetos" (lista de dicts, padrão) ou "colunas" ({"cols": [...], "rows": [[...]]})
+FORMATO_LISTA = Query("objetos", pattern="^(objetos|colunas)$")
+# ?since=<marca>: só as linhas gravadas a partir dessa marca (e os ids excluídos); a marca é a "versao" devolvida
+# pela listagem anterior (ver MARCA_SINCRONIZACAO), não a versao de uma linha
+SINCE = Query(None, ge=0)
+
+# marca de sincronização: o menor xid ainda em andamento para o snapshot da consulta (ou o próximo xid, se nenhum).
+# Tudo abaixo dela já terminou e aparece nos dados lidos depois; transação que pegou xid antes mas só faz commit
+# depois (inclusive a exclusão em cascata, que demora) tem xid >= marca e volta no próximo since. Um número da
+# sequência não serve: nextval sai na ordem em que é chamado, não na ordem dos commits
+MARCA_SINCRONIZACAO = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+def marca_sincronizacao(destino=None) -> int:
+    return db_servidor.consultar(MARCA_SINCRONIZACAO, destino=destino)[0][0]
+
+MIME_MSGPACK = "application/x-msgpack"
+
+def serializar_json(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# lê um cabeçalho Accept/Accept-Encoding e devolve os valores aceitos (q=0 significa recusado)
+def _valores_aceitos(cabecalho: str) -> set:
+    aceitos = set()
+    for parte in cabecalho.lower().split(","):
+        valor, _, params = parte.partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        if valor.strip():
+            aceitos.add(valor.strip())
+    return aceitos
+
+def escolher_compressao(request: Request):
+    aceitos = _valores_aceitos(request.headers.get("accept-encoding", ""))
+    if brotli is not None and "br" in aceitos:
+        return "br"
+    if "gzip" in aceitos:
+        return "gzip"
+    return None
+
+# monta a resposta direto das tuplas do banco, sem passar pelo jsonable_encoder do FastAPI;
+# msgpack quando o cliente pede (Accept: application/x-msgpack) e brotli/gzip conforme Accept-Encoding
+# extras (versao/excluidos/completo) vão no corpo no formato "colunas"; no formato "objetos" a listagem completa
+# continua uma lista (versao no cabeçalho X-Versao) e a de ?since= vira {"versao", "excluidos", "linhas": [...]}
+def resposta_lista(request: Request, colunas: tuple, dados: list, formato: str = "objetos", extras: dict | None = None) -> Response:
+    inicio = time.perf_counter()
+    extras = extras or {}
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if formato == "colunas":
+        corpo = {"cols": colunas, "rows": dados, **extras}
+    elif extras.keys() - {"versao"}:
+        corpo = {**extras, "linhas": [dict(zip(colunas, d)) for d in dados]}
+    else:
+        corpo = [dict(zip(colunas, d)) for d in dados]
+        if "versao" in extras:
+            headers["X-Versao"] = str(extras["versao"])
+    return resposta_corpo(request, corpo, headers, inicio)
+
+# serializa (msgpack ou JSON, conforme Accept) e compacta qualquer corpo; usado pelas listagens e pela árvore de cursos
+def resposta_corpo(request: Request, corpo, headers: dict | None = None, inicio: float | None = None) -> Response:
+    inicio = inicio or time.perf_counter()
+    headers = headers or {"Vary": "Accept, Accept-Encoding"}
+    if msgpack is not None and MIME_MSGPACK in _valores_aceitos(request.headers.get("accept", "")):
+        conteudo, media_type = msgpack.packb(corpo, use_bin_type=True), MIME_MSGPACK
+    else:
+        conteudo, media_type = serializar_json(corpo), "application/json"
+
+    if len(conteudo) >= COMPRESSAO_MIN_BYTES:
+        compressao = escolher_compressao(request)
+        if compressao == "br":
+            conteudo = brotli.compress(conteudo, quality=4)
+        elif compressao == "gzip":
+            conteudo = gzip.compress(conteudo, compresslevel=5)
+        if compressao:
+            headers["Content-Encoding"] = compressao # o GZipMiddleware não recompacta respostas que já têm Content-Encoding
+    medir_fase("serializacao", time.perf_counter() - inicio)
+    return Response(content=conteudo, media_type=media_type, headers=headers)
+
+# lista uma tabela versionada; com since, só o que foi gravado a partir dessa marca mais os ids excluídos
+# (ou a tabela inteira com "completo" se os registros de exclusão desse período já foram apagados)
+def consultar_lista(tabela: str, colunas: tuple, ordem: str, since: int | None = None):
+    # a marca é lida antes dos dados: o que for gravado entre as duas consultas volta de novo no próximo since.
+    # Tudo no mesmo destino, senão a marca poderia vir de uma réplica mais adiantada que a dos dados
+    destino = db_servidor.destino_leitura()
+    versao = marca_sincronizacao(destino)
+    completo = since is not None and since <= db_servidor.consultar(
+        "SELECT xid::text::bigint FROM horizonte_exclusoes", destino=destino)[0][0]
+    if since is None or completo:
+        dados = db_servidor.consultar(f"SELECT {campos_lista(colunas)} FROM {tabela} ORDER BY {ordem}", destino=destino)
+        return dados, {"versao": versao, "completo": True} if completo else {"versao": versao}
+    dados = db_servidor.consultar(f"SELECT {campos_lista(colunas)} FROM {tabela} WHERE xid >= %s::text::xid8 ORDER BY {ordem}",
+                                  (since,), destino)
+    excluidos = db_servidor.consultar("SELECT registro_id FROM exclusoes WHERE tabela = %s AND xid >= %s::text::xid8",
+                                      (tabela, since), destino)
+    return dados, {"versao": versao, "excluidos": [e[0] for e in excluidos]}
+
+# árvore curso -> turmas numa consulta só (LEFT JOIN, cursos sem turma também aparecem);
+# opcionalmente com as contagens do painel e as primeiras `limite` linhas de alunos/matérias de cada turma
+def consultar_arvore(sigla: str | None, contagens: bool, com_alunos: bool, com_materias: bool, limite: int, destino=None):
+    campos = [campos_lista(COLUNAS_CURSOS, "c."), campos_lista(COLUNAS_TURMAS, "t.")]
+    juncoes = ["LEFT JOIN turmas t ON t.curso_sigla = c.sigla"]
+    params = []
+    if contagens:
+        campos += ["kc.turmas", "kc.alunos", "kc.materias", "kt.alunos", "kt.materias"]
+        juncoes += ["LEFT JOIN contagens_curso kc ON kc.curso_sigla = c.sigla",
+                    "LEFT JOIN contagens_turma kt ON kt.turma = t.turma"]
+    # cada turma traz só uma página dos filhos; o resto vem de /turmas/{turma}/alunos e /turmas/{turma}/materias
+    for incluir, tabela, colunas, ordem in ((com_alunos, "alunos", ARVORE_ALUNOS, "aluno"),
+                                           (com_materias, "materias", ARVORE_MATERIAS, "materia")):
+        if not incluir:
+            continue
+        objeto = ", ".join(f"'{c}', x.{c}" for c in colunas)
+        campos.append(f"{tabela}_pag.linhas")
+        juncoes.append(
+            f"LEFT JOIN LATERAL (SELECT COALESCE(json_agg(json_build_object({objeto}) ORDER BY x.{ordem}), '[]') AS linhas "
+            f"FROM (SELECT {', '.join(colunas)} FROM {tabela} WHERE turma = t.turma ORDER BY {ordem} LIMIT %s) x) {tabela}_pag ON true"
+        )
+        params.append(limite)
+    sql = f"SELECT {', '.join(campos)} FROM cursos c {' '.join(juncoes)}"
+    if sigla:
+        sql += " WHERE c.sigla = %s"
+        params.append(sigla.upper())
+    sql += " ORDER BY c.curso, t.turma"
+    return db_servidor.consultar(sql, tuple(params), destino)
+
+def montar_arvore(linhas, contagens: bool, com_alunos: bool, com_materias: bool) -> list:
+    colunas_curso, colunas_turma = colunas_lista(COLUNAS_CURSOS), colunas_lista(COLUNAS_TURMAS)
+    n_curso, n_turma = len(colunas_curso), len(colunas_turma)
+    cursos = {}
+    for linha in linhas:
+        curso_id = linha[0]
+        no_curso = cursos.get(curso_id)
+        if no_curso is None:
+            no_curso = cursos[curso_id] = dict(zip(colunas_curso, linha[:n_curso]))
+            no_curso["turmas"] = []
+            if contagens:
+                kc = linha[n_curso + n_turma:n_curso + n_turma + 3]
+                no_curso["contagens"] = {"turmas": kc[0] or 0, "alunos": kc[1] or 0, "materias": kc[2] or 0}
+        if linha[n_curso] is None: # curso sem turmas (LEFT JOIN)
+            continue
+        no_turma = dict(zip(colunas_turma, linha[n_curso:n_curso + n_turma]))
+        resto = list(linha[n_curso + n_turma:])
+        if contagens:
+            kt = resto[3:5]
+            no_turma["contagens"] = {"alunos": kt[0] or 0, "materias": kt[1] or 0}
+            resto = resto[5:]
+        if com_alunos:
+            no_turma["alunos"] = resto.pop(0)
+        if com_materias:
+            no_turma["materias"] = resto.pop(0)
+        no_curso["turmas"].append(no_turma)
+    return list(cursos.values())
+
+# página dos filhos de uma turma (continuação do que veio na árvore)
+def consultar_filhos_turma(tabela: str, colunas: tuple, ordem: str, turma: str, offset: int, limite: int):
+    return db_servidor.consultar(
+        f"SELECT {', '.join(colunas)} FROM {tabela} WHERE turma = %s ORDER BY {ordem} LIMIT %s OFFSET %s",
+        (turma.upper(), limite, offset), db_servidor.destino_leitura()
+    )
+
+# linha completa (sem prévia); a versão vai também no ETag, no mesmo formato do If-Match
+def resposta_detalhe(request: Request, tabela: str, colunas: tuple, registro_id: int, nome: str) -> Response:
+    linhas = db_servidor.consultar(f"SELECT {', '.join(colunas)} FROM {tabela} WHERE id = %s", (registro_id,),
+                                   db_servidor.destino_leitura())
+    if not linhas:
+        raise HTTPException(status_code=404, detail=f"{nome} não encontrado(a)")
+    linha = dict(zip(colunas, linhas[0]))
+    return resposta_corpo(request, linha, {"Vary": "Accept, Accept-Encoding", "ETag": f'"{linha["versao"]}"'})
+
+# If-Match: "<versao>" (como ETag); None quando ausente ou "*"
+def versao_esperada(if_match: str | None) -> int | None:
+    if not if_match or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match inválido")
+
+# UPDATE/DELETE ... WHERE id=%s com checagem otimista da versão: 412 se outra pessoa alterou antes, 404 se não existe
+def executar_versionado(tabela: str, sql: str, params: tuple, registro_id: int, if_match: str | None, nome: str):
+    versao = versao_esperada(if_match)
+    if versao is not None:
+        sql, params = sql + " AND versao = %s", params + (versao,)
+    if db_servidor.executar(sql, params) == 0:
+        if versao is not None and db_servidor.consultar(f"SELECT 1 FROM {tabela} WHERE id = %s", (registro_id,)):
+            raise HTTPException(status_code=412, detail=f"{nome} alterado(a) por outro usuário; recarregue e tente novamente")
+        raise HTTPException(status_code=404, detail=f"{nome} não encontrado(a)")
+
 # Autenticação
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -201,36 +1106,126 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_current_user(token: str = Depends(oauth2_scheme)): # verifica token e, se inválido, erro 401
+    inicio = time.perf_counter()
+    try:
+        usuario = _validar_usuario(token)
+        usuario_atual.set(usuario) # executar/destino_leitura usam para a leitura das próprias escritas
+        return usuario
+    finally:
+        medir_fase("auth", time.perf_counter() - inicio) # inclui o SELECT em users (que também conta em sql)
+
+def _validar_usuario(token: str):
     credentials_exception = HTTPException(
         status_code=401,
         detail="Credenciais inválidas",
         headers={"WWW-Authenticate": "Bearer"}
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            raise credentials_exception
-    except JWTError:
+    payload = ler_token(token)
+    if payload is None:
         raise credentials_exception
+    username: str = payload["sub"]
+    campus_atual.set(payload["campus"]) # daqui em diante a requisição usa o pool/esquema desse campus
 
-    conn = connection_pool.getconn()
-    cursor = conn.cursor()
-    cursor.execute("SELECT username FROM users WHERE username = %s", (username,))
-    user = cursor.fetchone()
-    cursor.close()
-    connection_pool.putconn(conn)
+    user = db_servidor.consultar(f"SELECT username FROM {TABELA_USUARIOS} WHERE username = %s", (username,))
     if not user:
         raise credentials_exception
-    return user[0]
+    return user[0][0]
+
+# payload do token se a assinatura e a validade conferem ("campus" sempre preenchido e conhecido); senão None.
+# Não consulta o banco: serve para o controle de admissão e o Socket.IO
+def ler_token(token: str) -> dict | None:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    campus = payload.get("campus") or CAMPUS_PADRAO # tokens emitidos antes dos campi
+    if not payload.get("sub") or campus not in CAMPI:
+        return None
+    return {**payload, "campus": campus}
+
+# campus informado no login/registro
+def escolher_campus(campus: str | None) -> str:
+    campus = (campus or CAMPUS_PADRAO).lower()
+    if campus not in CAMPI:
+        raise HTTPException(status_code=400, detail="Campus desconhecido")
+    campus_atual.set(campus)
+    return campus
+
+# roda hash/verify do bcrypt no executor próprio, medindo a fila
+async def em_fila_bcrypt(operacao: str, funcao, *args):
+    METRICA_BCRYPT_FILA.inc()
+    inicio = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor_bcrypt, funcao, *args)
+    finally:
+        duracao = time.perf_counter() - inicio
+        METRICA_BCRYPT_FILA.dec()
+        METRICA_BCRYPT.observe(duracao, operacao=operacao)
+        medir_fase("bcrypt", duracao)
+
+# emite um evento Socket.IO só para a sala do campus da requisição, contando nas métricas; cada evento leva
+# o número de sequência do campus ("seq") e fica guardado em eventos_campus para reenvio a quem reconectar
+async def emitir(evento: str, dados=None):
+    campus = campus_atual.get()
+    METRICA_SIO_EMITS.inc(evento=evento, campus=campus)
+    inicio = time.perf_counter()
+    dados = eventos_campus[campus].registrar(evento, dados)
+    await sio.emit(evento, dados, room=sala_campus(campus))
+    medir_fase("emit", time.perf_counter() - inicio)
+
+# tarefas em segundo plano: TAREFAS_SIMULTANEAS threads (cada tarefa segura uma conexão do pool do seu campus
+# enquanto roda) e até TAREFAS_FILA esperando; o andamento vai só para quem pediu, no evento "tarefa"
+TAREFAS_SIMULTANEAS = int(os.getenv("TAREFAS_SIMULTANEAS", "2"))
+TAREFAS_FILA = int(os.getenv("TAREFAS_FILA", "100"))
+loop_principal = None # event loop do servidor, para as threads das tarefas emitirem eventos (definido no startup)
+
+# "tarefa" não entra na sequência de eventos (não é reenviado na reconexão): o estado final fica em /jobs/{id}
+async def emitir_tarefa(campus: str, dono: str, dados: dict):
+    METRICA_SIO_EMITS.inc(evento="tarefa", campus=campus)
+    await sio.emit("tarefa", dados, room=sala_usuario(campus, dono))
+
+def avisar_tarefa(tarefa):
+    if loop_principal is not None:
+        asyncio.run_coroutine_threadsafe(emitir_tarefa(tarefa.campus, tarefa.dono, tarefa.resumo()), loop_principal)
+
+fila_tarefas = FilaTarefas(TAREFAS_SIMULTANEAS, TAREFAS_FILA, ao_mudar=avisar_tarefa)
+
+# roda a corrotina no event loop a partir da thread de uma tarefa e espera terminar; a tarefa do loop herda o
+# contexto da thread (o campus da tarefa), então emitir() vai para a sala certa
+def no_loop(corrotina):
+    return asyncio.run_coroutine_threadsafe(corrotina, loop_principal).result()
+
+# coloca funcao(progresso, *args) na fila, com o campus e o usuário da requisição; 503 com a fila cheia
+def submeter_tarefa(tipo: str, funcao, *args):
+    def rodar(progresso, *args):
+        rastro_atual.set(None) # a requisição que pediu já respondeu; o SQL da tarefa não entra no rastro dela
+        return funcao(progresso, *args)
+    try:
+        return fila_tarefas.submeter(tipo, usuario_atual.get(), campus_atual.get(), rodar, *args)
+    except Recusada as r:
+        raise HTTPException(status_code=r.status, detail="Muitas tarefas na fila; tente novamente em instantes",
+                            headers={"Retry-After": str(r.retry_after)})
+
+def resposta_tarefa(tarefa) -> Response:
+    return Response(content=serializar_json(tarefa.resumo()), status_code=202, media_type="application/json",
+                    headers={"Location": f"/jobs/{tarefa.id}"})
+
+# estado de uma tarefa; só quem pediu (no mesmo campus) enxerga
+@app.get("/jobs/{tarefa_id}")
+async def get_tarefa(tarefa_id: str, current_user: str = Depends(get_current_user)):
+    tarefa = fila_tarefas.obter(tarefa_id)
+    if tarefa is None or tarefa.campus != campus_atual.get() or tarefa.dono != current_user:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return tarefa.resumo()
 
 # wndpoints de autenticação
 @app.post("/register") # adiciona
 async def register_user(user: LoginData):
-    hashed = pwd_context.hash(user.password)
+    escolher_campus(user.campus)
+    hashed = await em_fila_bcrypt("hash", pwd_context.hash, user.password)
     try:
         db_servidor.executar(
-            "INSERT INTO users (username, hashed_password) VALUES (%s, %s)",
+            f"INSERT INTO {TABELA_USUARIOS} (username, hashed_password) VALUES (%s, %s)",
             (user.username, hashed)
         )
         return {"message": "Usuário registrado"}
@@ -239,17 +1234,13 @@ async def register_user(user: LoginData):
 
 @app.post("/login")
 async def login(data: LoginData):
-    conn = connection_pool.getconn()
-    cursor = conn.cursor()
-    cursor.execute("SELECT hashed_password FROM users WHERE username = %s", (data.username,))
-    user = cursor.fetchone()
-    cursor.close()
-    connection_pool.putconn(conn)
+    campus = escolher_campus(data.campus)
+    user = db_servidor.consultar(f"SELECT hashed_password FROM {TABELA_USUARIOS} WHERE username = %s", (data.username,))
     
-    if not user or not pwd_context.verify(data.password, user[0]):
+    if not user or not await em_fila_bcrypt("verify", pwd_context.verify, data.password, user[0][0]):
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
     
-    token = create_access_token({"sub": data.username})
+    token = create_access_token({"sub": data.username, "campus": campus})
     return {"access_token": token, "token_type": "bearer"}
 
 @app.post("/alunos")
@@ -259,34 +1250,38 @@ async def add_aluno(aluno: AlunoCreate, current_user: str = Depends(get_current_
             "INSERT INTO alunos (aluno, ra, email, curso_sigla, turma) VALUES (%s, %s, %s, %s, %s)",
             (aluno.aluno.title(), aluno.ra.upper(), aluno.email.lower(), aluno.curso_sigla.upper(), aluno.turma.upper())
         )
-        await sio.emit("atualizar_alunos", {}) # atualiza sistema em tempo real
+        await emitir("atualizar_alunos") # atualiza sistema em tempo real
         return {"message": "Aluno adicionado"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/alunos") # lista
-async def get_alunos(current_user: str = Depends(get_current_user)):
-    dados = db_servidor.consultar("SELECT id, aluno, ra, email, curso_sigla, turma FROM alunos ORDER BY aluno")
-    return [{"id": d[0], "aluno": d[1], "ra": d[2], "email": d[3], "curso_sigla": d[4], "turma": d[5]} for d in dados]
+async def get_alunos(request: Request, formato: str = FORMATO_LISTA, since: int | None = SINCE, current_user: str = Depends(get_current_user)):
+    dados, extras = consultar_lista("alunos", COLUNAS_ALUNOS, "aluno", since)
+    return resposta_lista(request, colunas_lista(COLUNAS_ALUNOS), dados, formato, extras)
 
 @app.put("/alunos/{aluno_id}") # altera
-async def update_aluno(aluno_id: int, aluno: AlunoCreate, current_user: str = Depends(get_current_user)):
+async def update_aluno(aluno_id: int, aluno: AlunoCreate, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar(
-            "UPDATE alunos SET aluno=%s, ra=%s, email=%s, curso_sigla=%s, turma=%s WHERE id=%s",
-            (aluno.aluno.title(), aluno.ra.upper(), aluno.email.lower(), aluno.curso_sigla.upper(), aluno.turma.upper(), aluno_id)
+        executar_versionado(
+            "alunos", "UPDATE alunos SET aluno=%s, ra=%s, email=%s, curso_sigla=%s, turma=%s WHERE id=%s",
+            (aluno.aluno.title(), aluno.ra.upper(), aluno.email.lower(), aluno.curso_sigla.upper(), aluno.turma.upper(), aluno_id), aluno_id, if_match, "Aluno"
         )
-        await sio.emit("atualizar_alunos", {})
+        await emitir("atualizar_alunos")
         return {"message": "Aluno alterado"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/alunos/{aluno_id}")
-async def delete_aluno(aluno_id: int, current_user: str = Depends(get_current_user)):
+async def delete_aluno(aluno_id: int, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar("DELETE FROM alunos WHERE id=%s", (aluno_id,))
-        await sio.emit("atualizar_alunos", {})
+        executar_versionado("alunos", "DELETE FROM alunos WHERE id=%s", (aluno_id,), aluno_id, if_match, "Aluno")
+        await emitir("atualizar_alunos")
         return {"message": "Aluno excluído"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -297,18 +1292,45 @@ async def add_curso(curso: CursoCreate, current_user: str = Depends(get_current_
             "INSERT INTO cursos (curso, sigla, area, descricao) VALUES (%s, %s, %s, %s)",
             (curso.curso.title(), curso.sigla.upper(), curso.area.title(), curso.descricao.strip())
         )
-        await sio.emit("atualizar_cursos", {})
+        await emitir("atualizar_cursos")
         return {"message": "Curso adicionado"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/cursos")
-async def get_cursos(current_user: str = Depends(get_current_user)):
-    dados = db_servidor.consultar("SELECT id, curso, sigla, area, descricao FROM cursos ORDER BY curso")
-    return [{"id": d[0], "curso": d[1], "sigla": d[2], "area": d[3], "descricao": d[4]} for d in dados]
+async def get_cursos(request: Request, formato: str = FORMATO_LISTA, since: int | None = SINCE, current_user: str = Depends(get_current_user)):
+    dados, extras = consultar_lista("cursos", COLUNAS_CURSOS, "curso", since)
+    return resposta_lista(request, colunas_lista(COLUNAS_CURSOS), dados, formato, extras)
+
+# curso -> turmas (-> alunos/matérias) numa ida só; a marca devolvida permite continuar com ?since= nas listagens
+@app.get("/cursos/arvore")
+async def get_cursos_arvore(request: Request, sigla: str | None = None, contagens: bool = False,
+                            alunos: bool = False, materias: bool = False, limite: int = Query(50, ge=1, le=500),
+                            current_user: str = Depends(get_current_user)):
+    destino = db_servidor.destino_leitura() # marca e árvore do mesmo banco (como em consultar_lista)
+    versao = marca_sincronizacao(destino)
+    linhas = consultar_arvore(sigla, contagens, alunos, materias, limite, destino)
+    inicio = time.perf_counter()
+    return resposta_corpo(request, {"versao": versao, "cursos": montar_arvore(linhas, contagens, alunos, materias)}, inicio=inicio)
+
+@app.get("/cursos/{curso_id}") # depois de /cursos/arvore, senão "arvore" cairia aqui como id
+async def get_curso(request: Request, curso_id: int, current_user: str = Depends(get_current_user)):
+    return resposta_detalhe(request, "cursos", COLUNAS_CURSOS, curso_id, "Curso")
+
+@app.get("/turmas/{turma}/alunos")
+async def get_alunos_turma(request: Request, turma: str, offset: int = Query(0, ge=0), limite: int = Query(50, ge=1, le=500),
+                           formato: str = FORMATO_LISTA, current_user: str = Depends(get_current_user)):
+    dados = consultar_filhos_turma("alunos", ARVORE_ALUNOS, "aluno", turma, offset, limite)
+    return resposta_lista(request, ARVORE_ALUNOS, dados, formato)
+
+@app.get("/turmas/{turma}/materias")
+async def get_materias_turma(request: Request, turma: str, offset: int = Query(0, ge=0), limite: int = Query(50, ge=1, le=500),
+                             formato: str = FORMATO_LISTA, current_user: str = Depends(get_current_user)):
+    dados = consultar_filhos_turma("materias", ARVORE_MATERIAS, "materia", turma, offset, limite)
+    return resposta_lista(request, ARVORE_MATERIAS, dados, formato)
 
 @app.put("/cursos/{curso_id}")
-async def update_curso(curso_id: int, curso: CursoCreate, current_user: str = Depends(get_current_user)):
+async def update_curso(curso_id: int, curso: CursoCreate, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     atual = db_servidor.consultar("SELECT sigla FROM cursos WHERE id = %s", (curso_id,))
     if not atual:
         raise HTTPException(status_code=404, detail="Curso não encontrado")
@@ -319,37 +1341,63 @@ async def update_curso(curso_id: int, curso: CursoCreate, current_user: str = De
         if turmas:
             raise HTTPException(status_code=400, detail="Não é possível alterar a sigla: há turmas associadas.")
     try:
-        db_servidor.executar(
-            "UPDATE cursos SET curso=%s, sigla=%s, area=%s, descricao=%s WHERE id=%s",
-            (curso.curso.title(), nova_sigla, curso.area.title(), curso.descricao.strip(), curso_id)
+        executar_versionado(
+            "cursos", "UPDATE cursos SET curso=%s, sigla=%s, area=%s, descricao=%s WHERE id=%s",
+            (curso.curso.title(), nova_sigla, curso.area.title(), curso.descricao.strip(), curso_id), curso_id, if_match, "Curso"
         )
-        await sio.emit("atualizar_cursos", {})
+        await emitir("atualizar_cursos")
         return {"message": "Curso alterado"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/cursos/{curso_id}")
-async def delete_curso(curso_id: int, current_user: str = Depends(get_current_user)):
+async def delete_curso(curso_id: int, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar("DELETE FROM cursos WHERE id=%s", (curso_id,))
-        await sio.emit("atualizar_cursos", {})
+        executar_versionado("cursos", "DELETE FROM cursos WHERE id=%s", (curso_id,), curso_id, if_match, "Curso")
+        await emitir("atualizar_cursos")
         return {"message": "Curso excluído"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.delete("/cursos/{curso_id}/cascade")
-async def delete_curso_cascade(curso_id: int, current_user: str = Depends(get_current_user)):
-    if not db_servidor.consultar("SELECT 1 FROM cursos WHERE id = %s", (curso_id,)):
+# apaga o curso e tudo que depende dele turma a turma (matérias, alunos e a turma, pelos índices de turma) e por
+# fim o curso, numa transação só: o resultado é o mesmo do DELETE com ON DELETE CASCADE, com progresso a cada turma.
+# As exclusões das primeiras turmas ficam registradas bem antes do commit; como levam o xid da tarefa, a marca do
+# ?since= não passa delas enquanto a tarefa roda (ver MARCA_SINCRONIZACAO)
+def excluir_curso_cascata(progresso, curso_id: int, versao: int | None):
+    with db_servidor.transacao() as executar:
+        linha = executar("SELECT sigla, versao FROM cursos WHERE id = %s FOR UPDATE", (curso_id,))
+        if not linha:
+            raise ValueError("Curso não encontrado")
+        sigla, versao_atual = linha[0]
+        if versao is not None and versao_atual != versao:
+            raise ValueError("Curso alterado por outro usuário; recarregue e tente novamente")
+        contagem = executar("SELECT turmas + alunos + materias FROM contagens_curso WHERE curso_sigla = %s", (sigla,))
+        total = (contagem[0][0] if contagem else 0) + 1
+        excluidos = {"materias": 0, "alunos": 0, "turmas": 0}
+        turmas = [t for (t,) in executar("SELECT turma FROM turmas WHERE curso_sigla = %s", (sigla,))]
+        for i, turma in enumerate(turmas, 1):
+            for tabela in ("materias", "alunos", "turmas"):
+                excluidos[tabela] += executar(f"DELETE FROM {tabela} WHERE turma = %s", (turma,))
+            progresso(sum(excluidos.values()) / total, f"Turma {i} de {len(turmas)}")
+        executar("DELETE FROM cursos WHERE id = %s", (curso_id,)) # o ON DELETE CASCADE leva o que ficou fora das turmas
+    for evento in ("atualizar_cursos", "atualizar_turmas", "atualizar_alunos", "atualizar_materias"):
+        no_loop(emitir(evento))
+    return {"curso": sigla, **excluidos}
+
+# exclusão em cascata vira tarefa: responde 202 na hora com o id (acompanhar em /jobs/{id} ou no evento "tarefa")
+@app.delete("/cursos/{curso_id}/cascade", status_code=202)
+async def delete_curso_cascade(curso_id: int, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
+    versao = versao_esperada(if_match)
+    atual = db_servidor.consultar("SELECT versao FROM cursos WHERE id = %s", (curso_id,))
+    if not atual:
         raise HTTPException(status_code=404, detail="Curso não encontrado")
-    try:
-        db_servidor.executar("DELETE FROM cursos WHERE id = %s", (curso_id,))
-        await sio.emit("atualizar_cursos", {})
-        await sio.emit("atualizar_turmas", {})
-        await sio.emit("atualizar_alunos", {})
-        await sio.emit("atualizar_materias", {})
-        return {"message": "Curso e tudo relacionado excluído"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if versao is not None and atual[0][0] != versao:
+        raise HTTPException(status_code=412, detail="Curso alterado por outro usuário; recarregue e tente novamente")
+    return resposta_tarefa(submeter_tarefa("excluir_curso", excluir_curso_cascata, curso_id, versao))
 
 @app.post("/turmas")
 async def add_turma(turma: TurmaCreate, current_user: str = Depends(get_current_user)):
@@ -358,34 +1406,42 @@ async def add_turma(turma: TurmaCreate, current_user: str = Depends(get_current_
             "INSERT INTO turmas (turma, curso_sigla, descricao) VALUES (%s, %s, %s)",
             (turma.turma.upper(), turma.curso_sigla.upper(), turma.descricao.strip())
         )
-        await sio.emit("atualizar_turmas", {})
+        await emitir("atualizar_turmas")
         return {"message": "Turma adicionada"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/turmas")
-async def get_turmas(current_user: str = Depends(get_current_user)):
-    dados = db_servidor.consultar("SELECT id, turma, curso_sigla, descricao FROM turmas ORDER BY turma")
-    return [{"id": d[0], "turma": d[1], "curso_sigla": d[2], "descricao": d[3]} for d in dados]
+async def get_turmas(request: Request, formato: str = FORMATO_LISTA, since: int | None = SINCE, current_user: str = Depends(get_current_user)):
+    dados, extras = consultar_lista("turmas", COLUNAS_TURMAS, "turma", since)
+    return resposta_lista(request, colunas_lista(COLUNAS_TURMAS), dados, formato, extras)
+
+@app.get("/turmas/{turma_id}") # detalhe (texto completo)
+async def get_turma(request: Request, turma_id: int, current_user: str = Depends(get_current_user)):
+    return resposta_detalhe(request, "turmas", COLUNAS_TURMAS, turma_id, "Turma")
 
 @app.put("/turmas/{turma_id}")
-async def update_turma(turma_id: int, turma: TurmaCreate, current_user: str = Depends(get_current_user)):
+async def update_turma(turma_id: int, turma: TurmaCreate, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar(
-            "UPDATE turmas SET turma=%s, curso_sigla=%s, descricao=%s WHERE id=%s",
-            (turma.turma.upper(), turma.curso_sigla.upper(), turma.descricao.strip(), turma_id)
+        executar_versionado(
+            "turmas", "UPDATE turmas SET turma=%s, curso_sigla=%s, descricao=%s WHERE id=%s",
+            (turma.turma.upper(), turma.curso_sigla.upper(), turma.descricao.strip(), turma_id), turma_id, if_match, "Turma"
         )
-        await sio.emit("atualizar_turmas", {})
+        await emitir("atualizar_turmas")
         return {"message": "Turma alterada"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/turmas/{turma_id}")
-async def delete_turma(turma_id: int, current_user: str = Depends(get_current_user)):
+async def delete_turma(turma_id: int, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar("DELETE FROM turmas WHERE id=%s", (turma_id,))
-        await sio.emit("atualizar_turmas", {})
+        executar_versionado("turmas", "DELETE FROM turmas WHERE id=%s", (turma_id,), turma_id, if_match, "Turma")
+        await emitir("atualizar_turmas")
         return {"message": "Turma excluída"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -396,34 +1452,42 @@ async def add_materia(materia: MateriaCreate, current_user: str = Depends(get_cu
             "INSERT INTO materias (materia, professor, email, curso_sigla, turma, descricao) VALUES (%s, %s, %s, %s, %s, %s)",
             (materia.materia.title(), materia.professor.title(), materia.email.lower(), materia.curso_sigla.upper(), materia.turma.upper(), materia.descricao.strip())
         )
-        await sio.emit("atualizar_materias", {})
+        await emitir("atualizar_materias")
         return {"message": "Matéria adicionada"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/materias")
-async def get_materias(current_user: str = Depends(get_current_user)):
-    dados = db_servidor.consultar("SELECT id, materia, professor, email, curso_sigla, turma, descricao FROM materias ORDER BY materia")
-    return [{"id": d[0], "materia": d[1], "professor": d[2], "email": d[3], "curso_sigla": d[4], "turma": d[5], "descricao": d[6]} for d in dados]
+async def get_materias(request: Request, formato: str = FORMATO_LISTA, since: int | None = SINCE, current_user: str = Depends(get_current_user)):
+    dados, extras = consultar_lista("materias", COLUNAS_MATERIAS, "materia", since)
+    return resposta_lista(request, colunas_lista(COLUNAS_MATERIAS), dados, formato, extras)
+
+@app.get("/materias/{materia_id}") # detalhe (texto completo)
+async def get_materia(request: Request, materia_id: int, current_user: str = Depends(get_current_user)):
+    return resposta_detalhe(request, "materias", COLUNAS_MATERIAS, materia_id, "Matéria")
 
 @app.put("/materias/{materia_id}")
-async def update_materia(materia_id: int, materia: MateriaCreate, current_user: str = Depends(get_current_user)):
+async def update_materia(materia_id: int, materia: MateriaCreate, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar(
-            "UPDATE materias SET materia=%s, professor=%s, email=%s, curso_sigla=%s, turma=%s, descricao=%s WHERE id=%s",
-            (materia.materia.title(), materia.professor.title(), materia.email.lower(), materia.curso_sigla.upper(), materia.turma.upper(), materia.descricao.strip (), materia_id)
+        executar_versionado(
+            "materias", "UPDATE materias SET materia=%s, professor=%s, email=%s, curso_sigla=%s, turma=%s, descricao=%s WHERE id=%s",
+            (materia.materia.title(), materia.professor.title(), materia.email.lower(), materia.curso_sigla.upper(), materia.turma.upper(), materia.descricao.strip (), materia_id), materia_id, if_match, "Matéria"
         )
-        await sio.emit("atualizar_materias", {})
+        await emitir("atualizar_materias")
         return {"message": "Matéria alterada"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/materias/{materia_id}")
-async def delete_materia(materia_id: int, current_user: str = Depends(get_current_user)):
+async def delete_materia(materia_id: int, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar("DELETE FROM materias WHERE id=%s", (materia_id,))
-        await sio.emit("atualizar_materias", {})
+        executar_versionado("materias", "DELETE FROM materias WHERE id=%s", (materia_id,), materia_id, if_match, "Matéria")
+        await emitir("atualizar_materias")
         return {"message": "Matéria excluída"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -434,44 +1498,467 @@ async def add_chatbot_resposta(resposta: ChatbotRespostaCreate, current_user: st
             "INSERT INTO chatbot_respostas (pergunta, resposta) VALUES (%s, %s)",
             (resposta.pergunta, resposta.resposta)
         )
-        await sio.emit("atualizar_chatbot", {})
+        await emitir("atualizar_chatbot")
         return {"message": "Resposta adicionada"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/chatbot_respostas")
-async def get_chatbot_respostas(current_user: str = Depends(get_current_user)):
-    dados = db_servidor.consultar("SELECT id, pergunta, resposta FROM chatbot_respostas ORDER BY pergunta")
-    return [{"id": d[0], "pergunta": d[1], "resposta": d[2]} for d in dados]
+async def get_chatbot_respostas(request: Request, formato: str = FORMATO_LISTA, since: int | None = SINCE, current_user: str = Depends(get_current_user)):
+    dados, extras = consultar_lista("chatbot_respostas", COLUNAS_CHATBOT, "pergunta", since)
+    return resposta_lista(request, colunas_lista(COLUNAS_CHATBOT), dados, formato, extras)
+
+@app.get("/chatbot_respostas/{resposta_id}") # detalhe (texto completo)
+async def get_chatbot_resposta(request: Request, resposta_id: int, current_user: str = Depends(get_current_user)):
+    return resposta_detalhe(request, "chatbot_respostas", COLUNAS_CHATBOT, resposta_id, "Resposta")
 
 @app.put("/chatbot_respostas/{resposta_id}")
-async def update_chatbot_resposta(resposta_id: int, resposta: ChatbotRespostaCreate, current_user: str = Depends(get_current_user)):
+async def update_chatbot_resposta(resposta_id: int, resposta: ChatbotRespostaCreate, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar(
-            "UPDATE chatbot_respostas SET pergunta=%s, resposta=%s WHERE id=%s",
-            (resposta.pergunta, resposta.resposta, resposta_id)
+        executar_versionado(
+            "chatbot_respostas", "UPDATE chatbot_respostas SET pergunta=%s, resposta=%s WHERE id=%s",
+            (resposta.pergunta, resposta.resposta, resposta_id), resposta_id, if_match, "Resposta"
         )
-        await sio.emit("atualizar_chatbot", {})
+        await emitir("atualizar_chatbot")
         return {"message": "Resposta alterada"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/chatbot_respostas/{resposta_id}")
-async def delete_chatbot_resposta(resposta_id: int, current_user: str = Depends(get_current_user)):
+async def delete_chatbot_resposta(resposta_id: int, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
     try:
-        db_servidor.executar("DELETE FROM chatbot_respostas WHERE id=%s", (resposta_id,))
-        await sio.emit("atualizar_chatbot", {})
+        executar_versionado("chatbot_respostas", "DELETE FROM chatbot_respostas WHERE id=%s", (resposta_id,), resposta_id, if_match, "Resposta")
+        await emitir("atualizar_chatbot")
         return {"message": "Resposta excluída"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# grade de horários em memória por campus (grade_horarios.py), refeita só quando horarios ou materias mudam
+# (professor e turma vêm da matéria). A assinatura usa contagem, soma e máximo das versões: pega também
+# exclusões e gravações que terminam fora da ordem em que pegaram a versão
+grades = {} # campus -> (assinatura, GradeHorarios)
+SQL_ASSINATURA_GRADE = """
+    SELECT (SELECT (count(*), sum(versao), max(versao))::text FROM horarios),
+           (SELECT (count(*), sum(versao), max(versao))::text FROM materias)
+"""
+SQL_GRADE = """
+    SELECT h.id, h.materia_id, m.professor, m.turma, h.sala, h.dia_semana, h.inicio, h.fim
+    FROM horarios h JOIN materias m ON m.id = h.materia_id
+"""
+# gravações na grade uma por vez em cada campus (o choque é conferido e gravado sem ninguém no meio)
+SQL_TRAVAR_GRADE = "SELECT pg_try_advisory_xact_lock(hashtext('sistema_academico_horarios:' || current_schema()))"
+MAX_CONFLITOS = 500 # quantos choques a resposta 409 lista
+MAX_AULAS_PROPOSTA = 5000
+
+# trava a grade na transação de `executar`. O pg_advisory_xact_lock esperaria sem limite com o event loop parado;
+# aqui cada tentativa volta na hora e a espera entre elas é um asyncio.sleep, até FILA_ESPERA_MS: depois disso, 503
+async def travar_grade(executar):
+    limite = time.monotonic() + FILA_ESPERA_MS / 1000
+    while not executar(SQL_TRAVAR_GRADE)[0][0]:
+        if time.monotonic() >= limite:
+            raise HTTPException(status_code=503, detail="Grade de horários em uso por outra gravação; tente novamente em instantes",
+                                headers={"Retry-After": "1"})
+        await asyncio.sleep(0.05)
+
+# consultar: db_servidor.consultar, ou o executar de uma transação que já travou a grade
+def grade_atual(consultar=None) -> GradeHorarios:
+    consultar = consultar or db_servidor.consultar
+    campus = campus_atual.get()
+    assinatura = tuple(consultar(SQL_ASSINATURA_GRADE)[0])
+    atual = grades.get(campus)
+    if atual is None or atual[0] != assinatura:
+        atual = grades[campus] = (assinatura, GradeHorarios(Horario(*linha) for linha in consultar(SQL_GRADE)))
+    return atual[1]
+
+# professor e turma de cada matéria pedida; 400 se alguma não existe
+def materias_da_grade(materia_ids, consultar=None) -> dict:
+    consultar = consultar or db_servidor.consultar
+    ids = sorted(set(materia_ids))
+    materias = {m[0]: (m[1], m[2]) for m in consultar("SELECT id, professor, turma FROM materias WHERE id = ANY(%s)", (ids,))}
+    faltando = [i for i in ids if i not in materias]
+    if faltando:
+        raise HTTPException(status_code=400, detail=f"Matéria(s) não encontrada(s): {', '.join(map(str, faltando))}")
+    return materias
+
+def horarios_do_pedido(pedidos: list[HorarioCreate], consultar=None) -> list[Horario]:
+    materias = materias_da_grade([p.materia_id for p in pedidos], consultar)
+    horarios = []
+    for p in pedidos:
+        if p.inicio >= p.fim:
+            raise HTTPException(status_code=400, detail="O horário precisa terminar depois de começar")
+        if not p.sala.strip():
+            raise HTTPException(status_code=400, detail="Informe a sala")
+        horarios.append(Horario(None, p.materia_id, *materias[p.materia_id], p.sala.strip(), p.dia_semana, p.inicio, p.fim))
+    return horarios
+
+def resposta_conflitos(conflitos: list) -> Response:
+    corpo = {"detail": "Choque de horários", "total": len(conflitos), "conflitos": conflitos[:MAX_CONFLITOS]}
+    return Response(content=serializar_json(corpo), status_code=409, media_type="application/json")
+
+@app.get("/horarios")
+async def get_horarios(request: Request, formato: str = FORMATO_LISTA, since: int | None = SINCE, current_user: str = Depends(get_current_user)):
+    dados, extras = consultar_lista("horarios", COLUNAS_HORARIOS, "dia_semana, inicio, sala", since)
+    return resposta_lista(request, colunas_lista(COLUNAS_HORARIOS), dados, formato, extras)
+
+# confere um horário sem gravar (para a tela do coordenador avisar enquanto ele edita); horario_id: o horário
+# que está sendo alterado, que não choca consigo mesmo
+@app.post("/horarios/validar")
+async def validar_horario(horario: HorarioCreate, horario_id: int | None = Query(None), current_user: str = Depends(get_current_user)):
+    novo = horarios_do_pedido([horario])[0]._replace(id=horario_id)
+    return {"conflitos": grade_atual().conflitos(novo)}
+
+@app.post("/horarios")
+async def add_horario(horario: HorarioCreate, current_user: str = Depends(get_current_user)):
+    with db_servidor.transacao() as executar:
+        await travar_grade(executar)
+        novo = horarios_do_pedido([horario], executar)[0]
+        conflitos = grade_atual(executar).conflitos(novo)
+        if conflitos:
+            return resposta_conflitos(conflitos)
+        horario_id = executar(
+            "INSERT INTO horarios (materia_id, dia_semana, inicio, fim, sala) VALUES (%s, %s, %s, %s, %s) RETURNING id",
+            (novo.materia_id, novo.dia_semana, novo.inicio, novo.fim, novo.sala)
+        )[0][0]
+    await emitir("atualizar_horarios")
+    return {"message": "Horário adicionado", "id": horario_id}
+
+# importação do semestre: tudo ou nada. Confere o lote contra a grade e entre si (ou só entre si, com
+# substituir=true, que troca a grade inteira) e grava numa instrução só
+@app.post("/horarios/importar")
+async def importar_horarios(horarios: list[HorarioCreate], substituir: bool = Query(False), current_user: str = Depends(get_current_user)):
+    if not horarios:
+        raise HTTPException(status_code=400, detail="Nenhum horário para importar")
+    with db_servidor.transacao() as executar:
+        await travar_grade(executar)
+        novos = horarios_do_pedido(horarios, executar)
+        conflitos = grade_atual(executar).conflitos_lote(novos, com_grade=not substituir)
+        if conflitos:
+            return resposta_conflitos(conflitos)
+        if substituir:
+            executar("DELETE FROM horarios")
+        executar(
+            "INSERT INTO horarios (materia_id, dia_semana, inicio, fim, sala) "
+            "SELECT * FROM unnest(%s::int[], %s::smallint[], %s::smallint[], %s::smallint[], %s::text[])",
+            tuple(list(coluna) for coluna in zip(*((h.materia_id, h.dia_semana, h.inicio, h.fim, h.sala) for h in novos)))
+        )
+    await emitir("atualizar_horarios")
+    return {"message": f"{len(novos)} horário(s) importado(s)", "importados": len(novos)}
+
+# propõe horários sem choque para as aulas pedidas (não grava; o coordenador revisa e importa). O solver roda
+# fora do event loop: com milhares de aulas leva algumas centenas de ms
+@app.post("/horarios/propor")
+async def propor_horarios(pedido: PropostaPedido, current_user: str = Depends(get_current_user)):
+    if pedido.inicio_dia >= pedido.fim_dia:
+        raise HTTPException(status_code=400, detail="inicio_dia precisa ser antes de fim_dia")
+    if not pedido.dias or any(not 1 <= d <= 7 for d in pedido.dias):
+        raise HTTPException(status_code=400, detail="dias: use 1 (segunda) a 7 (domingo)")
+    if sum(a.quantidade for a in pedido.aulas) > MAX_AULAS_PROPOSTA:
+        raise HTTPException(status_code=400, detail=f"No máximo {MAX_AULAS_PROPOSTA} aulas por proposta")
+    grade = grade_atual()
+    materias = materias_da_grade([a.materia_id for a in pedido.aulas])
+    aulas = [Aula(a.materia_id, *materias[a.materia_id], a.duracao) for a in pedido.aulas for _ in range(a.quantidade)]
+    salas = [s.strip() for s in pedido.salas or () if s.strip()] or sorted({h.sala for h in grade.horarios.values()})
+    if not salas:
+        raise HTTPException(status_code=400, detail="Informe as salas (a grade ainda não tem nenhuma)")
+    propostas, sobras = await asyncio.get_running_loop().run_in_executor(
+        None, grade.propor, aulas, sorted(set(pedido.dias)), pedido.inicio_dia, pedido.fim_dia, pedido.passo, salas)
+    return {"propostas": [{k: v for k, v in h._asdict().items() if k != "id"} for h in propostas], "nao_alocadas": sobras}
+
+@app.put("/horarios/{horario_id}")
+async def update_horario(horario_id: int, horario: HorarioCreate, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
+    versao = versao_esperada(if_match)
+    with db_servidor.transacao() as executar:
+        await travar_grade(executar)
+        atual = executar("SELECT versao FROM horarios WHERE id = %s", (horario_id,))
+        if not atual:
+            raise HTTPException(status_code=404, detail="Horário não encontrado")
+        if versao is not None and atual[0][0] != versao:
+            raise HTTPException(status_code=412, detail="Horário alterado por outro usuário; recarregue e tente novamente")
+        novo = horarios_do_pedido([horario], executar)[0]._replace(id=horario_id)
+        conflitos = grade_atual(executar).conflitos(novo)
+        if conflitos:
+            return resposta_conflitos(conflitos)
+        executar("UPDATE horarios SET materia_id=%s, dia_semana=%s, inicio=%s, fim=%s, sala=%s WHERE id=%s",
+                 (novo.materia_id, novo.dia_semana, novo.inicio, novo.fim, novo.sala, horario_id))
+    await emitir("atualizar_horarios")
+    return {"message": "Horário alterado"}
+
+@app.delete("/horarios/{horario_id}")
+async def delete_horario(horario_id: int, if_match: str | None = Header(None), current_user: str = Depends(get_current_user)):
+    try:
+        executar_versionado("horarios", "DELETE FROM horarios WHERE id=%s", (horario_id,), horario_id, if_match, "Horário")
+        await emitir("atualizar_horarios")
+        return {"message": "Horário excluído"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# painel: contagens por curso/turma lidas das tabelas de contagem, sem varrer alunos/materias
+@app.get("/painel/resumo")
+async def get_painel_resumo(current_user: str = Depends(get_current_user)):
+    cursos, turmas, alunos, materias = db_servidor.consultar(
+        "SELECT count(*), COALESCE(sum(turmas), 0), COALESCE(sum(alunos), 0), COALESCE(sum(materias), 0) FROM contagens_curso",
+        destino=db_servidor.destino_leitura()
+    )[0]
+    return {"cursos": cursos, "turmas": turmas, "alunos": alunos, "materias": materias}
+
+@app.get("/painel/cursos")
+async def get_painel_cursos(request: Request, formato: str = FORMATO_LISTA, current_user: str = Depends(get_current_user)):
+    dados = db_servidor.consultar(
+        "SELECT c.sigla, c.curso, k.turmas, k.alunos, k.materias FROM contagens_curso k "
+        "JOIN cursos c ON c.sigla = k.curso_sigla ORDER BY c.curso", destino=db_servidor.destino_leitura()
+    )
+    return resposta_lista(request, COLUNAS_PAINEL_CURSOS, dados, formato)
+
+@app.get("/painel/turmas")
+async def get_painel_turmas(request: Request, curso_sigla: str | None = None, formato: str = FORMATO_LISTA,
+                            current_user: str = Depends(get_current_user)):
+    destino = db_servidor.destino_leitura()
+    if curso_sigla:
+        dados = db_servidor.consultar(
+            f"SELECT {', '.join(COLUNAS_PAINEL_TURMAS)} FROM contagens_turma WHERE curso_sigla = %s ORDER BY turma",
+            (curso_sigla.upper(),), destino
+        )
+    else:
+        dados = db_servidor.consultar(f"SELECT {', '.join(COLUNAS_PAINEL_TURMAS)} FROM contagens_turma ORDER BY turma", destino=destino)
+    return resposta_lista(request, COLUNAS_PAINEL_TURMAS, dados, formato)
+
+@app.get("/painel/turmas/{turma}/materias")
+async def get_painel_materias_turma(request: Request, turma: str, formato: str = FORMATO_LISTA,
+                                    current_user: str = Depends(get_current_user)):
+    dados = db_servidor.consultar(
+        f"SELECT {', '.join(COLUNAS_PAINEL_MATERIAS)} FROM materias WHERE turma = %s ORDER BY materia", (turma.upper(),),
+        db_servidor.destino_leitura()
+    )
+    return resposta_lista(request, COLUNAS_PAINEL_MATERIAS, dados, formato)
+
+# métricas no formato do Prometheus
+@app.get("/metrics")
+async def metrics():
+    return Response(content=registro.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def classe_rota(request: Request) -> str:
+    if request.url.path in ("/login", "/register"):
+        return "auth"
+    return "leitura" if request.method in ("GET", "HEAD") else "escrita"
+
+# usuário e campus do token (só decodifica o JWT, sem ir ao banco); antes do login a chave é o IP
+def chave_limite(request: Request) -> tuple[str, str]:
+    autorizacao = request.headers.get("authorization", "")
+    payload = ler_token(autorizacao[7:]) if autorizacao.lower().startswith("bearer ") else None
+    if payload is not None:
+        return f"usuario:{payload['campus']}:{payload['sub']}", payload["campus"]
+    return f"ip:{request.client.host if request.client else '?'}", CAMPUS_PADRAO
+
+# limite de taxa e comporta da classe de rota; fica dentro do medir_requisicoes, então as recusas também
+# aparecem em http_requisicoes_total (status 429/503)
+@app.middleware("http")
+async def controlar_admissao(request: Request, call_next):
+    if request.url.path.startswith(ROTAS_SEM_ADMISSAO):
+        return await call_next(request)
+    classe = classe_rota(request)
+    chave, campus = chave_limite(request)
+    comporta = comporta_auth if classe == "auth" else comportas[campus][classe]
+    try:
+        limitador.verificar(chave)
+        await comporta.entrar()
+    except Recusada as r:
+        METRICA_REJEITADAS.inc(classe=classe, campus="" if classe == "auth" else campus, motivo=r.motivo)
+        detalhe = "Muitas requisições; tente novamente em instantes" if r.status == 429 else "Servidor sobrecarregado; tente novamente em instantes"
+        return Response(content=serializar_json({"detail": detalhe}), status_code=r.status, media_type="application/json",
+                        headers={"Retry-After": str(r.retry_after)})
+    try:
+        return await call_next(request)
+    finally:
+        comporta.sair()
+
+# Server-Timing: "auth;dur=1.2, checkout;dur=0.1, sql;dur=8.4, ..., total;dur=12.0" (ms)
+def cabecalho_server_timing(fases: dict, total: float) -> str:
+    partes = [f"{fase};dur={segundos * 1000:.1f}" for fase, segundos in fases.items()]
+    partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+# conta requisições e latência por rota (o caminho com {id}, não a URL concreta),
+# devolve o detalhamento em Server-Timing e registra as requisições lentas
+@app.middleware("http")
+async def medir_requisicoes(request: Request, call_next):
+    inicio = time.perf_counter()
+    rastro = RastroRequisicao()
+    token = rastro_atual.set(rastro) # a tarefa do call_next herda o contexto (e o mesmo objeto rastro)
+    status_code = 500
+    try:
+        resposta = await call_next(request)
+        status_code = resposta.status_code
+        resposta.headers["Server-Timing"] = cabecalho_server_timing(rastro.fases, time.perf_counter() - inicio)
+        return resposta
+    finally:
+        rastro_atual.reset(token)
+        total = time.perf_counter() - inicio
+        rota = request.scope.get("route")
+        caminho = rota.path if rota is not None else "(sem rota)"
+        METRICA_REQUISICOES.inc(metodo=request.method, rota=caminho, status=str(status_code))
+        METRICA_LATENCIA.observe(total, metodo=request.method, rota=caminho)
+        if total * 1000 >= REQUISICAO_LENTA_MS:
+            logger_lentas.warning(json.dumps({
+                "metodo": request.method, "rota": caminho, "url": request.url.path, "status": status_code,
+                "total_ms": round(total * 1000, 1),
+                "fases_ms": {fase: round(segundos * 1000, 1) for fase, segundos in rastro.fases.items()},
+                "sql": rastro.sql,
+            }, ensure_ascii=False))
+
+# startup sem bloquear: abre o pool, confere o esquema, aquece os caches e o bcrypt em segundo plano, tentando de
+# novo enquanto o banco não responde; /health/live já responde nesse meio tempo e /health/ready só depois
+@app.on_event("startup")
+async def iniciar_preparacao():
+    app.state.preparacao = asyncio.get_running_loop().create_task(preparar_servidor())
+
+async def preparar_servidor():
+    loop = asyncio.get_running_loop()
+    espera = 0.5
+    while True:
+        try:
+            await loop.run_in_executor(None, db_servidor.preparar)
+            await loop.run_in_executor(None, aquecer_caches)
+            break
+        except psycopg2.OperationalError as e:
+            logger.warning(f"Banco indisponível ({str(e).strip()}); nova tentativa em {espera:.1f}s")
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 10)
+    # a primeira operação do passlib carrega o backend do bcrypt; melhor pagar isso antes do primeiro login
+    await loop.run_in_executor(executor_bcrypt, pwd_context.hash, "aquecimento")
+    PRONTIDAO["bcrypt"] = True
+    logger.info(f"{MARCA_PRONTO} em {(time.perf_counter() - INICIO_PROCESSO) * 1000:.0f} ms")
+
+# antes de ficar pronto, em cada campus: monta a grade de horários em memória e lê a árvore de cursos/turmas (a
+# primeira carga de todo cliente), que abre conexões do pool e traz essas páginas para o cache do PostgreSQL
+def aquecer_caches():
+    for campus in CAMPI:
+        token = campus_atual.set(campus)
+        try:
+            grade_atual()
+            consultar_arvore(None, False, False, False, 0)
+        finally:
+            campus_atual.reset(token)
+    PRONTIDAO["caches"] = True
+
+# o processo está de pé (não depende do banco)
+@app.get("/health/live")
+async def health_live():
+    return {"status": "ok"}
+
+# pronto para atender: pool aberto, esquema conferido, caches e bcrypt aquecidos e o banco respondendo agora
+@app.get("/health/ready")
+async def health_ready():
+    etapas = dict(PRONTIDAO)
+    if all(etapas.values()):
+        try:
+            db_servidor.consultar("SELECT 1")
+            etapas["banco"] = True
+        except Exception:
+            etapas["banco"] = False
+    pronto = all(etapas.values())
+    corpo = {"status": "ok" if pronto else "iniciando", "etapas": etapas}
+    if replicas: # informativo: sem réplica as leituras vão ao primário, o servidor continua pronto
+        corpo["replicas"] = {r.nome: None if r.atraso is None else round(r.atraso * 1000) for r in replicas}
+    return Response(content=serializar_json(corpo),
+                    status_code=200 if pronto else 503, media_type="application/json",
+                    headers=None if pronto else {"Retry-After": "1"})
+
+@app.on_event("startup")
+async def iniciar_tarefas():
+    global loop_principal
+    loop_principal = asyncio.get_running_loop()
+
+@app.on_event("shutdown")
+async def encerrar_tarefas():
+    fila_tarefas.encerrar()
+
+@app.on_event("startup")
+async def iniciar_vigia_loop():
+    if vigia_loop:
+        vigia_loop.iniciar()
+
+# perfil dos primeiros segundos do servidor, gravado em arquivo quando a janela termina
+@app.on_event("startup")
+async def iniciar_perfil():
+    if PERFIL_INICIO_SEGUNDOS > 0:
+        amostrador.iniciar()
+        asyncio.get_running_loop().create_task(gravar_perfil_apos(PERFIL_INICIO_SEGUNDOS))
+
+async def gravar_perfil_apos(segundos: float):
+    await asyncio.sleep(segundos)
+    await asyncio.get_running_loop().run_in_executor(None, amostrador.parar)
+    caminho = os.path.join(PERFIL_PASTA, f"perfil_servidor_{datetime.now():%Y%m%d_%H%M%S}.txt")
+    amostrador.salvar(caminho)
+    logger.info(f"Perfil de {segundos:.0f}s gravado em {caminho} ({amostrador.amostras} amostras)")
+
+# amostra o processo por alguns segundos e devolve as pilhas no formato collapsed (flamegraph.pl, speedscope)
+@app.post("/admin/perfil")
+async def gerar_perfil(segundos: float = Query(30, gt=0, le=300), intervalo_ms: float = Query(5, ge=1, le=1000),
+                       current_user: str = Depends(get_current_user)):
+    if current_user not in PERFIL_USUARIOS:
+        raise HTTPException(status_code=403, detail="Usuário sem permissão para gerar perfil")
+    if amostrador.ativo:
+        raise HTTPException(status_code=409, detail="Já existe um perfil em andamento")
+    amostrador.intervalo = intervalo_ms / 1000
+    amostrador.iniciar()
+    await asyncio.sleep(segundos)
+    saida = await asyncio.get_running_loop().run_in_executor(None, amostrador.parar)
+    logger.info(f"Perfil de {segundos:.0f}s gerado por {current_user} ({amostrador.amostras} amostras)")
+    return Response(content=saida, media_type="text/plain; charset=utf-8")
+
+@app.on_event("shutdown")
+async def encerrar_vigia_loop():
+    if vigia_loop:
+        vigia_loop.encerrar()
+
+# coloca o cliente na sala do campus do token (e na do usuário, para as tarefas) e responde "retomar" com os eventos
+# perdidos desde ultimo_seq (eventos=None: recarregar tudo); sem token válido o cliente fica fora de todas as salas
+async def entrar_no_campus(sid, dados):
+    if not isinstance(dados, dict):
+        return
+    payload = ler_token(dados.get("token") or "")
+    if payload is None:
+        return
+    campus, usuario = payload["campus"], payload["sub"]
+    sessao = await sio.get_session(sid)
+    if sessao.get("campus") not in (None, campus):
+        await sio.leave_room(sid, sala_campus(sessao["campus"]))
+    if sessao.get("usuario") is not None and (sessao["campus"], sessao["usuario"]) != (campus, usuario):
+        await sio.leave_room(sid, sala_usuario(sessao["campus"], sessao["usuario"]))
+    await sio.enter_room(sid, sala_campus(campus))
+    await sio.enter_room(sid, sala_usuario(campus, usuario))
+    await sio.save_session(sid, {"campus": campus, "usuario": usuario})
+    eventos = []
+    if dados.get("ultimo_seq") is not None:
+        try:
+            eventos = eventos_campus[campus].desde(int(dados["ultimo_seq"]), dados.get("epoca"))
+        except (TypeError, ValueError):
+            eventos = None
+        METRICA_SIO_RETOMADAS.inc(resultado="recarregar" if eventos is None else "reenvio")
+    await sio.emit("retomar", {"epoca": EPOCA_EVENTOS, "seq": eventos_campus[campus].seq, "eventos": eventos}, to=sid)
+
 # websocket
+# o cliente manda auth={"token": ..., "ultimo_seq": n, "epoca": "..."}: entra na sala do seu campus e recebe
+# "retomar" com os eventos perdidos; quem conecta antes do login manda o token depois, no evento "autenticar"
 @sio.event
-async def connect(sid, environ):
+async def connect(sid, environ, auth=None):
+    METRICA_SIO_CLIENTES.inc()
     logger.info(f"Cliente conectado: {sid}")
+    await entrar_no_campus(sid, auth)
+
+@sio.event
+async def autenticar(sid, dados):
+    await entrar_no_campus(sid, dados)
 
 @sio.event
 async def disconnect(sid):
+    METRICA_SIO_CLIENTES.dec()
     logger.info(f"Cliente desconectado: {sid}")
 
 if __name__ == "__main__":
@@ -6,19 +6,276 @@
 #          Danilo Henrique Cardoso Ferreira (R845GG5)
 #          Raphael Lima Lopes (F3616J5)
 
+import time
+INICIO_PROCESSO = time.perf_counter() # referência para medir o tempo até a primeira tela
+
 import tkinter as tk # biblioteca padrão do Python para criar interfaces gráficas
 from tkinter import ttk, messagebox  # ttk: widgets modernos com tema; messagebox: caixas de diálogo
-import requests # para fazer requisições HTTP ao backend (FastAPI)
-import socketio # para comunicação em tempo real (websocket) com o servidor
+# requests e socketio (HTTP e websocket) são importados só quando usados, em segundo plano: são os imports mais lentos
 import logging # sistema de logs para depuração
 from typing import List, Dict  # tipos para anotações
 from functools import partial  # permite criar funções com argumentos pré-definidos
+from collections import OrderedDict
 import threading  # para rodar requisições HTTP em threads separadas (evitar travar a UI)
-
-
-logging.basicConfig(level=logging.WARNING) # configura o nível de log para warning (só mostra erros graves)
+import os # lê as opções de ambiente (formato de transmissão)
+import sqlite3 # cache local persistente
+import json
+import re
+import hashlib
+import hmac
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from linhas import de_colunas, compactar, para_colunas # linhas dos caches como tuplas (menos memória que dicts)
+try:
+    import msgpack # formato binário compacto para as listagens (opcional)
+except ImportError:
+    msgpack = None
+
+
+logging.basicConfig(level=os.getenv("SISTEMA_LOG", "WARNING").upper()) # nível de log (padrão warning: só mostra erros graves)
 logger = logging.getLogger(__name__) # xria um logger específico para este módulo
 
+MIME_MSGPACK = "application/x-msgpack"
+# SISTEMA_FORMATO=msgpack pede as listagens em msgpack; SIO_SERIALIZER=msgpack precisa ser igual ao do servidor
+FORMATO_BINARIO = os.getenv("SISTEMA_FORMATO", "json") == "msgpack" and msgpack is not None
+SIO_SERIALIZER = os.getenv("SIO_SERIALIZER", "default")
+
+# campus do usuário quando o servidor atende vários (CAMPI no servidor); vazio usa o campus padrão do servidor
+CAMPUS = os.getenv("SISTEMA_CAMPUS", "").strip().lower()
+# pasta dos arquivos de cache local (um por servidor/usuário)
+PASTA_CACHE = os.getenv("SISTEMA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".sistema_academico"))
+ENTIDADES = ["alunos", "cursos", "turmas", "materias", "chatbot"]
+# campo usado para ordenar cada tabela (mesma ordem do ORDER BY do servidor)
+ORDENACAO = {"alunos": "aluno", "cursos": "curso", "turmas": "turma", "materias": "materia", "chatbot": "pergunta"}
+DETALHES_MAX = 50 # quantos detalhes abertos recentemente ficam guardados
+# atributos que cada página define com o mesmo nome; ao trocar de página, os da página mostrada voltam para o self
+ATRIBUTOS_PAGINA = ("combo_curso", "curso_var", "combo_turma", "turma_var", "entry_busca")
+# websocket: espera entre tentativas de conexão, dobrando a cada falha até o máximo
+RECONEXAO_WS_INICIAL = 1.0
+RECONEXAO_WS_MAXIMA = 30.0
+INTERVALO_RECONEXAO_MS = 15000 # no modo offline, tenta voltar ao servidor a cada 15s
+# servidor sobrecarregado (controle de admissão): 429/503 com Retry-After, sem ter executado nada. As próximas
+# requisições esperam o Retry-After, ou o recuo (1s, 2s, 4s... até 60s) se ele for menor, antes de sair
+STATUS_OCUPADO = (429, 503)
+RECUO_OCUPADO_INICIAL = 1.0
+RECUO_OCUPADO_MAXIMO = 60.0
+# requisições acima disso (ms) aparecem no log com o tempo de cada etapa (rede, fases do servidor, decodificação, fila da UI)
+REQUISICAO_LENTA_MS = float(os.getenv("SISTEMA_LENTO_MS", "500"))
+logger_lentas = logging.getLogger("sistema.lentas")
+
+# lê o cabeçalho Server-Timing do servidor: "sql;dur=8.4, total;dur=12.0" -> {"sql": 8.4, "total": 12.0}
+def ler_server_timing(cabecalho: str) -> dict:
+    fases = {}
+    for parte in cabecalho.split(","):
+        nome, _, params = parte.strip().partition(";")
+        for param in params.split(";"):
+            chave, _, valor = param.strip().partition("=")
+            if chave == "dur":
+                try:
+                    fases[nome] = float(valor)
+                except ValueError:
+                    pass
+    return fases
+
+# Retry-After em segundos ("2") ou como data HTTP; None se ausente ou inválido
+def ler_retry_after(valor: str | None) -> float | None:
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+# índices em memória sobre as listas cache_* (de Linha, ver linhas.py): id -> linha de cada tabela e a relação curso/turma;
+# refeitos pelo atualizar_cache sempre que uma lista é trocada, então toda busca por id/turma/sigla é O(1)
+class IndicesCache:
+    def __init__(self):
+        self.por_id = {} # entidade -> {str(id): linha} (as tags da Treeview guardam o id como texto)
+        self.curso_da_turma = {} # turma -> sigla do curso
+        self.turmas_do_curso = {} # sigla -> [turmas], na ordem do cache
+
+    def indexar(self, entidade: str, dados: List[Dict]):
+        self.por_id[entidade] = {str(d["id"]): d for d in dados}
+        if entidade == "turmas":
+            self.curso_da_turma = {}
+            self.turmas_do_curso = {}
+            for t in dados:
+                self.curso_da_turma[t["turma"]] = t["curso_sigla"]
+                self.turmas_do_curso.setdefault(t["curso_sigla"], []).append(t["turma"])
+
+    def linha(self, entidade: str, id_item):
+        return self.por_id.get(entidade, {}).get(str(id_item))
+
+# colunas que a listagem trouxe só como prévia (começo do texto + "..."), marcadas pelo servidor em "cortados";
+# o texto completo vem de GET /<entidade>/{id}
+def colunas_cortadas(linha: Dict) -> List[str]:
+    cortados = linha.get("cortados")
+    return cortados.split(",") if cortados else []
+
+def tem_previa(linha: Dict) -> bool:
+    return bool(linha.get("cortados"))
+
+# a linha da listagem atual do servidor (listada) ainda é a `original` (linha do cache, com prévias ou não, ou o
+# detalhe completo)? Coluna cortada na listagem e completa no original: compara só o começo que a listagem traz
+def mesma_linha(original: Dict, listada: Dict) -> bool:
+    cortadas_original = colunas_cortadas(original)
+    cortadas_listada = colunas_cortadas(listada)
+    for coluna, valor in original.items():
+        if coluna == "cortados":
+            continue
+        atual = listada.get(coluna)
+        if coluna in cortadas_listada and coluna not in cortadas_original:
+            if valor != atual and not (isinstance(valor, str) and len(valor) > len(atual) and valor.startswith(atual[:-3])):
+                return False
+        elif str(atual) != str(valor):
+            return False
+    return True
+
+# detalhes (linhas com o texto completo) abertos recentemente, do menos para o mais recente;
+# uma entrada só vale enquanto a versão for a mesma da linha do cache (alterou no servidor -> busca de novo)
+class DetalhesCache:
+    def __init__(self, maximo: int = DETALHES_MAX):
+        self.maximo = maximo
+        self.linhas = OrderedDict() # (entidade, str(id)) -> linha completa
+
+    def obter(self, entidade: str, id_item, versao):
+        chave = (entidade, str(id_item))
+        linha = self.linhas.get(chave)
+        if linha is None or linha.get("versao") != versao:
+            return None
+        self.linhas.move_to_end(chave)
+        return linha
+
+    def guardar(self, entidade: str, linha: Dict):
+        chave = (entidade, str(linha["id"]))
+        self.linhas[chave] = linha
+        self.linhas.move_to_end(chave)
+        if len(self.linhas) > self.maximo:
+            self.linhas.popitem(last=False)
+
+# formato das tabelas guardadas: muda quando o servidor muda o significado do ?since= (marca em tabelas.versao) ou
+# as colunas das listagens ("cortados")
+FORMATO_MARCA = "xid,cortados"
+
+# guarda a última cópia de cada tabela em um arquivo sqlite, para abrir na hora e ler sem servidor
+class CacheLocal:
+    def __init__(self, base_url: str, usuario: str):
+        os.makedirs(PASTA_CACHE, exist_ok=True)
+        self.caminho = self.caminho_para(base_url, usuario)
+        self.lock = threading.Lock() # as gravações acontecem em threads separadas
+        self.conn = sqlite3.connect(self.caminho, check_same_thread=False)
+        with self.lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tabelas (
+                    entidade TEXT PRIMARY KEY,
+                    dados TEXT NOT NULL,
+                    versao TEXT,
+                    atualizado_em REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS fila (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    metodo TEXT NOT NULL,
+                    caminho TEXT NOT NULL,
+                    entidade TEXT NOT NULL,
+                    dados TEXT,
+                    original TEXT,
+                    criado_em REAL NOT NULL
+                );
+            """)
+            # tabelas gravadas num formato anterior: a marca de ?since= não vale mais e as linhas não dizem o que veio
+            # como prévia (sem "cortados"); o cache é refeito na próxima sincronização, a fila pendente fica
+            formato = self.conn.execute("SELECT valor FROM meta WHERE chave = 'formato_marca'").fetchone()
+            if formato is None or formato[0] != FORMATO_MARCA:
+                self.conn.execute("DELETE FROM tabelas")
+                self.conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('formato_marca', ?)", (FORMATO_MARCA,))
+            self.conn.commit()
+
+    @staticmethod
+    def caminho_para(base_url: str, usuario: str) -> str:
+        campus = f"_{CAMPUS}" if CAMPUS else "" # a conta é a mesma em todos os campi, mas os dados de cada um não
+        nome = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{urlparse(base_url).netloc}{campus}_{usuario.lower()}")
+        return os.path.join(PASTA_CACHE, f"{nome}.sqlite3")
+
+    @classmethod
+    def existe(cls, base_url: str, usuario: str) -> bool:
+        return os.path.exists(cls.caminho_para(base_url, usuario))
+
+    # gravado como {"cols": [...], "rows": [[...]]}; arquivos antigos (lista de dicts) também são lidos
+    def carregar(self) -> Dict:
+        with self.lock:
+            linhas = self.conn.execute("SELECT entidade, dados, versao FROM tabelas").fetchall()
+        salvos = {}
+        for entidade, dados, versao in linhas:
+            dados = json.loads(dados)
+            salvos[entidade] = (de_colunas(dados["cols"], dados["rows"]) if isinstance(dados, dict) else compactar(dados), versao)
+        return salvos
+
+    def salvar(self, entidade: str, dados: List[Dict], versao=None):
+        texto = json.dumps(para_colunas(dados), ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tabelas (entidade, dados, versao, atualizado_em) VALUES (?, ?, ?, ?)",
+                (entidade, texto, versao, time.time()))
+            self.conn.commit()
+
+    def salvar_em_background(self, entidade: str, dados: List[Dict], versao=None):
+        threading.Thread(target=self.salvar, args=(entidade, dados, versao), daemon=True).start()
+
+    # guarda um verificador da senha (pbkdf2) para liberar o modo offline só para quem já logou antes
+    def guardar_senha(self, senha: str):
+        sal = os.urandom(16)
+        resumo = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), sal, 200_000)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('senha', ?)", (f"{sal.hex()}${resumo.hex()}",))
+            self.conn.commit()
+
+    def conferir_senha(self, senha: str) -> bool:
+        with self.lock:
+            linha = self.conn.execute("SELECT valor FROM meta WHERE chave = 'senha'").fetchone()
+        if not linha:
+            return False
+        sal, resumo = linha[0].split("$")
+        calculado = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), bytes.fromhex(sal), 200_000)
+        return hmac.compare_digest(calculado.hex(), resumo)
+
+    # fila de alterações feitas sem conexão; "original" é a linha como o usuário viu ao editar
+    def enfileirar(self, metodo: str, caminho: str, entidade: str, dados=None, original=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO fila (metodo, caminho, entidade, dados, original, criado_em) VALUES (?, ?, ?, ?, ?, ?)",
+                (metodo, caminho, entidade, json.dumps(dados) if dados is not None else None,
+                 json.dumps(dict(original)) if original is not None else None, time.time())) # Linha vira dict
+            self.conn.commit()
+
+    def pendentes(self) -> List[Dict]:
+        with self.lock:
+            linhas = self.conn.execute("SELECT id, metodo, caminho, entidade, dados, original FROM fila ORDER BY id").fetchall()
+        return [{"id": i, "metodo": m, "caminho": c, "entidade": e,
+                 "dados": json.loads(d) if d else None, "original": json.loads(o) if o else None}
+                for i, m, c, e, d, o in linhas]
+
+    def total_pendentes(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM fila").fetchone()[0]
+
+    def remover_pendente(self, id_fila: int):
+        with self.lock:
+            self.conn.execute("DELETE FROM fila WHERE id = ?", (id_fila,))
+            self.conn.commit()
+
+    def fechar(self):
+        with self.lock:
+            self.conn.close()
+
 def tema_escuro(root):
 
     # usa o tema 'clam' do ttk (permite personalização)
@@ -47,7 +304,7 @@ def tema_escuro(root):
     style.map("TCombobox", fieldbackground=[("readonly", entry_bg)]) # combo box não editável
 
 class SistemaAcademico:
-    def __init__(self, root):
+    def __init__(self, root, conectar=True): # conectar=False: sem websocket (benchmark da interface)
         self.root = root
         self.root.title("Sistema Acadêmico")
         try:
@@ -59,14 +316,39 @@ class SistemaAcademico:
         tema_escuro(self.root)
 
         self.base_url = "http://localhost:8000" # url base do servidor (fastapi rodando localmente)
-        self.sio = socketio.Client() # atualização em tempo real
+        self.sio = None # atualização em tempo real; criado pela thread de conexão do websocket
+        self.http = None # sessão HTTP (reaproveita a conexão TCP); criada na primeira requisição
+        self.lock_http = threading.Lock()
+        self.fechando = False # encerra a thread de conexão do websocket
+        self.ultimo_seq = None # sequência do último evento recebido; na reconexão o servidor reenvia só os posteriores
+        self.epoca_eventos = None # identifica o processo do servidor que numerou os eventos
+        self.formato_binario = FORMATO_BINARIO # pede listagens em msgpack em vez de JSON
         self.token = None # token jwt após login
-        self.atualizando = {} # controla se uma entidade está sendo atualizada
+        self.cache_local = None # cache persistente do usuário logado
+        self.offline = False # sem servidor: lê do cache local e guarda as alterações na fila
+        self.reenviando = False # fila de alterações offline sendo reenviada
+        self.servidor_inacessivel = False # última requisição falhou por rede (não por resposta do servidor)
+        self.ocupado_ate = 0.0 # time.monotonic() até quando o servidor pediu para esperar (429/503 com Retry-After)
+        self.recuo_ocupado = 0.0 # recuo atual; dobra a cada recusa seguida e zera na primeira resposta aceita
+        self.credenciais = None # usadas para reconectar sozinho ao sair do modo offline
+        self.versoes = {} # última marca de sincronização de cada tabela (para pedir só o que mudou com ?since=)
+        self.paginas = {} # páginas já montadas: entidade -> frame (escondido com pack_forget ao trocar)
+        self.widgets_pagina = {} # entidade -> {atributo: widget} (ver ATRIBUTOS_PAGINA)
+        self.pagina_atual = None
+        self.paginas_sujas = set() # páginas escondidas cujos dados mudaram: redesenhadas quando voltarem a aparecer
+        self.exibidas = {} # tabela (caminho do widget) -> (iids na ordem, {iid: valores}) do que está desenhado
 
         # cache local dos dados
         self.cache_cursos = []
         self.cache_turmas = []
         self.cache_materias = []
+        self.indices = IndicesCache() # buscas por id e pela relação curso/turma sem varrer as listas
+        self.detalhes = DetalhesCache() # texto completo dos últimos registros abertos (duplo clique/alterar)
+        # tarefas em segundo plano pedidas por este cliente (exclusão de curso); enquanto há pedido sem resposta,
+        # guarda os finais recebidos pelo websocket, caso o evento "tarefa" chegue antes da resposta 202 com o id
+        self.tarefas = set()
+        self.tarefas_pedidas = 0
+        self.tarefas_finais = OrderedDict()
 
 
         self.loading = None # janela de loading
@@ -76,37 +358,127 @@ class SistemaAcademico:
             "alunos": False, "cursos": False, "turmas": False,
             "materias": False, "chatbot": False }
 
-        # inicializa websocket e mostra tela de login
-        self.setup_websocket()
+        # mostra a tela de login na hora; o websocket conecta em segundo plano
         self.pagina_login()
+        self.root.after_idle(self._registrar_primeira_tela)
+        if conectar:
+            self.setup_websocket()
+
+    def _registrar_primeira_tela(self):
+        self.tempo_primeira_tela = time.perf_counter() - INICIO_PROCESSO
+        logger.info(f"Primeira tela em {self.tempo_primeira_tela * 1000:.0f} ms")
+        threading.Thread(target=self.sessao_http, daemon=True).start() # adianta o import do requests enquanto o usuário digita
 
     def setup_websocket(self):
-        try:
-            self.sio.connect(self.base_url, transports=['websocket']) # conecta ao servidor
-            logger.info("WebSocket conectado com sucesso!")
-
-            # lista de eventos  que o servidor pode emitir
-            eventos = ["atualizar_alunos", "atualizar_cursos", "atualizar_turmas", "atualizar_materias", "atualizar_chatbot"]
-            for evento in eventos:
-                entidade = evento.replace("atualizar_", "")
-                self.sio.on(evento, lambda data, ent=entidade: self.atualizar_pagina_websocket(ent)) # usa lambda como fixo para evitar que uma
-                                                                                                    # função interna acesse e use variáveis do escopo externo
-
-            # evento padrão do socket.io                                                                                     
-            @self.sio.event
-            def connect(): logger.info("WebSocket: conectado")
-            @self.sio.event
-            def disconnect(): logger.info("WebSocket: desconectado")
-            @self.sio.event
-            def connect_error(data): logger.error(f"WebSocket erro: {data}")
-
-        except Exception as e:
-            messagebox.showerror("Erro", f"WebSocket falhou: {e}") # mostra erro se não conseguir conectar
-            logger.error(f"WebSocket: {e}")
+        threading.Thread(target=self._conectar_websocket, name="websocket", daemon=True).start()
+
+    # tenta conectar até conseguir, com espera exponencial (1s, 2s, 4s... até 30s); depois de conectado,
+    # quedas são tratadas pela reconexão automática do próprio socketio.Client com os mesmos limites
+    def _conectar_websocket(self):
+        import socketio
+        sio = socketio.Client(serializer=SIO_SERIALIZER, reconnection_delay=RECONEXAO_WS_INICIAL,
+                              reconnection_delay_max=RECONEXAO_WS_MAXIMA)
+
+        # lista de eventos  que o servidor pode emitir
+        eventos = ["atualizar_alunos", "atualizar_cursos", "atualizar_turmas", "atualizar_materias", "atualizar_chatbot"]
+        for evento in eventos:
+            sio.on(evento, partial(self._evento_websocket, evento.replace("atualizar_", ""))) # partial fixa a entidade de cada evento
+        sio.on("retomar", self._retomar_websocket)
+        sio.on("tarefa", lambda dados: self.root.after(0, self._tarefa_websocket, dados))
+
+        # evento padrão do socket.io
+        @sio.event
+        def connect():
+            logger.info("WebSocket: conectado")
+            self.root.after(0, self.processar_fila) # conexão voltou: reenvia alterações pendentes
+        @sio.event
+        def disconnect(): logger.info("WebSocket: desconectado")
+        @sio.event
+        def connect_error(data): logger.error(f"WebSocket erro: {data}")
+
+        self.sio = sio
+        espera = RECONEXAO_WS_INICIAL
+        while not self.fechando:
+            try:
+                sio.connect(self.base_url, transports=['websocket'], auth=self._auth_websocket) # conecta ao servidor
+                logger.info("WebSocket conectado com sucesso!")
+                return
+            except Exception as e:
+                logger.warning(f"WebSocket: {e}; nova tentativa em {espera:.0f}s")
+                time.sleep(espera)
+                espera = min(espera * 2, RECONEXAO_WS_MAXIMA)
+
+    # chamado a cada (re)conexão: o token coloca o cliente na sala do seu campus; ultimo_seq informa até onde ele já viu
+    def _auth_websocket(self):
+        if not self.token:
+            return {}
+        if self.ultimo_seq is None:
+            return {"token": self.token}
+        return {"token": self.token, "ultimo_seq": self.ultimo_seq, "epoca": self.epoca_eventos}
+
+    # depois do login: o websocket já conectado (ainda sem token) entra na sala do campus
+    def _autenticar_websocket(self):
+        self.ultimo_seq = None # a sequência é por campus; começa do ponto atual
+        if self.sio and self.sio.connected:
+            threading.Thread(target=self.sio.emit, args=("autenticar", self._auth_websocket()), daemon=True).start()
+
+    def _evento_websocket(self, entidade: str, dados=None):
+        seq = dados.get("seq") if isinstance(dados, dict) else None
+        if seq is not None:
+            self.ultimo_seq = max(self.ultimo_seq or 0, seq)
+        self.root.after(0, self.atualizar_pagina_websocket, entidade)
+
+    # resposta do servidor à conexão: os eventos perdidos enquanto a conexão caiu, ou eventos=None quando
+    # a lacuna é maior que o buffer dele (ou ele reiniciou) e todas as tabelas precisam ser conferidas
+    def _retomar_websocket(self, dados):
+        self.epoca_eventos = dados.get("epoca")
+        self.ultimo_seq = dados.get("seq")
+        eventos = dados.get("eventos")
+        if eventos is None:
+            entidades = ENTIDADES
+        else:
+            entidades = dict.fromkeys(e["evento"].replace("atualizar_", "") for e in eventos) # uma sincronização por tabela
+        for entidade in entidades:
+            self.root.after(0, self.atualizar_pagina_websocket, entidade)
+
+    # andamento de uma tarefa do servidor; só avisa das que este cliente pediu e só quando terminam
+    # (as tabelas já se atualizam pelos eventos atualizar_*). O servidor só manda as do usuário, mas ele pode
+    # estar em outra janela: id desconhecido só é guardado se há pedido deste cliente esperando o 202
+    def _tarefa_websocket(self, dados):
+        if not isinstance(dados, dict) or dados.get("estado") not in ("concluida", "falhou"):
+            return
+        if dados.get("id") in self.tarefas:
+            self.tarefas.discard(dados["id"])
+            self._tarefa_terminada(dados)
+        elif self.tarefas_pedidas:
+            self.tarefas_finais[dados.get("id")] = dados
+            while len(self.tarefas_finais) > 50:
+                self.tarefas_finais.popitem(last=False)
+
+    # resposta 202 de uma tarefa pedida por este cliente
+    def acompanhar_tarefa(self, dados):
+        final = self.tarefas_finais.pop(dados.get("id"), None)
+        if final is not None:
+            return self._tarefa_terminada(final)
+        self.tarefas.add(dados.get("id"))
+
+    def _tarefa_terminada(self, dados):
+        if dados["estado"] == "falhou":
+            messagebox.showerror("Erro", f"A operação em segundo plano falhou: {dados.get('erro') or 'erro desconhecido'}")
+
+    def sessao_http(self):
+        with self.lock_http:
+            if self.http is None:
+                import requests
+                self.http = requests.Session() # já negocia gzip (e br se houver brotli)
+            return self.http
 
     def on_closing(self): # desconecta do websocket antes de fechar
-        if self.sio.connected:
+        self.fechando = True
+        if self.sio and self.sio.connected:
             self.sio.disconnect()
+        if self.cache_local:
+            self.cache_local.fechar()
         self.root.destroy()
 
     def titulo_centralizado(self, texto: str):
@@ -154,14 +526,20 @@ class SistemaAcademico:
             self.esconder_loading()
             if sucesso:
                 self.token = dados["access_token"]
+                self._autenticar_websocket()
+                self.abrir_cache_local(username)
+                self.cache_local.guardar_senha(password)
                 self.montar_interface()
                 self.mostrar_pagina("alunos")
                 self.inicializar_perguntas_chatbot()
+                self.processar_fila() # alterações que ficaram pendentes da última sessão
+            elif self.servidor_inacessivel and CacheLocal.existe(self.base_url, username):
+                self.entrar_offline(username, password)
             else:
                 messagebox.showerror("Erro", erro or "Falha no login")
 
         # envia dados do cliente para o servidor em um fluxo de execução separado
-        self.http_em_thread("POST", f"{self.base_url}/login", {"username": username, "password": password}, callback)
+        self.http_em_thread("POST", f"{self.base_url}/login", self.dados_login(username, password), callback)
 
     def register(self):
         username = self.username_entry.get().strip()
@@ -179,7 +557,294 @@ class SistemaAcademico:
             else:
                 messagebox.showerror("Erro", erro or "Erro ao registrar")
 
-        self.http_em_thread("POST", f"{self.base_url}/register", {"username": username, "password": password}, callback)
+        self.http_em_thread("POST", f"{self.base_url}/register", self.dados_login(username, password), callback)
+
+    def dados_login(self, username: str, password: str) -> Dict:
+        dados = {"username": username, "password": password}
+        if CAMPUS:
+            dados["campus"] = CAMPUS
+        return dados
+
+    # abre o cache do usuário e já coloca os dados salvos na memória (a tela abre sem esperar o servidor)
+    def abrir_cache_local(self, username: str):
+        if self.cache_local:
+            self.cache_local.fechar()
+        self.cache_local = CacheLocal(self.base_url, username)
+        try:
+            salvos = self.cache_local.carregar()
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Cache local ignorado: {e}")
+            salvos = {}
+        self.versoes = {}
+        for entidade, (dados, versao) in salvos.items():
+            setattr(self, f"cache_{entidade}", dados)
+            if versao is not None:
+                self.versoes[entidade] = int(versao)
+            self.indices.indexar(entidade, dados)
+            self.cache_inicializado[entidade] = True # não precisa do loading: o servidor só vai reconciliar
+
+    # guarda os dados na memória e no disco
+    def atualizar_cache(self, entidade: str, dados: List[Dict], versao=None):
+        dados = compactar(dados) # a árvore de cursos (e o benchmark) ainda chegam como dicts
+        setattr(self, f"cache_{entidade}", dados)
+        self.indices.indexar(entidade, dados)
+        if versao is not None:
+            self.versoes[entidade] = versao
+        else:
+            self.versoes.pop(entidade, None)
+        if self.cache_local and not self.offline:
+            self.cache_local.salvar_em_background(entidade, dados, versao)
+
+    # cursos e turmas numa requisição só (/cursos/arvore) em vez de /cursos + /turmas; a versão devolvida
+    # vale para as duas tabelas, então as próximas sincronizações continuam com ?since=. Turmas ficam na ordem da
+    # árvore (ORDER BY do servidor), sem reordenar aqui
+    def carregar_arvore(self, ao_terminar=None):
+        if self.offline or not self.token:
+            if ao_terminar: ao_terminar(True, None, None)
+            return
+        def callback(sucesso, dados, erro):
+            if sucesso:
+                cursos, turmas = [], []
+                for no in dados["cursos"]:
+                    turmas.extend(no.pop("turmas"))
+                    cursos.append(no)
+                self.atualizar_cache("cursos", cursos, dados["versao"])
+                self.atualizar_cache("turmas", turmas, dados["versao"])
+            if ao_terminar: ao_terminar(sucesso, dados, erro)
+        self.http_em_thread("GET", f"{self.base_url}/cursos/arvore", callback=callback)
+
+    # busca a tabela no servidor: com versão conhecida pede só as mudanças (?since=) e mescla no cache;
+    # ao_terminar(sucesso, dados, erro) recebe dados=None quando nada mudou
+    def sincronizar(self, entidade: str, ao_terminar=None):
+        versao = self.versoes.get(entidade)
+        incremental = versao is not None and bool(getattr(self, f"cache_{entidade}", None))
+        url = f"{self.url_entidade(entidade)}?formato=colunas"
+        if incremental:
+            url += f"&since={versao}"
+        def callback(sucesso, dados, erro):
+            if not sucesso:
+                if ao_terminar: ao_terminar(False, None, erro)
+                return
+            linhas = de_colunas(dados["cols"], dados["rows"])
+            excluidos = dados.get("excluidos", [])
+            mesclar = incremental and not dados.get("completo") # completo: a marca era antiga demais, veio a tabela inteira
+            if mesclar and not linhas and not excluidos:
+                self.versoes[entidade] = dados.get("versao", versao)
+                if ao_terminar: ao_terminar(True, None, None)
+                return
+            if mesclar:
+                linhas = self._mesclar(entidade, getattr(self, f"cache_{entidade}", []), linhas, excluidos)
+            self.atualizar_cache(entidade, linhas, dados.get("versao"))
+            if ao_terminar: ao_terminar(True, linhas, None)
+        self.http_em_thread("GET", url, callback=callback)
+
+    # aplica as linhas alteradas e remove as excluídas, mantendo a ordenação do servidor
+    def _mesclar(self, entidade: str, atuais: List[Dict], alteradas: List[Dict], excluidos: List[int]) -> List[Dict]:
+        por_id = {d["id"]: d for d in atuais}
+        for id_excluido in excluidos:
+            por_id.pop(id_excluido, None)
+        for linha in alteradas:
+            por_id[linha["id"]] = linha
+        chave = ORDENACAO.get(entidade, "id")
+        return sorted(por_id.values(), key=lambda d: str(d.get(chave) or ""))
+
+    def entrar_offline(self, username: str, password: str):
+        cache = CacheLocal(self.base_url, username)
+        if not cache.conferir_senha(password):
+            cache.fechar()
+            return messagebox.showerror("Erro", "Servidor inacessível e senha não confere com a do último acesso")
+        cache.fechar()
+        if not messagebox.askyesno("Servidor inacessível", "Abrir em modo offline com os dados salvos neste computador?\n"
+                                   "As alterações ficam guardadas e são enviadas quando o servidor voltar."):
+            return
+        self.offline = True
+        self.credenciais = (username, password)
+        self.abrir_cache_local(username)
+        self.montar_interface()
+        self.mostrar_pagina("alunos")
+        self.root.after(INTERVALO_RECONEXAO_MS, self._tentar_sair_offline)
+
+    # tenta logar de novo em segundo plano; quando consegue, volta ao modo normal e recarrega tudo
+    def _tentar_sair_offline(self):
+        if not self.offline:
+            return
+        username, password = self.credenciais
+        def callback(sucesso, dados, erro):
+            if not sucesso:
+                self.root.after(INTERVALO_RECONEXAO_MS, self._tentar_sair_offline)
+                return
+            self.offline = False
+            self.token = dados["access_token"]
+            self._autenticar_websocket()
+            self.credenciais = None
+            self.atualizar_titulo()
+            for entidade in ENTIDADES:
+                self._atualizar_em_background(entidade)
+            self.processar_fila()
+        self.http_em_thread("POST", f"{self.base_url}/login", self.dados_login(username, password), callback)
+
+    def atualizar_titulo(self):
+        titulo = "Sistema Acadêmico"
+        if self.offline:
+            titulo += " (offline)"
+        pendentes = self.cache_local.total_pendentes() if self.cache_local else 0
+        if pendentes:
+            titulo += f" - {pendentes} alteração(ões) pendente(s)"
+        self.root.title(titulo)
+
+    def url_entidade(self, entidade: str) -> str:
+        return f"{self.base_url}/{'chatbot_respostas' if entidade == 'chatbot' else entidade}"
+
+    def linha_do_cache(self, entidade: str, id_item: str):
+        return self.indices.linha(entidade, id_item)
+
+    # linha completa para o duplo clique e o alterar: callback(linha, completa). Só vai ao servidor quando a
+    # linha do cache tem texto cortado e o detalhe não está guardado (alunos nunca: não têm coluna com prévia);
+    # sem servidor devolve a prévia (completa=False)
+    def buscar_detalhe(self, entidade: str, id_item: str, callback):
+        linha = self.linha_do_cache(entidade, id_item)
+        if linha is None or not tem_previa(linha):
+            return callback(linha, linha is not None)
+        detalhe = self.detalhes.obter(entidade, id_item, linha.get("versao"))
+        if detalhe is not None:
+            return callback(detalhe, True)
+        if self.offline or not self.token:
+            return callback(linha, False)
+        def resposta(sucesso, dados, erro):
+            if not sucesso or not isinstance(dados, dict):
+                return callback(linha, False)
+            self.detalhes.guardar(entidade, dados)
+            callback(dados, True)
+        self.http_em_thread("GET", f"{self.url_entidade(entidade)}/{id_item}", callback=resposta)
+
+    # envia add/alterar/excluir; sem conexão (ou com fila já pendente, para manter a ordem) guarda na fila local
+    # callback recebe dados={"pendente": True} quando a alteração ficou na fila
+    def enviar_mutacao(self, metodo: str, caminho: str, entidade: str, dados=None, original=None, callback=None):
+        def enfileirar():
+            self.cache_local.enfileirar(metodo, caminho, entidade, dados, original)
+            self.atualizar_titulo()
+            self.root.after(INTERVALO_RECONEXAO_MS, self.processar_fila)
+            if callback:
+                callback(True, {"pendente": True}, None)
+
+        if self.cache_local and (self.offline or self.cache_local.total_pendentes()):
+            return enfileirar()
+
+        def resposta(sucesso, resultado, erro, status_code):
+            if status_code is None and self.servidor_inacessivel and self.cache_local:
+                return enfileirar()
+            if status_code == 412: # alguém alterou a linha desde que ela foi carregada: recarrega para o usuário ver
+                self.get_dados(entidade, force_refresh=True)
+            if callback:
+                callback(sucesso, resultado, erro)
+        # concorrência otimista: alterar/excluir só valem se a linha ainda estiver na versão que o usuário viu
+        cabecalhos = None
+        if metodo in ("PUT", "DELETE") and original and original.get("versao") is not None:
+            cabecalhos = {"If-Match": f'"{original["versao"]}"'}
+        self.http_em_thread(metodo, f"{self.base_url}{caminho}", dados, resposta, com_status=True, cabecalhos=cabecalhos)
+
+    def mensagem_sucesso(self, texto: str, dados):
+        if isinstance(dados, dict) and dados.get("pendente"):
+            messagebox.showinfo("Sem conexão", "Alteração guardada neste computador; será enviada quando o servidor voltar.")
+        else:
+            messagebox.showinfo("Sucesso", texto)
+
+    # reenvia a fila na ordem em que foi gravada; alterar/excluir vão com If-Match da versão que o usuário editou,
+    # e o servidor recusa (412) se outra pessoa alterou a linha nesse meio tempo
+    def processar_fila(self):
+        if self.reenviando or self.offline or not self.token or not self.cache_local:
+            return
+        espera = self.ocupado_ate - time.monotonic()
+        if espera > 0: # servidor sobrecarregado: volta quando a espera pedida terminar
+            self.root.after(int(espera * 1000) + 1, self.processar_fila)
+            return
+        pendentes = self.cache_local.pendentes()
+        if not pendentes:
+            return
+        self.reenviando = True
+        # atuais: tabelas já buscadas; alteradas: entidades a recarregar no fim; proprias: linhas já alteradas por este reenvio
+        self._reenviar(pendentes, {"atuais": {}, "alteradas": set(), "proprias": set()})
+
+    def _reenviar(self, pendentes: List[Dict], estado: Dict):
+        atuais = estado["atuais"]
+        if not pendentes: # terminou: recarrega o que mudou
+            self.reenviando = False
+            self.atualizar_titulo()
+            for entidade in estado["alteradas"]:
+                self.get_dados(entidade, force_refresh=True)
+            return
+        item, resto = pendentes[0], pendentes[1:]
+        entidade, original = item["entidade"], item["original"]
+
+        def interromper(): # sem conexão de novo: tenta mais tarde a partir do mesmo item
+            self.reenviando = False
+            self.atualizar_titulo()
+            self.root.after(INTERVALO_RECONEXAO_MS, self.processar_fila)
+
+        def adiar(): # recusada por sobrecarga, sem executar: o item fica na fila e o reenvio espera o Retry-After
+            self.reenviando = False
+            self.atualizar_titulo()
+            self.processar_fila()
+
+        propria = original is not None and (entidade, str(original["id"])) in estado["proprias"]
+        versionado = original is not None and original.get("versao") is not None and not propria
+
+        def descartar():
+            self.cache_local.remover_pendente(item["id"])
+            self._reenviar(resto, estado)
+
+        def enviar(if_match=None):
+            def enviado(sucesso, dados, erro, status_code):
+                if status_code is None or status_code == 401: # rede ou token expirado: mantém na fila
+                    return interromper()
+                if status_code in STATUS_OCUPADO:
+                    return adiar()
+                if status_code == 412: # outra pessoa alterou depois da edição offline
+                    acao = "alterou" if item["metodo"] == "PUT" else "excluiu"
+                    if messagebox.askyesno("Conflito", f"{entidade.title()}: o registro que você {acao} offline foi modificado por outra pessoa depois disso.\n"
+                                                       f"Aplicar a sua versão mesmo assim?"):
+                        return enviar()
+                    return descartar()
+                if status_code == 404 and original is not None:
+                    if item["metodo"] == "PUT":
+                        messagebox.showwarning("Conflito", f"{entidade.title()}: o registro que você alterou offline foi excluído por outra pessoa. A alteração foi descartada.")
+                    return descartar() # exclusão de algo que já não existe: nada a fazer
+                self.cache_local.remover_pendente(item["id"])
+                if not sucesso:
+                    messagebox.showerror("Erro", f"Alteração pendente em {entidade} recusada pelo servidor: {erro}")
+                atuais.pop(entidade, None) # a tabela mudou; próximo item busca de novo
+                estado["alteradas"].add(entidade)
+                if sucesso and original is not None: # edições seguintes da mesma linha partem desta, não são conflito
+                    estado["proprias"].add((entidade, str(original["id"])))
+                self._reenviar(resto, estado)
+            cabecalhos = {"If-Match": f'"{if_match}"'} if if_match is not None else None
+            self.http_em_thread(item["metodo"], f"{self.base_url}{item['caminho']}", item["dados"], enviado, com_status=True, cabecalhos=cabecalhos)
+
+        if versionado: # o próprio servidor confere a versão (If-Match) e devolve 412 se mudou
+            return enviar(original["versao"])
+
+        # alterações gravadas sem versão: compara a linha editada com a linha atual do servidor
+        if original is not None and not propria and entidade not in atuais: # busca o estado atual da tabela uma vez por reenvio
+            def carregado(sucesso, dados, erro):
+                if not sucesso:
+                    return interromper()
+                atuais[entidade] = {str(d["id"]): d for d in dados}
+                self._reenviar(pendentes, estado)
+            return self.http_em_thread("GET", self.url_entidade(entidade), callback=carregado)
+
+        if original is not None and not propria:
+            atual = atuais[entidade].get(str(original["id"]))
+            if atual is None:
+                if item["metodo"] == "PUT":
+                    messagebox.showwarning("Conflito", f"{entidade.title()}: o registro que você alterou offline foi excluído por outra pessoa. A alteração foi descartada.")
+                return descartar()
+            # a listagem traz os textos longos como prévia: mesma_linha compara o original só com o começo deles
+            if not mesma_linha(original, atual):
+                acao = "alterou" if item["metodo"] == "PUT" else "excluiu"
+                if not messagebox.askyesno("Conflito", f"{entidade.title()}: o registro que você {acao} offline foi modificado por outra pessoa depois disso.\n"
+                                                       f"Aplicar a sua versão mesmo assim?"):
+                    return descartar()
+        enviar()
 
     def inicializar_perguntas_chatbot(self):
 
@@ -211,6 +876,7 @@ class SistemaAcademico:
 
     def montar_interface(self):
         self.limpar_tudo()
+        self.atualizar_titulo()
         self.menu_lateral()
         self.area_principal()
 
@@ -232,17 +898,19 @@ class SistemaAcademico:
                 btn = ttk.Button(menu, text=texto, width=20, command=self.root.quit)
                 btn.pack(pady=20)
 
+    # container das páginas; frame_main aponta para o frame da página atual (é nele que as páginas montam os widgets)
     def area_principal(self):
-        self.frame_main = ttk.Frame(self.root, padding=20)
-        self.frame_main.pack(side="right", fill="both", expand=True)
-
-    def limpar_area(self):
-        for widget in self.frame_main.winfo_children():
-            widget.destroy()
+        self.frame_area = ttk.Frame(self.root, padding=20)
+        self.frame_area.pack(side="right", fill="both", expand=True)
+        self.frame_main = self.frame_area
         for attr in list(self.__dict__.keys()):
-            if attr.startswith("tree_"):
+            if attr.startswith("tree_") or attr in ATRIBUTOS_PAGINA:
                 delattr(self, attr)
-        self.atualizando = {}
+        self.paginas = {}
+        self.widgets_pagina = {}
+        self.pagina_atual = None
+        self.paginas_sujas = set()
+        self.exibidas = {}
 
     def get_colunas_e_chaves(self, entidade: str) -> Dict:
         mapeamento = {
@@ -264,8 +932,6 @@ class SistemaAcademico:
         tree.bind("<Button-1>", lambda e: self._selecionar_linha(tree, e))         # clicar com o botão esquerdo seleciona a linha
         tree.pack(fill="both", expand=True, pady=(10, 0))
         setattr(self, f"tree_{entidade}", tree) # salva a tabela como atributo: tree_alunos, tree_cursos, etc
-        self.atualizando[entidade] = True   # inicia atualização automática
-        self.root.after(1000, lambda: self.atualizar_pagina_websocket(entidade)) # atualiza interface no fluxo de execução principal a cada um segundo
 
         # duplo clique abre detalhes
         if entidade in ["alunos", "cursos", "turmas", "materias", "chatbot"]:
@@ -273,12 +939,11 @@ class SistemaAcademico:
                 item = tree.identify_row(event.y)
                 if not item:
                     return
-                id_item = tree.item(item, "tags")[0]
-                dados = getattr(self, f"cache_{entidade}", [])
-                entidade_data = next((d for d in dados if str(d["id"]) == id_item), None)
-                if not entidade_data:
-                    return
-                self.mostrar_detalhes_entidade(entidade, entidade_data)
+                id_item = item # o iid da linha é o id do registro
+                def mostrar(linha, completa): # sem o detalhe (servidor fora) mostra a prévia mesmo
+                    if linha:
+                        self.mostrar_detalhes_entidade(entidade, linha)
+                self.buscar_detalhe(entidade, id_item, mostrar)
 
             tree.bind("<Double-1>", on_double_click)
         return tree
@@ -352,44 +1017,89 @@ class SistemaAcademico:
         text_widget.configure(yscrollcommand=scroll.set)
         scroll.pack(side="right", fill="y")
 
+    @staticmethod
+    def _valores_tabela(item: Dict, chaves: List[str]) -> tuple:
+        valores = []
+        for chave in chaves: # trunca textos longos
+            valor = item.get(chave, "")
+            if chave == "resposta" and len(valor) > 100: valor = valor[:97] + "..."
+            if chave == "descricao" and len(valor) > 80: valor = valor[:77] + "..."
+            valores.append(str(valor))
+        return tuple(valores)
+
+    # desenha dados na tabela mexendo só no que mudou desde o último desenho (iid = id do registro): remove as linhas
+    # que saíram, altera as que mudaram, insere as novas na posição certa e troca a cor das que mudaram de par/ímpar.
+    # Só refaz tudo na primeira vez ou quando a ordem das linhas que ficam mudou de um jeito que não dá para remendar
     def preencher_tabela(self, tree, dados: List[Dict], chaves: List[str]):
-        for i in tree.get_children():
-            tree.delete(i)
-        for idx, item in enumerate(dados):
-            valores = []
-            for chave in chaves: # trunca textos longos
-                valor = item.get(chave, "")
-                if chave == "resposta" and len(valor) > 100: valor = valor[:97] + "..."
-                if chave == "descricao" and len(valor) > 80: valor = valor[:77] + "..."
-                valores.append(str(valor))
-            tag = "even" if idx % 2 == 0 else "odd" # even/odd são cores alternadas
-            tree.insert("", "end", values=valores, tags=(str(item["id"]), tag))
+        novas = [(str(item["id"]), self._valores_tabela(item, chaves)) for item in dados]
+        novos_valores = dict(novas)
+        ordem, valores = self.exibidas.get(str(tree), ((), {}))
+        alteradas = {iid for iid in ordem if iid in novos_valores and novos_valores[iid] != valores[iid]}
+        ficam = [iid for iid in ordem if iid in novos_valores]
+        if [iid for iid, _ in novas if iid in valores] != ficam: # a ordem mudou (ex.: renomeado): as alteradas saem e voltam
+            ficam = [iid for iid in ficam if iid not in alteradas]
+            alteradas = set()
+        mantidas = set(ficam)
+        if not ficam or [iid for iid, _ in novas if iid in mantidas] != ficam:
+            tree.delete(*tree.get_children())
+            ordem, mantidas = (), set()
+        else:
+            saem = [iid for iid in ordem if iid not in mantidas]
+            if saem:
+                tree.delete(*saem)
+            for iid in alteradas:
+                tree.item(iid, values=novos_valores[iid])
+        posicao_antes = {iid: i for i, iid in enumerate(ordem)}
+        for i, (iid, linha) in enumerate(novas):
+            tag = "even" if i % 2 == 0 else "odd" # even/odd são cores alternadas
+            if iid not in mantidas:
+                tree.insert("", i, iid=iid, values=linha, tags=(tag,))
+            elif posicao_antes[iid] % 2 != i % 2:
+                tree.item(iid, tags=(tag,))
+        self.exibidas[str(tree)] = ([iid for iid, _ in novas], novos_valores)
         tree.tag_configure("even", background="#353535")
         tree.tag_configure("odd", background="#2d2d2d")
 
     def _executar_callback_com_selecao(self, entidade: str, dados: List[Dict], tree):
-        selecao_atual = None
-        if tree and tree.selection():
-            item = tree.selection()[0]
-            selecao_atual = tree.item(item, "tags")[0]
+        selecao_atual = tree.selection()[0] if tree and tree.selection() else None
 
         info = self.get_colunas_e_chaves(entidade)
         self.preencher_tabela(tree, dados, info["chaves"])
 
-        if selecao_atual and tree:
-            for child in tree.get_children():
-                if tree.item(child, "tags")[0] == selecao_atual:
-                    tree.selection_set(child)
-                    tree.focus(child)
-                    tree.see(child)
-                    break
+        if selecao_atual and tree and tree.exists(selecao_atual): # mesmo iid (id do registro) depois de recarregar
+            tree.selection_set(selecao_atual)
+            tree.focus(selecao_atual)
+            tree.see(selecao_atual)
 
+    # evento do servidor: busca só o que mudou (?since=) e atualiza a tabela da página (escondida fica para depois);
+    # cursos/turmas também alimentam os combos, então são sincronizados mesmo sem página própria montada
     def atualizar_pagina_websocket(self, entidade: str):
-        if not self.token or entidade not in self.atualizando or not self.atualizando[entidade]:
+        if not self.token or self.offline:
+            return
+        if entidade not in self.paginas and entidade not in ("cursos", "turmas"):
+            return # ninguém mostra essa tabela ainda; ela é buscada quando a página abrir
+        def callback(sucesso, dados, erro):
+            if not sucesso or dados is None:
+                return
+            self.reexibir_tabela(entidade, dados)
+            if entidade in ("cursos", "turmas") and self.pagina_atual in ("alunos", "turmas", "materias"):
+                self.atualizar_combos()
+        self.sincronizar(entidade, callback)
+
+    # recarrega a tabela com os dados novos mantendo a busca digitada na página; página escondida só fica marcada
+    # e é redesenhada (com o cache da hora) quando voltar a aparecer
+    def reexibir_tabela(self, entidade: str, dados: List[Dict]):
+        tree = getattr(self, f"tree_{entidade}", None)
+        if not tree or not tree.winfo_exists():
             return
-        self.get_dados(entidade, force_refresh=True)
-        if entidade in self.atualizando and self.atualizando[entidade]:
-            self.root.after(1000, lambda: self.atualizar_pagina_websocket(entidade))
+        if entidade != self.pagina_atual:
+            self.paginas_sujas.add(entidade)
+            return
+        busca = self.widgets_pagina.get(entidade, {}).get("entry_busca")
+        if busca is not None and busca.winfo_exists() and busca.get():
+            self.filtrar(entidade, busca.get())
+        else:
+            self._executar_callback_com_selecao(entidade, dados, tree)
 
     def get_cursos(self, refresh=False):
         if not self.token: return []
@@ -397,11 +1107,10 @@ class SistemaAcademico:
             return [c["sigla"] for c in self.cache_cursos]
         if refresh:
             def callback(sucesso, dados, erro):
-                if sucesso: 
-                    self.cache_cursos = dados
+                if sucesso and dados is not None: 
                     if hasattr(self, "combo_curso") and self.combo_curso.winfo_exists():
                         self.root.after(100, self.atualizar_combos)
-            self.http_em_thread("GET", f"{self.base_url}/cursos", callback=callback)
+            self.sincronizar("cursos", callback)
         return []
 
     def get_turmas(self, refresh=False):
@@ -410,19 +1119,16 @@ class SistemaAcademico:
             return [t["turma"] for t in self.cache_turmas]
         if refresh:
             def callback(sucesso, dados, erro):
-                if sucesso: 
-                    self.cache_turmas = dados
+                if sucesso and dados is not None: 
                     if hasattr(self, "combo_turma") and self.combo_turma.winfo_exists():
                         self.root.after(100, self.atualizar_combos)
-            self.http_em_thread("GET", f"{self.base_url}/turmas", callback=callback)
+            self.sincronizar("turmas", callback)
         return []
 
     def get_materias(self, refresh=False):
         if not self.token: return ["Faça login primeiro"]
         if not refresh and self.cache_materias: return [m["materia"] for m in self.cache_materias]
-        def callback(sucesso, dados, erro):
-            if sucesso: self.cache_materias = dados
-        self.http_em_thread("GET", f"{self.base_url}/materias", callback=callback)
+        self.sincronizar("materias")
         return ["Carregando..."]
 
     def get_dados(self, entidade: str, force_refresh=False):
@@ -438,33 +1144,32 @@ class SistemaAcademico:
         self._carregar_do_servidor(entidade)
 
     def _atualizar_em_background(self, entidade: str):
+        if self.offline:
+            return
         def callback(sucesso, dados, erro):
-            if sucesso:
-                setattr(self, f"cache_{entidade}", dados)
-                tree = getattr(self, f"tree_{entidade}", None)
-                if tree and tree.winfo_exists():
-                    self._executar_callback_com_selecao(entidade, dados, tree)
-        url = f"{self.base_url}/{entidade}"
-        if entidade == "chatbot": url = f"{self.base_url}/chatbot_respostas"
-        self.http_em_thread("GET", url, callback=callback)
+            if sucesso and dados is not None: # dados=None: nada mudou, a tabela já está certa
+                self.reexibir_tabela(entidade, dados)
+        self.sincronizar(entidade, callback)
 
     def _carregar_do_servidor(self, entidade: str):
+        if self.offline: # sem servidor: mostra só o que estiver salvo
+            tree = getattr(self, f"tree_{entidade}", None)
+            if tree and tree.winfo_exists():
+                self._executar_callback_com_selecao(entidade, getattr(self, f"cache_{entidade}", []), tree)
+            return
         if not self.cache_inicializado.get(entidade, False):
             self.mostrar_loading(f"Carregando {entidade}...")
         def callback(sucesso, dados, erro):
             if not self.cache_inicializado.get(entidade, False):
                 self.esconder_loading()
             if sucesso:
-                setattr(self, f"cache_{entidade}", dados)
                 tree = getattr(self, f"tree_{entidade}", None)
-                if tree and tree.winfo_exists():
+                if dados is not None and tree and tree.winfo_exists():
                     self._executar_callback_com_selecao(entidade, dados, tree)
                 self.cache_inicializado[entidade] = True
             else:
                 messagebox.showerror("Erro", f"Não foi possível carregar {entidade}")
-        url = f"{self.base_url}/{entidade}"
-        if entidade == "chatbot": url = f"{self.base_url}/chatbot_respostas"
-        self.http_em_thread("GET", url, callback=callback)
+        self.sincronizar(entidade, callback)
 
     def criar_busca_centralizada(self, texto_label: str, entidade: str):
         frame_busca = ttk.Frame(self.frame_main)
@@ -475,18 +1180,58 @@ class SistemaAcademico:
         entry.bind("<KeyRelease>", lambda e: self.filtrar(entidade, entry.get()))
         return entry
 
+    # cada página é montada uma vez só; nas próximas vezes o frame dela volta a aparecer como estava
+    # e só pede ao servidor o que mudou desde a última sincronização
     def mostrar_pagina(self, entidade: str):
-        self.limpar_area()
-        if entidade == "materias":
-            self.get_turmas(refresh=True)
-            self.get_cursos(refresh=True)
-            self.root.after(800, lambda: getattr(self, f"pagina_{entidade}")())
-        elif entidade == "alunos":
-            self.get_cursos(refresh=True)
-            self.get_turmas(refresh=True)
-            self.root.after(800, lambda: getattr(self, f"pagina_{entidade}")())
+        if self.pagina_atual == entidade:
+            return
+        if self.pagina_atual in self.paginas:
+            self.widgets_pagina[self.pagina_atual] = self._atributos_pagina()
+            self.paginas[self.pagina_atual].pack_forget()
+        for attr in ATRIBUTOS_PAGINA:
+            self.__dict__.pop(attr, None)
+
+        frame = self.paginas.get(entidade)
+        nova = frame is None
+        if nova:
+            frame = self.paginas[entidade] = ttk.Frame(self.frame_area)
         else:
+            self.__dict__.update(self.widgets_pagina.get(entidade, {}))
+        self.frame_main = frame
+        self.pagina_atual = entidade
+        frame.pack(fill="both", expand=True)
+        if nova:
             getattr(self, f"pagina_{entidade}")()
+            self.widgets_pagina[entidade] = self._atributos_pagina()
+        else:
+            if entidade in self.paginas_sujas:
+                self.paginas_sujas.discard(entidade)
+                self.reexibir_tabela(entidade, getattr(self, f"cache_{entidade}", []))
+            self._atualizar_em_background(entidade)
+        if entidade in ("alunos", "turmas", "materias"):
+            self.atualizar_cursos_e_turmas()
+
+    # os combos usam cursos e turmas: com os dois no cache e versionados pede só o que mudou (?since=) de cada um;
+    # a árvore inteira só na primeira carga (cache vazio ou sem versão)
+    def atualizar_cursos_e_turmas(self):
+        aquecidos = all(getattr(self, f"cache_{e}", None) and self.versoes.get(e) is not None for e in ("cursos", "turmas"))
+        if not aquecidos:
+            self.carregar_arvore(lambda *_: self.atualizar_combos())
+            return
+        self.atualizar_combos() # na hora, com os índices do cache
+        if self.offline or not self.token:
+            return
+        def callback(entidade, sucesso, dados, erro):
+            if not sucesso or dados is None: # dados=None: nada mudou, os combos já estão certos
+                return
+            self.reexibir_tabela(entidade, dados)
+            self.atualizar_combos()
+        for entidade in ("cursos", "turmas"):
+            if entidade != self.pagina_atual: # a tabela da própria página já foi sincronizada por mostrar_pagina
+                self.sincronizar(entidade, lambda *args, entidade=entidade: callback(entidade, *args))
+
+    def _atributos_pagina(self) -> Dict:
+        return {attr: self.__dict__[attr] for attr in ATRIBUTOS_PAGINA if attr in self.__dict__}
 
     def atualizar_combos(self):
         if not hasattr(self, "combo_curso") or not self.combo_curso.winfo_exists():
@@ -500,30 +1245,32 @@ class SistemaAcademico:
         siglas = [c["sigla"] for c in self.cache_cursos]
         self.combo_curso["values"] = siglas  # SEM "Selecione um curso"
         self.combo_curso.configure(state="readonly")
-        self.curso_var.set("")  # Limpo
+        if self.curso_var.get() not in siglas: # a página fica montada: mantém o que o usuário já escolheu
+            self.curso_var.set("")
+        self.combo_curso.bind("<<ComboboxSelected>>", self.filtrar_turmas_do_curso)
+        if hasattr(self, "combo_turma") and self.combo_turma.winfo_exists(): # a página de turmas só tem o combo de curso
+            curso = self.curso_var.get()
+            self.preencher_combo_turma(self.indices.turmas_do_curso.get(curso, []) if curso else list(self.indices.curso_da_turma))
 
-        if self.cache_turmas:
-            turmas = [t["turma"] for t in self.cache_turmas]
-            self.combo_turma["values"] = turmas
-            self.combo_turma.configure(state="readonly")
-            self.turma_var.set("")
-        else:
-            self.combo_turma["values"] = []
-            self.combo_turma.configure(state="disabled")
+    def preencher_combo_turma(self, turmas: List[str]):
+        self.combo_turma["values"] = turmas
+        self.combo_turma.configure(state="readonly" if turmas else "disabled")
+        if self.turma_var.get() not in turmas:
             self.turma_var.set("")
 
+    # ao escolher o curso, o combo de turma mostra só as turmas dele
+    def filtrar_turmas_do_curso(self, event=None):
+        if hasattr(self, "combo_turma") and self.combo_turma.winfo_exists():
+            self.preencher_combo_turma(self.indices.turmas_do_curso.get(self.curso_var.get(), []))
+
     def sync_curso_from_turma(self, event=None):
-        selected_turma = self.turma_var.get()
-        if not selected_turma or not self.cache_turmas:
+        sigla = self.indices.curso_da_turma.get(self.turma_var.get())
+        if not sigla:
             return
-
-        for t in self.cache_turmas:
-            if t["turma"] == selected_turma:
-                self.curso_var.set(t["curso_sigla"])
-                # Atualiza o combo também
-                if hasattr(self, "combo_curso") and self.combo_curso.winfo_exists():
-                    self.combo_curso.set(t["curso_sigla"])
-                break
+        self.curso_var.set(sigla)
+        # Atualiza o combo também
+        if hasattr(self, "combo_curso") and self.combo_curso.winfo_exists():
+            self.combo_curso.set(sigla)
 
     def pagina_alunos(self):
         self.titulo_centralizado("Alunos")
@@ -560,7 +1307,7 @@ class SistemaAcademico:
             turma = self.turma_var.get()
             if not all([nome, ra, email, curso, turma]) or curso in ["Selecione um curso"]:
                 return messagebox.showerror("Erro", "Preencha todos os campos")
-            if not any(t["turma"] == turma and t["curso_sigla"] == curso for t in self.cache_turmas):
+            if self.indices.curso_da_turma.get(turma) != curso:
                 return messagebox.showerror("Erro", "Turma não pertence ao curso")
             self.add_entidade("alunos", [nome, ra, email, curso, turma])
             for e in self.aluno_entries: e.delete(0, tk.END)
@@ -621,9 +1368,6 @@ class SistemaAcademico:
         self.combo_curso = ttk.Combobox(frame_form, textvariable=self.curso_var, state="readonly", width=32)
         self.combo_curso.grid(row=0, column=3, padx=5, pady=3)
 
-        self.get_cursos(refresh=True)
-        self.root.after(800, self.atualizar_combos) 
-
         def adicionar():
             turma = self.turma_entries[0].get().strip()
             descricao = self.turma_entries[1].get().strip()
@@ -666,7 +1410,6 @@ class SistemaAcademico:
         self.combo_turma = ttk.Combobox(frame_form, textvariable=self.turma_var, state="disabled", width=32)
         self.combo_turma.grid(row=1, column=3, padx=5, pady=3)
 
-        self.root.after(800, self.atualizar_combos)
         self.combo_turma.bind("<<ComboboxSelected>>", self.sync_curso_from_turma)  # Sincroniza curso
 
         def adicionar():
@@ -683,8 +1426,6 @@ class SistemaAcademico:
             self.add_entidade("materias", [valores[0], valores[1], valores[2], curso, turma, descricao])
             for e in self.materia_entries: e.delete(0, tk.END)
             self.curso_var.set(curso)
-            self.root.after(800, self.atualizar_combos)
-            self.combo_turma.bind("<<ComboboxSelected>>", self.sync_curso_from_turma)
 
         ttk.Button(frame_form, text="Adicionar", command=adicionar).grid(row=4, column=1, pady=10)
         tree = self.criar_tabela("materias")
@@ -729,28 +1470,33 @@ class SistemaAcademico:
             return messagebox.showerror("Erro", "Campos inválidos")
         valores = [v if v != "" else None for v in valores]
         payload = dict(zip(chaves, valores))
+        entidade_cache = entidade.split("_")[0] if "_" in entidade else entidade
         def callback(sucesso, dados, erro):
             if sucesso:
-                messagebox.showinfo("Sucesso", "Adicionado!")
-                self.get_dados(entidade.split("_")[0] if "_" in entidade else entidade, force_refresh=True)
+                self.mensagem_sucesso("Adicionado!", dados)
+                self.get_dados(entidade_cache, force_refresh=True)
             else:
                 messagebox.showerror("Erro", erro or "Falha")
-        url = f"{self.base_url}/{entidade}"
-        if entidade == "chatbot_respostas":
-            url = f"{self.base_url}/chatbot_respostas"
-        self.http_em_thread("POST", url, payload, callback)
+        self.enviar_mutacao("POST", f"/{entidade}", entidade_cache, payload, callback=callback)
 
     def alterar_entidade(self, entidade: str):
         tree = getattr(self, f"tree_{entidade}", None)
         if not tree or not tree.selection():
             return messagebox.showwarning("Atenção", "Selecione um item")
-        item = tree.selection()[0]
-        id_item = tree.item(item, "tags")[0]
-        valores = tree.item(item, "values")
+        id_item = tree.selection()[0]
         entidade_url = "chatbot_respostas" if entidade == "chatbot" else entidade
-        self.abrir_janela_alterar(entidade_url, valores, id_item)
-
-    def abrir_janela_alterar(self, entidade: str, valores: tuple, id_item: str):
+        chaves = self.get_colunas_e_chaves(entidade)["chaves"]
+        # os valores vêm da linha completa, não da tabela: lá descrição/resposta estão cortadas e salvar gravaria o corte
+        def abrir(linha, completa):
+            if linha is None:
+                return messagebox.showwarning("Atenção", "Registro não encontrado; atualize a tabela")
+            if not completa:
+                return messagebox.showerror("Erro", "Não foi possível carregar o texto completo do registro; tente novamente com o servidor disponível")
+            valores = tuple("" if linha.get(c) is None else str(linha[c]) for c in chaves)
+            self.abrir_janela_alterar(entidade_url, valores, id_item, linha)
+        self.buscar_detalhe(entidade, id_item, abrir)
+
+    def abrir_janela_alterar(self, entidade: str, valores: tuple, id_item: str, original=None):
         janela = tk.Toplevel(self.root)
         janela.title(f"Alterar {entidade.replace('_', ' ').title()}")
         janela.geometry("950x600")
@@ -761,6 +1507,8 @@ class SistemaAcademico:
         frame.pack(fill="both", expand=True)
         info = self.get_colunas_e_chaves(entidade.split("_")[0] if "_" in entidade else entidade)
         chaves = info["chaves"]
+        if original is None: # estado que o usuário está editando (a versão dele vai no If-Match)
+            original = self.linha_do_cache(entidade.split("_")[0] if "_" in entidade else entidade, id_item)
         entradas = []
         vars_dict = {}
         for i, (chave, valor) in enumerate(zip(chaves, valores)):
@@ -797,12 +1545,9 @@ class SistemaAcademico:
             # sincroniza curso ao selecionar turma na janela de alteração
         if "turma" in vars_dict and "curso_sigla" in vars_dict:
             def sync_curso(event=None):
-                sel_turma = vars_dict["turma"].get()
-                if sel_turma and self.cache_turmas:
-                    for t in self.cache_turmas:
-                        if t["turma"] == sel_turma:
-                            vars_dict["curso_sigla"].set(t["curso_sigla"])
-                            break
+                sigla = self.indices.curso_da_turma.get(vars_dict["turma"].get())
+                if sigla:
+                    vars_dict["curso_sigla"].set(sigla)
 
             combo_turma = next((e for e in entradas if isinstance(e, ttk.Combobox) and e.cget("textvariable") == str(vars_dict.get("turma"))), None)
             if combo_turma:
@@ -823,16 +1568,15 @@ class SistemaAcademico:
             if any(not novos[i] for i in obrigatorios):
                 return messagebox.showerror("Erro", "Preencha todos os campos obrigatórios")
             payload = dict(zip(chaves, novos))
+            entidade_cache = entidade.split("_")[0] if "_" in entidade else entidade
             def callback(sucesso, dados, erro):
                 if sucesso:
-                    messagebox.showinfo("Sucesso", "Alterado!")
+                    self.mensagem_sucesso("Alterado!", dados)
                     janela.destroy()
-                    self.get_dados(entidade.split("_")[0] if "_" in entidade else entidade, force_refresh=True)
+                    self.get_dados(entidade_cache, force_refresh=True)
                 else:
                     messagebox.showerror("Erro", erro or "Falha")
-            url = f"{self.base_url}/{entidade}/{id_item}"
-            if entidade == "chatbot_respostas": url = f"{self.base_url}/chatbot_respostas/{id_item}"
-            self.http_em_thread("PUT", url, payload, callback)
+            self.enviar_mutacao("PUT", f"/{entidade}/{id_item}", entidade_cache, payload, original, callback)
 
         btn_frame = ttk.Frame(frame)
         btn_frame.grid(row=len(chaves), column=0, columnspan=3, pady=20)
@@ -847,15 +1591,25 @@ class SistemaAcademico:
         selecionados = tree.selection()
         if not selecionados:
             return messagebox.showwarning("Atenção", "Selecione um item")
-        id_item = tree.item(selecionados[0], "tags")[0]
+        id_item = selecionados[0]
         if messagebox.askyesno("Confirmação", "Excluir permanentemente?"):
+            entidade_cache = entidade.split("_")[0] if "_" in entidade else entidade
+            # curso leva turmas, alunos e matérias junto: vai como tarefa em segundo plano, sem prender a requisição
+            cascata = entidade == "cursos"
             def callback(sucesso, dados, erro):
-                if sucesso:
-                    messagebox.showinfo("Sucesso", "Excluído!")
-                    self.get_dados(entidade.split("_")[0] if "_" in entidade else entidade, force_refresh=True)
-            url = f"{self.base_url}/{entidade}/{id_item}"
-            if entidade == "chatbot_respostas": url = f"{self.base_url}/chatbot_respostas/{id_item}"
-            self.http_em_thread("DELETE", url, callback=callback)
+                if cascata:
+                    self.tarefas_pedidas -= 1
+                if sucesso and isinstance(dados, dict) and dados.get("estado"): # tarefa aceita (202): roda no servidor
+                    self.acompanhar_tarefa(dados)
+                    messagebox.showinfo("Sucesso", "Exclusão iniciada; as tabelas se atualizam quando terminar.")
+                elif sucesso:
+                    self.mensagem_sucesso("Excluído!", dados)
+                    self.get_dados(entidade_cache, force_refresh=True)
+            original = self.linha_do_cache(entidade_cache, id_item)
+            caminho = f"/cursos/{id_item}/cascade" if cascata else f"/{entidade}/{id_item}"
+            if cascata:
+                self.tarefas_pedidas += 1
+            self.enviar_mutacao("DELETE", caminho, entidade_cache, original=original, callback=callback)
 
     def filtrar(self, entidade: str, termo: str):
         dados = getattr(self, f"cache_{entidade}", [])
@@ -868,21 +1622,85 @@ class SistemaAcademico:
             info = self.get_colunas_e_chaves(entidade)
             self.preencher_tabela(tree, dados, info["chaves"])
 
-    def http_em_thread(self, metodo, url, dados=None, callback=None):
+    # com_status=True: callback recebe também o status HTTP (None quando nem chegou ao servidor)
+    def http_em_thread(self, metodo, url, dados=None, callback=None, binario=None, com_status=False, cabecalhos=None):
+        if binario is None: # por padrão só as leituras usam o formato binário
+            binario = self.formato_binario and metodo == "GET"
         def tarefa():
+            status_code = None
+            espera = self.ocupado_ate - time.monotonic()
+            if espera > 0: # o servidor pediu para esperar: não adianta mandar antes
+                time.sleep(espera)
+            inicio = time.perf_counter()
             try:
                 headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
-                r = requests.request(metodo, url, json=dados or {}, headers=headers, timeout=10)
-                sucesso = r.status_code in (200, 201, 204)
-                resultado = r.json() if sucesso and r.text else {}
+                if binario:
+                    headers["Accept"] = f"{MIME_MSGPACK}, application/json;q=0.5"
+                if cabecalhos:
+                    headers.update(cabecalhos)
+                r = self.sessao_http().request(metodo, url, json=dados or {}, headers=headers, timeout=10)
+                recebido = time.perf_counter()
+                self.servidor_inacessivel = False
+                status_code = r.status_code
+                if status_code in STATUS_OCUPADO:
+                    self._servidor_ocupado(r.headers.get("Retry-After"))
+                else:
+                    self.recuo_ocupado = 0.0
+                sucesso = r.status_code in (200, 201, 202, 204)
+                if sucesso and r.headers.get("Content-Type", "").startswith(MIME_MSGPACK):
+                    resultado = msgpack.unpackb(r.content, raw=False)
+                else:
+                    resultado = r.json() if sucesso and r.text else {}
                 erro = r.json().get("detail") if not sucesso else None
+                decodificado = time.perf_counter()
+                rastro = (metodo, url, status_code, inicio, recebido, decodificado, r.headers.get("Server-Timing", ""))
                 if callback:
-                    self.root.after(0, callback, sucesso, resultado, erro) # atualiza UI no fluxo principal
+                    extra = (status_code,) if com_status else ()
+                    self.root.after(0, self._callback_medido, rastro, callback, sucesso, resultado, erro, *extra) # atualiza UI no fluxo principal
+                else:
+                    self._registrar_tempos(*rastro, decodificado)
             except Exception as e:
+                import requests
+                if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                    self.servidor_inacessivel = True
                 if callback:
-                    self.root.after(0, callback, False, None, str(e))
+                    extra = (status_code,) if com_status else ()
+                    self.root.after(0, callback, False, None, str(e), *extra)
         threading.Thread(target=tarefa, daemon=True).start() # fluxo não bloqueia a UI
 
+    # 429/503: as próximas requisições esperam o Retry-After ou o recuo, o que for maior; o recuo dobra a cada recusa
+    # seguida, então enquanto a sobrecarga durar o cliente insiste cada vez menos
+    def _servidor_ocupado(self, retry_after: str | None):
+        self.recuo_ocupado = min(self.recuo_ocupado * 2 or RECUO_OCUPADO_INICIAL, RECUO_OCUPADO_MAXIMO)
+        espera = max(ler_retry_after(retry_after) or 0.0, self.recuo_ocupado)
+        self.ocupado_ate = max(self.ocupado_ate, time.monotonic() + espera)
+
+    # roda o callback na thread da UI e registra quanto tempo a resposta esperou na fila do Tk e quanto o callback levou
+    def _callback_medido(self, rastro, callback, *args):
+        na_ui = time.perf_counter()
+        try:
+            callback(*args)
+        finally:
+            self._registrar_tempos(*rastro, na_ui, time.perf_counter())
+
+    # mesmo detalhamento do log de lentas do servidor, visto do cliente: onde foi parar o tempo de um "Carregando..."
+    def _registrar_tempos(self, metodo, url, status_code, inicio, recebido, decodificado, server_timing, na_ui, fim=None):
+        fim = fim or na_ui
+        total_ms = (fim - inicio) * 1000
+        if total_ms < REQUISICAO_LENTA_MS and not logger_lentas.isEnabledFor(logging.DEBUG):
+            return
+        servidor = ler_server_timing(server_timing)
+        http_ms = (recebido - inicio) * 1000
+        etapas = {
+            "rede": round(http_ms - servidor.get("total", 0.0), 1), # conexão, transferência e filas fora do handler
+            "servidor": servidor,
+            "decodificar": round((decodificado - recebido) * 1000, 1),
+            "fila_ui": round((na_ui - decodificado) * 1000, 1),
+            "callback": round((fim - na_ui) * 1000, 1),
+        }
+        nivel = logging.WARNING if total_ms >= REQUISICAO_LENTA_MS else logging.DEBUG
+        logger_lentas.log(nivel, f"{metodo} {urlparse(url).path} -> {status_code} em {total_ms:.0f} ms: {json.dumps(etapas, ensure_ascii=False)}")
+
     def mostrar_loading(self, texto="Carregando..."):
         if hasattr(self, "loading") and self.loading:
             return
@@ -902,7 +1720,30 @@ class SistemaAcademico:
             self.loading.destroy()
             self.loading = None
 
+# grava o perfil (formato collapsed) quando a janela de amostragem termina ou quando o programa fecha
+def gravar_perfil(amostrador, caminho):
+    amostrador.parar()
+    amostrador.salvar(caminho)
+    print(f"Perfil gravado em {caminho} ({amostrador.amostras} amostras)")
+
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Sistema Acadêmico")
+    parser.add_argument("--perfil", type=float, nargs="?", const=0, metavar="SEGUNDOS",
+                        help="amostra as pilhas do cliente (flamegraph); sem SEGUNDOS, até fechar a janela")
+    parser.add_argument("--perfil-saida", default=f"perfil_cliente_{time.strftime('%Y%m%d_%H%M%S')}.txt")
+    args = parser.parse_args()
+
+    amostrador = None
+    if args.perfil is not None:
+        from amostrador import Amostrador
+        amostrador = Amostrador()
+        amostrador.iniciar()
+
     root = tk.Tk()
     app = SistemaAcademico(root)
+    if amostrador and args.perfil > 0:
+        root.after(int(args.perfil * 1000), gravar_perfil, amostrador, args.perfil_saida)
     root.mainloop()
+    if amostrador and amostrador.ativo:
+        gravar_perfil(amostrador, args.perfil_saida)
@@ -0,0 +1,137 @@
+# Fila de tarefas em segundo plano: operações demoradas (exclusão em cascata, importações, relatórios) saem da
+# requisição HTTP. Quem pede recebe o id da tarefa na hora (202); um pool de threads com limite de simultâneas
+# executa, o progresso é repassado por callback (o servidor manda pelo Socket.IO) e o estado fica em /jobs/{id}.
+
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from admissao import Recusada
+from metricas import registro
+
+logger = logging.getLogger("servidor.tarefas")
+
+METRICA_TAREFAS = registro.contador("tarefas_total", "Tarefas em segundo plano terminadas", ("tipo", "resultado"))
+METRICA_DURACAO = registro.histograma("tarefa_segundos", "Duração das tarefas em segundo plano (sem a espera na fila)", ("tipo",),
+                                      buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0))
+
+ESTADOS_FINAIS = ("concluida", "falhou")
+
+
+class Tarefa:
+    def __init__(self, tipo: str, dono: str | None, campus: str):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.dono = dono
+        self.campus = campus
+        self.estado = "na_fila" # na_fila, executando, concluida, falhou
+        self.progresso = 0.0 # 0 a 1
+        self.mensagem = ""
+        self.resultado = None
+        self.erro = None
+        self.criada = time.time()
+        self.iniciada = None
+        self.terminada = None
+        self.avisado = 0.0 # time.monotonic() do último aviso de progresso
+
+    @property
+    def terminou(self) -> bool:
+        return self.estado in ESTADOS_FINAIS
+
+    def resumo(self) -> dict:
+        return {"id": self.id, "tipo": self.tipo, "estado": self.estado, "progresso": round(self.progresso, 3),
+                "mensagem": self.mensagem, "resultado": self.resultado, "erro": self.erro,
+                "criada": self.criada, "iniciada": self.iniciada, "terminada": self.terminada}
+
+
+class FilaTarefas:
+    # simultaneas: tarefas rodando ao mesmo tempo (cada uma costuma segurar uma conexão do banco); fila: quantas
+    # podem esperar (além disso, 503); guardar: quantas tarefas terminadas continuam consultáveis;
+    # ao_mudar(tarefa): chamado na thread da tarefa a cada mudança de estado e a cada aviso de progresso
+    def __init__(self, simultaneas: int, fila: int, guardar: int = 500, ao_mudar=None, intervalo_progresso: float = 0.25):
+        self.executor = ThreadPoolExecutor(max_workers=simultaneas, thread_name_prefix="tarefa")
+        self.fila = fila
+        self.guardar = guardar
+        self.ao_mudar = ao_mudar
+        self.intervalo_progresso = intervalo_progresso
+        self.tarefas = OrderedDict() # id -> Tarefa, na ordem de criação
+        self.lock = threading.Lock()
+        self.na_fila = 0
+        self.executando = 0
+        registro.medidor("tarefas", "Tarefas em segundo plano por estado", ("estado",),
+                         funcao=lambda: {"na_fila": self.na_fila, "executando": self.executando})
+
+    # funcao(progresso, *args) roda numa thread do pool no contexto (contextvars) de quem submeteu, então o campus
+    # e o usuário da requisição continuam valendo lá dentro; progresso(fracao, mensagem="") informa o andamento
+    def submeter(self, tipo: str, dono: str | None, campus: str, funcao, *args) -> Tarefa:
+        with self.lock:
+            if self.na_fila >= self.fila:
+                raise Recusada(503, "fila_tarefas_cheia", 5)
+            tarefa = Tarefa(tipo, dono, campus)
+            self.tarefas[tarefa.id] = tarefa
+            self.na_fila += 1
+            self._descartar_antigas()
+        contexto = contextvars.copy_context()
+        self.executor.submit(contexto.run, self._executar, tarefa, funcao, args)
+        return tarefa
+
+    def obter(self, tarefa_id: str) -> Tarefa | None:
+        return self.tarefas.get(tarefa_id)
+
+    def encerrar(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # só as terminadas saem (as mais antigas primeiro); as pendentes já são limitadas por `fila`
+    def _descartar_antigas(self):
+        excesso = len(self.tarefas) - self.guardar
+        if excesso <= 0:
+            return
+        for tarefa_id in [t.id for t in self.tarefas.values() if t.terminou][:excesso]:
+            del self.tarefas[tarefa_id]
+
+    def _executar(self, tarefa: Tarefa, funcao, args):
+        with self.lock:
+            self.na_fila -= 1
+            self.executando += 1
+        tarefa.estado = "executando"
+        tarefa.iniciada = time.time()
+        self._avisar(tarefa)
+        inicio = time.perf_counter()
+        estado = "falhou"
+        try:
+            tarefa.resultado = funcao(lambda fracao, mensagem="": self._progresso(tarefa, fracao, mensagem), *args)
+            tarefa.progresso = 1.0
+            estado = "concluida"
+        except Exception as e:
+            logger.exception(f"Tarefa {tarefa.tipo} {tarefa.id} falhou")
+            tarefa.erro = str(e) or e.__class__.__name__
+        finally:
+            tarefa.terminada = time.time()
+            METRICA_DURACAO.observe(time.perf_counter() - inicio, tipo=tarefa.tipo)
+            METRICA_TAREFAS.inc(tipo=tarefa.tipo, resultado=estado)
+            with self.lock:
+                self.executando -= 1
+            tarefa.estado = estado # por último: quem vê o estado final (ex.: /jobs/{id}) já vê o resto preenchido
+        self._avisar(tarefa)
+
+    # avisos de progresso limitados a um por intervalo_progresso (mudança de mensagem sempre avisa)
+    def _progresso(self, tarefa: Tarefa, fracao: float, mensagem: str):
+        tarefa.progresso = min(max(fracao, 0.0), 1.0)
+        agora = time.monotonic()
+        if mensagem == tarefa.mensagem and agora - tarefa.avisado < self.intervalo_progresso:
+            return
+        tarefa.mensagem = mensagem
+        tarefa.avisado = agora
+        self._avisar(tarefa)
+
+    def _avisar(self, tarefa: Tarefa):
+        if self.ao_mudar is None:
+            return
+        try:
+            self.ao_mudar(tarefa)
+        except Exception:
+            logger.exception("Falha ao avisar o andamento da tarefa")
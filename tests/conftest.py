@@ -0,0 +1,5 @@
+# os módulos do sistema ficam na raiz do repositório (sem pacote); deixa o pytest importá-los de qualquer pasta
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,93 @@
+# controle de admissão (admissao.py): baldes de tokens, limite por chave/global e comportas com fila
+import asyncio
+
+import pytest
+
+import admissao
+from admissao import BaldeTokens, Comporta, LimitadorTaxa, Recusada
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(admissao.time, "monotonic", relogio)
+    return relogio
+
+
+def test_balde_libera_a_rajada_e_depois_a_taxa(relogio):
+    balde = BaldeTokens(taxa=2, capacidade=3)
+    assert [balde.consumir() for _ in range(3)] == [0, 0, 0]
+    assert balde.consumir() == pytest.approx(0.5) # falta um token inteiro a 2 por segundo
+    relogio.agora += 0.5
+    assert balde.consumir() == 0
+    relogio.agora += 100 # parado muito tempo: não acumula além da capacidade
+    assert [balde.consumir() for _ in range(4)] == [0, 0, 0, pytest.approx(0.5)]
+
+
+def test_limite_por_chave_nao_afeta_outras_chaves(relogio):
+    limitador = LimitadorTaxa(taxa_chave=1, rajada_chave=2, taxa_global=100, rajada_global=100)
+    limitador.verificar("ana")
+    limitador.verificar("ana")
+    with pytest.raises(Recusada) as recusa:
+        limitador.verificar("ana")
+    assert (recusa.value.status, recusa.value.motivo, recusa.value.retry_after) == (429, "limite_usuario", 1)
+    limitador.verificar("bia")
+
+
+def test_limite_global_vale_para_todas_as_chaves(relogio):
+    limitador = LimitadorTaxa(taxa_chave=100, rajada_chave=100, taxa_global=1, rajada_global=2)
+    limitador.verificar("ana")
+    limitador.verificar("bia")
+    with pytest.raises(Recusada) as recusa:
+        limitador.verificar("caio")
+    assert recusa.value.motivo == "limite_global"
+
+
+def test_limitador_esquece_as_chaves_menos_usadas(relogio):
+    limitador = LimitadorTaxa(1, 1, 100, 100, max_chaves=2)
+    for chave in ("ana", "bia", "ana", "caio"):
+        relogio.agora += 10
+        limitador.verificar(chave)
+    assert list(limitador.baldes) == ["ana", "caio"]
+
+
+def test_retry_after_sempre_em_segundos_inteiros():
+    assert Recusada(429, "x", 0.01).retry_after == 1
+    assert Recusada(503, "x", 2.1).retry_after == 3
+
+
+def test_comporta_recusa_quem_nao_cabe_na_fila():
+    async def cenario():
+        comporta = Comporta("leitura", simultaneas=1, fila=1, espera_maxima=5)
+        await comporta.entrar()
+        na_fila = asyncio.ensure_future(comporta.entrar())
+        await asyncio.sleep(0)
+        assert (comporta.em_uso, comporta.aguardando) == (1, 1)
+        with pytest.raises(Recusada) as recusa:
+            await comporta.entrar()
+        assert (recusa.value.status, recusa.value.motivo) == (503, "fila_cheia")
+        comporta.sair() # libera a vez para quem estava na fila
+        await na_fila
+        assert (comporta.em_uso, comporta.aguardando) == (1, 0)
+        comporta.sair()
+        assert comporta.em_uso == 0
+    asyncio.run(cenario())
+
+
+def test_comporta_recusa_quem_espera_demais():
+    async def cenario():
+        comporta = Comporta("escrita", simultaneas=1, fila=5, espera_maxima=0.01)
+        await comporta.entrar()
+        with pytest.raises(Recusada) as recusa:
+            await comporta.entrar()
+        assert recusa.value.motivo == "espera_esgotada"
+        assert (comporta.em_uso, comporta.aguardando) == (1, 0)
+    asyncio.run(cenario())
@@ -0,0 +1,42 @@
+# buffer de reenvio dos eventos Socket.IO (eventos.py): numeração, lacunas e troca de época
+
+from eventos import BufferEventos
+
+
+def buffer_com(eventos: int, tamanho: int = 5) -> BufferEventos:
+    buffer = BufferEventos(tamanho, "epoca")
+    for i in range(eventos):
+        buffer.registrar(f"atualizar_{i}", {"n": i})
+    return buffer
+
+
+def test_registrar_numera_em_sequencia_sem_alterar_os_dados():
+    buffer = BufferEventos(5, "epoca")
+    original = {"n": 1}
+    assert buffer.registrar("atualizar_alunos", original) == {"n": 1, "seq": 1}
+    assert buffer.registrar("atualizar_cursos") == {"seq": 2}
+    assert original == {"n": 1}
+
+
+def test_desde_devolve_so_os_eventos_perdidos_na_ordem():
+    buffer = buffer_com(4)
+    assert buffer.desde(2, "epoca") == [{"evento": "atualizar_2", "n": 2, "seq": 3},
+                                        {"evento": "atualizar_3", "n": 3, "seq": 4}]
+
+
+def test_desde_em_dia_devolve_lista_vazia():
+    assert buffer_com(3).desde(3, "epoca") == []
+    assert BufferEventos(5, "epoca").desde(0, "epoca") == []
+
+
+def test_lacuna_maior_que_o_buffer_pede_recarga():
+    buffer = buffer_com(8, tamanho=5) # sobraram os seq 4..8
+    assert buffer.desde(2, "epoca") is None
+    assert [e["seq"] for e in buffer.desde(3, "epoca")] == [4, 5, 6, 7, 8]
+
+
+def test_outra_epoca_ou_seq_do_futuro_pede_recarga():
+    buffer = buffer_com(3)
+    assert buffer.desde(1, "outra") is None
+    assert buffer.desde(1, None) is None
+    assert buffer.desde(4, "epoca") is None
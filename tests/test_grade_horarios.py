@@ -0,0 +1,121 @@
+# grade de horários (grade_horarios.py): índice de intervalos contra força bruta, choques de lote e solver
+import random
+
+import pytest
+
+from grade_horarios import Aula, GradeHorarios, Horario, RECURSOS, _normalizar
+
+PROFESSORES = ["Ana", "Bruno", "Carla"]
+TURMAS = ["T1", "T2", "T3"]
+SALAS = ["101", "102", "Lab"]
+
+
+def horario_aleatorio(sorteio, id):
+    inicio = sorteio.randrange(7 * 60, 21 * 60, 10)
+    return Horario(id, sorteio.randint(1, 5), sorteio.choice(PROFESSORES), sorteio.choice(TURMAS),
+                   sorteio.choice(SALAS), sorteio.randint(1, 3), inicio, inicio + sorteio.choice([30, 50, 100, 120]))
+
+
+def choca(a, b, recurso):
+    return (a.id != b.id and a.dia_semana == b.dia_semana and a.inicio < b.fim and b.inicio < a.fim
+            and _normalizar(getattr(a, recurso)) == _normalizar(getattr(b, recurso)))
+
+
+# o que o índice deveria achar, comparando h com todos os horários
+def conflitos_forca_bruta(horarios, h):
+    return sorted((recurso, outro.id) for outro in horarios for recurso in RECURSOS if choca(h, outro, recurso))
+
+
+def resumo(conflitos):
+    return sorted((c["recurso"], c["com"]["id"]) for c in conflitos)
+
+
+@pytest.mark.parametrize("semente", range(5))
+def test_indice_igual_a_forca_bruta(semente):
+    sorteio = random.Random(semente)
+    horarios = {i: horario_aleatorio(sorteio, i) for i in range(1, 121)}
+    grade = GradeHorarios(list(horarios.values())[:60]) # metade na carga inicial, metade inserida uma a uma
+    for h in list(horarios.values())[60:]:
+        grade.adicionar(h)
+    for id in sorteio.sample(list(horarios), 40):
+        grade.remover(id)
+        del horarios[id]
+    for _ in range(200):
+        h = horario_aleatorio(sorteio, None)
+        assert resumo(grade.conflitos(h)) == conflitos_forca_bruta(horarios.values(), h)
+    for h in horarios.values(): # os que estão na grade: não chocam com eles mesmos
+        assert resumo(grade.conflitos(h)) == conflitos_forca_bruta(horarios.values(), h)
+
+
+def test_intervalos_semiabertos_e_mesmo_id():
+    grade = GradeHorarios([Horario(1, 1, "Ana", "T1", "101", 1, 480, 530)])
+    assert grade.conflitos(Horario(None, 2, "Ana", "T2", "102", 1, 530, 580)) == [] # começa quando o outro acaba
+    assert grade.conflitos(Horario(None, 2, "Ana", "T2", "102", 2, 480, 530)) == [] # outro dia
+    assert grade.conflitos(Horario(1, 1, "Ana", "T1", "101", 1, 500, 550)) == [] # alteração do próprio horário
+    choques = grade.conflitos(Horario(None, 2, "Ana", "T2", "102", 1, 529, 580))
+    assert [(c["recurso"], c["valor"], c["com"]["id"]) for c in choques] == [("professor", "Ana", 1)]
+
+
+def test_nomes_normalizados():
+    grade = GradeHorarios([Horario(1, 1, "Ana  Souza", "T1", "Sala 101", 1, 480, 530)])
+    choques = grade.conflitos(Horario(None, 2, "ana souza", "T2", " SALA  101 ", 1, 500, 550))
+    assert resumo(choques) == [("professor", 1), ("sala", 1)]
+    assert {c["valor"] for c in choques} == {"ana souza", " SALA  101 "} # devolve o nome como veio
+
+
+def test_conflitos_lote():
+    grade = GradeHorarios([Horario(1, 1, "Ana", "T1", "101", 1, 480, 530)])
+    novos = [Horario(None, 2, "Bruno", "T2", "101", 1, 500, 550), # sala com a grade
+             Horario(None, 3, "Bruno", "T3", "102", 1, 540, 600), # professor com o anterior do lote
+             Horario(None, 4, "Carla", "T3", "102", 2, 540, 600)] # outro dia: livre
+    choques = grade.conflitos_lote(novos)
+    assert [(c["posicao"], c["recurso"], c["com"].get("posicao"), c["com"]["id"]) for c in choques] == [
+        (0, "sala", None, 1), (1, "professor", 0, None)]
+    assert [(c["posicao"], c["recurso"]) for c in grade.conflitos_lote(novos, com_grade=False)] == [(1, "professor")]
+
+
+@pytest.mark.parametrize("semente", range(5))
+def test_conflitos_lote_igual_a_forca_bruta(semente):
+    sorteio = random.Random(semente)
+    novos = [horario_aleatorio(sorteio, None) for _ in range(80)]
+    choques = GradeHorarios().conflitos_lote(novos, com_grade=False)
+    numerados = [h._replace(id=p) for p, h in enumerate(novos)] # ids distintos para a força bruta
+    esperados = {(a.id, recurso) for a in numerados for b in numerados for recurso in RECURSOS if choca(a, b, recurso)}
+    # todo choque reportado é real; quem choca e não foi reportado (o primeiro pela ordem de início) aparece como
+    # o "com" de algum choque
+    achados = {(c["posicao"], c["recurso"]) for c in choques}
+    assert achados <= esperados
+    for c in choques:
+        assert choca(numerados[c["posicao"]], numerados[c["com"]["posicao"]], c["recurso"])
+    for p, recurso in esperados - achados: # quem não foi reportado é referência de outro choque
+        assert any(c["com"]["posicao"] == p and c["recurso"] == recurso for c in choques)
+
+
+def test_solver_sem_choques():
+    sorteio = random.Random(1)
+    grade = GradeHorarios([horario_aleatorio(sorteio, i) for i in range(1, 41)])
+    aulas = [Aula(sorteio.randint(1, 5), sorteio.choice(PROFESSORES), sorteio.choice(TURMAS), sorteio.choice([50, 100]))
+             for _ in range(30)]
+    propostas, sobras = grade.propor(aulas, [1, 2, 3, 4, 5], 7 * 60, 22 * 60, 10, SALAS)
+    assert len(propostas) + len(sobras) == len(aulas)
+    assert [p.id for p in propostas] == [-(i + 1) for i in range(len(propostas))]
+    for i, p in enumerate(propostas):
+        assert 7 * 60 <= p.inicio and p.fim <= 22 * 60 and (p.inicio - 7 * 60) % 10 == 0
+        assert p.dia_semana in [1, 2, 3, 4, 5] and p.sala in SALAS
+        assert grade.conflitos(p) == []
+        assert not any(choca(p, q, recurso) for q in propostas[:i] for recurso in RECURSOS)
+    assert grade.horarios.keys() == set(range(1, 41)) # propor não grava nada
+
+
+def test_solver_devolve_o_que_nao_cabe():
+    grade = GradeHorarios([Horario(1, 1, "Ana", "T1", "101", 1, 480, 600)])
+    aulas = [Aula(2, "Ana", "T2", 60), Aula(3, "Bruno", "T3", 60), Aula(4, "Bruno", "T4", 60)]
+    propostas, sobras = grade.propor(aulas, [1], 480, 660, 30, ["101"])
+    # Ana só fica livre às 10h; a sala 101 só tem 10h-11h: cabe uma aula, as outras duas sobram
+    assert [(p.inicio, p.fim, p.sala) for p in propostas] == [(600, 660, "101")]
+    assert len(sobras) == 2 and all(set(s) == set(Aula._fields) for s in sobras)
+
+
+def test_solver_espalha_a_materia_pelos_dias():
+    propostas, _ = GradeHorarios().propor([Aula(1, "Ana", "T1", 50)] * 3, [1, 2, 3], 480, 720, 10, ["101"])
+    assert sorted(p.dia_semana for p in propostas) == [1, 2, 3]
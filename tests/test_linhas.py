@@ -0,0 +1,54 @@
+# linhas compactas do cache do cliente (linhas.py): leitura como dict, internação e ida e volta pelo disco
+import json
+
+import pytest
+
+from linhas import Linha, compactar, de_colunas, para_colunas, tipo_linha
+
+COLUNAS = ("id", "aluno", "turma", "versao")
+
+
+def test_linha_le_como_dict_e_como_tupla():
+    linha = de_colunas(COLUNAS, [[1, "Ana", "T1", 7]])[0]
+    assert linha["aluno"] == "Ana" and linha[1] == "Ana"
+    assert linha.get("turma") == "T1" and linha.get("email") is None and linha.get("email", "-") == "-"
+    assert "versao" in linha and "Ana" not in linha # "in" procura nas colunas, como num dict
+    assert list(linha.keys()) == list(COLUNAS)
+    assert dict(linha.items()) == {"id": 1, "aluno": "Ana", "turma": "T1", "versao": 7}
+    assert dict(linha) == dict(linha.items())
+    with pytest.raises(KeyError):
+        linha["email"]
+
+
+def test_um_tipo_por_conjunto_de_colunas():
+    assert tipo_linha(COLUNAS) is tipo_linha(tuple(COLUNAS))
+    assert type(de_colunas(COLUNAS, [[1, "Ana", "T1", 7]])[0]) is tipo_linha(COLUNAS)
+
+
+def test_valores_repetidos_sao_internados():
+    turma_a, turma_b = "".join(["T", "1"]), "".join(["T", "1"]) # duas strings iguais, objetos diferentes
+    assert turma_a is not turma_b
+    a, b = de_colunas(COLUNAS, [[1, "Ana", turma_a, 1], [2, "Bia", turma_b, 1]])
+    assert a["turma"] is b["turma"]
+
+
+def test_compactar_aceita_dicts_e_linhas():
+    ja_compacta = de_colunas(COLUNAS, [[1, "Ana", "T1", 7]])
+    assert compactar(ja_compacta) is ja_compacta
+    misturadas = compactar([ja_compacta[0], {"id": 2, "aluno": "Bia", "turma": "T2", "versao": 8}])
+    assert all(isinstance(l, Linha) for l in misturadas)
+    assert [l["aluno"] for l in misturadas] == ["Ana", "Bia"]
+
+
+def test_para_colunas_ida_e_volta_pelo_json():
+    linhas = de_colunas(COLUNAS, [[1, "Ana", "T1", 7], [2, "Bia", None, 8]])
+    gravado = json.loads(json.dumps(para_colunas(linhas)))
+    assert gravado == {"cols": list(COLUNAS), "rows": [[1, "Ana", "T1", 7], [2, "Bia", None, 8]]}
+    assert de_colunas(gravado["cols"], gravado["rows"]) == linhas
+
+
+def test_para_colunas_usa_as_colunas_da_primeira_linha():
+    linhas = compactar([{"id": 1, "aluno": "Ana", "turma": "T1", "versao": 7},
+                        {"aluno": "Bia", "id": 2, "versao": 8}]) # outra ordem e sem turma (ex.: cache antigo)
+    assert para_colunas(linhas)["rows"] == [[1, "Ana", "T1", 7], [2, "Bia", None, 8]]
+    assert para_colunas([]) == {"cols": [], "rows": []}
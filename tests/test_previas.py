@@ -0,0 +1,40 @@
+# prévias das listagens no cliente (sistema.py): o que veio cortado é o que o servidor marcou em "cortados", e o
+# reenvio da fila offline compara a linha editada com a listagem atual sem tomar o corte por alteração
+from sistema import colunas_cortadas, mesma_linha, tem_previa
+
+COMPLETO = "Descrição longa " * 10
+CORTADO = COMPLETO[:77] + "..."
+
+
+def linha(descricao, cortados=None, versao=1):
+    return {"id": 1, "curso": "Computação", "descricao": descricao, "versao": versao, "cortados": cortados}
+
+
+def test_texto_no_limite_terminando_em_reticencias_nao_e_previa():
+    no_limite = "x" * 77 + "..." # mesmo formato de uma prévia, mas o servidor não marcou: é o texto real
+    assert not tem_previa(linha(no_limite))
+    assert tem_previa(linha(CORTADO, "descricao"))
+    assert colunas_cortadas(linha(CORTADO, "descricao,resposta")) == ["descricao", "resposta"]
+    assert colunas_cortadas(linha(no_limite)) == []
+    assert not tem_previa({"id": 1, "aluno": "Ana"}) # tabela sem prévia: nem tem a coluna
+
+
+def test_mesma_linha_com_o_detalhe_completo():
+    listada = linha(CORTADO, "descricao")
+    detalhe = {k: v for k, v in linha(COMPLETO).items() if k != "cortados"} # o detalhe não traz "cortados"
+    assert mesma_linha(detalhe, listada)
+    assert not mesma_linha({**detalhe, "descricao": "Outro texto " * 10}, listada)
+    assert not mesma_linha({**detalhe, "curso": "Direito"}, listada)
+
+
+def test_mesma_linha_com_a_linha_do_cache():
+    listada = linha(CORTADO, "descricao")
+    assert mesma_linha(linha(CORTADO, "descricao"), listada)
+    assert mesma_linha(linha(CORTADO), listada) # original guardado antes da marca: mesma prévia, mesma linha
+    assert not mesma_linha(linha(CORTADO, "descricao"), linha("Curto")) # texto encurtado por outra pessoa
+
+
+def test_texto_no_limite_comparado_por_inteiro():
+    no_limite = "x" * 77 + "..."
+    assert mesma_linha(linha(no_limite), linha(no_limite))
+    assert not mesma_linha(linha(no_limite), linha("x" * 78 + ".."))
@@ -0,0 +1,49 @@
+# 429/503 do controle de admissão no cliente (sistema.py): leitura do Retry-After e recuo entre as tentativas
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+from sistema import RECUO_OCUPADO_INICIAL, RECUO_OCUPADO_MAXIMO, SistemaAcademico, ler_retry_after
+
+
+def test_retry_after_em_segundos_ou_data():
+    assert ler_retry_after("2") == 2.0
+    assert ler_retry_after("0.5") == 0.5
+    assert ler_retry_after("-3") == 0.0
+    daqui_a_pouco = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < ler_retry_after(daqui_a_pouco) <= 30
+    assert ler_retry_after(format_datetime(datetime(2000, 1, 1, tzinfo=timezone.utc), usegmt=True)) == 0.0
+    assert ler_retry_after(None) is None and ler_retry_after("") is None and ler_retry_after("logo") is None
+
+
+def cliente():
+    return SimpleNamespace(ocupado_ate=0.0, recuo_ocupado=0.0)
+
+
+def test_espera_o_retry_after_quando_maior_que_o_recuo():
+    c = cliente()
+    SistemaAcademico._servidor_ocupado(c, "5")
+    assert c.recuo_ocupado == RECUO_OCUPADO_INICIAL
+    assert c.ocupado_ate - time.monotonic() == pytest.approx(5, abs=0.5)
+
+
+def test_recuo_dobra_a_cada_recusa_seguida_ate_o_maximo():
+    c = cliente()
+    recuos = []
+    for _ in range(10):
+        SistemaAcademico._servidor_ocupado(c, "1")
+        recuos.append(c.recuo_ocupado)
+    assert recuos[:4] == [1.0, 2.0, 4.0, 8.0] and recuos[-1] == RECUO_OCUPADO_MAXIMO
+    assert c.ocupado_ate - time.monotonic() == pytest.approx(RECUO_OCUPADO_MAXIMO, abs=0.5)
+
+
+def test_espera_nunca_encurta():
+    c = cliente()
+    SistemaAcademico._servidor_ocupado(c, "30")
+    ate = c.ocupado_ate
+    c.recuo_ocupado = 0.0 # uma resposta aceita no meio zera o recuo, mas não a espera já pedida
+    SistemaAcademico._servidor_ocupado(c, "1")
+    assert c.ocupado_ate == ate
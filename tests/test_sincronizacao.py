@@ -0,0 +1,146 @@
+# ?since= com transações concorrentes: quem pegou xid antes da listagem e só fez commit depois precisa voltar
+# na próxima sincronização; e as prévias das listagens. Roda contra um PostgreSQL de teste (TESTE_BANCO=1 mais
+# DB_NAME, DB_USER, DB_PASSWORD, DB_HOST e DB_PORT, como o servidor), num esquema próprio que é apagado no fim
+import asyncio
+import os
+import threading
+
+import pytest
+
+for _modulo in ("psycopg2", "fastapi", "pydantic", "socketio", "jose", "passlib", "dotenv", "uvicorn"):
+    pytest.importorskip(_modulo)
+if not os.getenv("TESTE_BANCO"):
+    pytest.skip("defina TESTE_BANCO=1 e as variáveis DB_* para rodar contra um PostgreSQL", allow_module_level=True)
+
+os.environ["CAMPI"] = "teste=teste_sincronizacao" # antes de importar o servidor
+os.environ.pop("DB_REPLICAS", None)
+
+import psycopg2
+import servidor
+
+
+@pytest.fixture(scope="module")
+def banco():
+    servidor.db_servidor.preparar()
+    yield
+    conn = psycopg2.connect(**servidor.db_config)
+    conn.autocommit = True
+    conn.cursor().execute("DROP SCHEMA teste_sincronizacao CASCADE")
+    conn.close()
+    for pool in servidor.pools.values():
+        pool.closeall()
+
+
+# outra conexão, fora do pool: faz o papel de uma requisição (ou tarefa) concorrente
+@pytest.fixture
+def outra_conexao(banco):
+    conn = psycopg2.connect(**servidor.config_campus(servidor.db_config, "teste"))
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+def listar(since=None, tabela="chatbot_respostas", colunas=servidor.COLUNAS_CHATBOT, ordem="pergunta"):
+    dados, extras = servidor.consultar_lista(tabela, colunas, ordem, since)
+    return {d[0] for d in dados}, extras
+
+
+def inserir(pergunta: str) -> int:
+    with servidor.db_servidor.transacao() as executar:
+        return executar("INSERT INTO chatbot_respostas (pergunta, resposta) VALUES (%s, 'r') RETURNING id", (pergunta,))[0][0]
+
+
+def test_insercao_com_commit_depois_da_listagem_volta_no_since(outra_conexao):
+    cursor = outra_conexao.cursor()
+    cursor.execute("INSERT INTO chatbot_respostas (pergunta, resposta) VALUES ('lenta', 'r') RETURNING id")
+    lenta = cursor.fetchone()[0]
+    ids, extras = listar()
+    assert lenta not in ids
+    rapida = inserir("rapida") # xid maior, commit antes da lenta
+    outra_conexao.commit()
+
+    ids, _ = listar(extras["versao"])
+    assert {lenta, rapida} <= ids
+
+
+def test_exclusao_com_commit_depois_da_listagem_volta_no_since(outra_conexao):
+    alvo = inserir("alvo")
+    _, extras = listar()
+    cursor = outra_conexao.cursor()
+    cursor.execute("DELETE FROM chatbot_respostas WHERE id = %s", (alvo,))
+    _, intermediaria = listar(extras["versao"]) # exclusão ainda não confirmada: a marca não passa dela
+    inserir("depois")
+    outra_conexao.commit()
+
+    _, extras = listar(intermediaria["versao"])
+    assert alvo in extras["excluidos"]
+
+
+def test_since_sem_concorrencia_nao_repete_o_que_ja_foi_enviado(banco):
+    inserir("antiga")
+    ids, extras = listar()
+    nova = inserir("nova")
+
+    ids, _ = listar(extras["versao"])
+    assert ids == {nova}
+
+
+# a exclusão em cascata é uma transação longa: as exclusões das primeiras turmas acontecem bem antes do commit
+def test_exclusao_em_cascata_volta_no_since_mesmo_com_listagens_no_meio(banco):
+    with servidor.db_servidor.transacao() as executar:
+        executar("INSERT INTO cursos (curso, sigla, area) VALUES ('Cascata', 'CSC', 'Teste')")
+        for turma in ("CSC1", "CSC2"):
+            executar("INSERT INTO turmas (turma, curso_sigla) VALUES (%s, 'CSC')", (turma,))
+            executar("INSERT INTO materias (materia, professor, email, curso_sigla, turma) VALUES (%s, 'P', 'p@x', 'CSC', %s)",
+                     (f"Materia {turma}", turma))
+        curso_id = executar("SELECT id FROM cursos WHERE sigla = 'CSC'")[0][0]
+    materias, _ = listar(tabela="materias", colunas=servidor.COLUNAS_MATERIAS, ordem="materia")
+
+    loop = asyncio.new_event_loop() # a tarefa emite os eventos no loop do servidor
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    servidor.loop_principal = loop
+    na_primeira_turma, continuar = threading.Event(), threading.Event()
+    def progresso(fracao, mensagem):
+        na_primeira_turma.set()
+        continuar.wait(10)
+    tarefa = threading.Thread(target=servidor.excluir_curso_cascata, args=(progresso, curso_id, None))
+    tarefa.start()
+    try:
+        assert na_primeira_turma.wait(10)
+        _, meio = listar(tabela="materias", colunas=servidor.COLUNAS_MATERIAS, ordem="materia")
+        inserir("durante a cascata")
+    finally:
+        continuar.set()
+        tarefa.join(10)
+        loop.call_soon_threadsafe(loop.stop)
+
+    _, extras = listar(meio["versao"], tabela="materias", colunas=servidor.COLUNAS_MATERIAS, ordem="materia")
+    assert materias <= set(extras["excluidos"])
+
+
+def test_marca_anterior_as_exclusoes_apagadas_recebe_a_tabela_inteira(banco):
+    alvo = inserir("excluida faz tempo")
+    _, extras = listar()
+    servidor.db_servidor.executar("DELETE FROM chatbot_respostas WHERE id = %s", (alvo,))
+    servidor.db_servidor.executar("UPDATE exclusoes SET excluido_em = now() - interval '400 days' "
+                                  "WHERE tabela = 'chatbot_respostas' AND registro_id = %s", (alvo,))
+    assert servidor.db_servidor.limpar_exclusoes() >= 1
+
+    ids, depois = listar(extras["versao"])
+    assert depois.get("completo") and alvo not in ids
+    _, seguinte = listar(depois["versao"])
+    assert not seguinte.get("completo")
+
+
+# prévias: no limite exato o texto vem inteiro (mesmo terminando em "..."); um caractere a mais e vem cortado e marcado
+def test_listagem_marca_as_colunas_cortadas(banco):
+    no_limite, passou = "x" * 97 + "...", "y" * 101
+    with servidor.db_servidor.transacao() as executar:
+        ids = [executar("INSERT INTO chatbot_respostas (pergunta, resposta) VALUES ('previa', %s) RETURNING id", (texto,))[0][0]
+               for texto in (no_limite, passou)]
+    dados, _ = servidor.consultar_lista("chatbot_respostas", servidor.COLUNAS_CHATBOT, "pergunta")
+    colunas = servidor.colunas_lista(servidor.COLUNAS_CHATBOT)
+    linhas = {linha["id"]: linha for linha in (dict(zip(colunas, d)) for d in dados)}
+    inteira, cortada = linhas[ids[0]], linhas[ids[1]]
+    assert inteira["resposta"] == no_limite and inteira["cortados"] is None
+    assert cortada["resposta"] == "y" * 97 + "..." and cortada["cortados"] == "resposta"
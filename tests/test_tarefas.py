@@ -0,0 +1,94 @@
+# fila de tarefas em segundo plano (tarefas.py): estados, contexto de quem pediu, fila cheia e avisos de progresso
+import contextvars
+import threading
+import time
+
+import pytest
+
+from admissao import Recusada
+from tarefas import FilaTarefas
+
+campus_teste = contextvars.ContextVar("campus_teste", default=None)
+
+
+def esperar(tarefa, limite=5.0):
+    fim = time.monotonic() + limite
+    while not tarefa.terminou:
+        assert time.monotonic() < fim, f"tarefa {tarefa.tipo} não terminou"
+        time.sleep(0.005)
+    return tarefa
+
+
+@pytest.fixture
+def filas():
+    criadas = []
+    def criar(*args, **kwargs):
+        criadas.append(FilaTarefas(*args, **kwargs))
+        return criadas[-1]
+    yield criar
+    for fila in criadas:
+        fila.encerrar()
+
+
+def test_tarefa_concluida_guarda_o_resultado(filas):
+    fila = filas(1, 10)
+    tarefa = esperar(fila.submeter("somar", "ana", "central", lambda progresso, a, b: a + b, 2, 3))
+    assert (tarefa.estado, tarefa.resultado, tarefa.progresso, tarefa.erro) == ("concluida", 5, 1.0, None)
+    assert fila.obter(tarefa.id) is tarefa
+    assert tarefa.resumo()["estado"] == "concluida" and tarefa.terminada >= tarefa.iniciada >= tarefa.criada
+
+
+def test_tarefa_com_erro_termina_como_falhou(filas):
+    def falhar(progresso):
+        raise ValueError("Curso não encontrado")
+    tarefa = esperar(filas(1, 10).submeter("excluir", "ana", "central", falhar))
+    assert (tarefa.estado, tarefa.erro, tarefa.resultado) == ("falhou", "Curso não encontrado", None)
+
+
+def test_funcao_roda_no_contexto_de_quem_submeteu(filas):
+    fila = filas(1, 10)
+    campus_teste.set("norte")
+    tarefa = esperar(fila.submeter("ler", "ana", "norte", lambda progresso: campus_teste.get()))
+    assert tarefa.resultado == "norte"
+
+
+def test_fila_cheia_recusa_com_503(filas):
+    fila = filas(1, 1)
+    comecou, liberar = threading.Event(), threading.Event()
+    def segurar(progresso):
+        comecou.set()
+        liberar.wait(5)
+    primeira = fila.submeter("segurar", "ana", "central", segurar)
+    assert comecou.wait(5) # a primeira já saiu da fila e está executando
+    segunda = fila.submeter("segurar", "ana", "central", segurar)
+    with pytest.raises(Recusada) as recusa:
+        fila.submeter("segurar", "ana", "central", segurar)
+    assert (recusa.value.status, recusa.value.motivo) == (503, "fila_tarefas_cheia")
+    liberar.set()
+    assert esperar(primeira).estado == esperar(segunda).estado == "concluida"
+    assert (fila.na_fila, fila.executando) == (0, 0)
+
+
+def test_avisos_de_progresso_limitados_por_intervalo(filas):
+    avisos = []
+    fila = filas(1, 10, ao_mudar=lambda t: avisos.append((t.estado, t.mensagem)), intervalo_progresso=60)
+    def trabalhar(progresso):
+        for fracao in (0.1, 0.2, 0.3):
+            progresso(fracao, "Turma 1 de 2")
+        progresso(0.6, "Turma 2 de 2") # mensagem nova sempre avisa
+        progresso(2.0, "Turma 2 de 2")
+    tarefa = esperar(fila.submeter("cascata", "ana", "central", trabalhar))
+    fim = time.monotonic() + 5
+    while len(avisos) < 4 and time.monotonic() < fim: # o último aviso sai logo depois de marcar como terminada
+        time.sleep(0.005)
+    assert avisos == [("executando", ""), ("executando", "Turma 1 de 2"), ("executando", "Turma 2 de 2"),
+                      ("concluida", "Turma 2 de 2")]
+    assert tarefa.progresso == 1.0
+
+
+def test_so_as_terminadas_mais_antigas_sao_descartadas(filas):
+    fila = filas(1, 10, guardar=2)
+    antigas = [esperar(fila.submeter("t", "ana", "central", lambda progresso: None)) for _ in range(2)]
+    nova = esperar(fila.submeter("t", "ana", "central", lambda progresso: None))
+    assert fila.obter(antigas[0].id) is None
+    assert fila.obter(antigas[1].id) is antigas[1] and fila.obter(nova.id) is nova
@@ -0,0 +1,90 @@
+# Vigia do event loop do asyncio: mede o atraso (lag) continuamente e, quando o loop fica travado
+# além do limite, captura a pilha de quem está bloqueando (psycopg2, bcrypt, ... chamados dentro de async def).
+
+import asyncio
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+
+from metricas import registro
+
+logger = logging.getLogger("servidor.loop")
+
+# arquivos que não contam como "origem" do bloqueio: biblioteca padrão, pacotes instalados e o próprio vigia
+_IGNORAR = (os.path.normcase(sysconfig.get_paths()["stdlib"]), "site-packages", "dist-packages", "vigia_loop.py")
+
+METRICA_LAG = registro.histograma("event_loop_lag_segundos", "Atraso do event loop (quanto um sleep passou do previsto)",
+                                  buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+METRICA_BLOQUEIOS = registro.contador("event_loop_bloqueios_total", "Vezes que o event loop ficou travado acima do limite",
+                                      ("origem",))
+METRICA_MAIOR_BLOQUEIO = registro.medidor("event_loop_maior_bloqueio_segundos", "Maior bloqueio do event loop desde o início")
+
+
+class VigiaEventLoop:
+    # intervalo: de quanto em quanto tempo o loop marca presença; limite: a partir de quando conta como bloqueio
+    def __init__(self, intervalo: float = 0.1, limite: float = 0.25):
+        self.intervalo = intervalo
+        self.limite = limite
+        self.batida = time.monotonic() # última vez que o loop rodou a tarefa de marcação
+        self.thread_loop = None
+        self.tarefa = None
+        self.parar = threading.Event()
+        self.maior = 0.0
+
+    # chamado de dentro do loop (evento de startup)
+    def iniciar(self):
+        self.thread_loop = threading.get_ident()
+        self.batida = time.monotonic()
+        self.tarefa = asyncio.get_running_loop().create_task(self._marcar())
+        threading.Thread(target=self._vigiar, name="vigia-loop", daemon=True).start()
+        logger.info(f"Vigia do event loop ativo (limite {self.limite * 1000:.0f} ms)")
+
+    def encerrar(self):
+        self.parar.set()
+        if self.tarefa:
+            self.tarefa.cancel()
+
+    # tarefa no loop: dorme o intervalo e mede quanto passou do previsto
+    async def _marcar(self):
+        while True:
+            antes = time.monotonic()
+            await asyncio.sleep(self.intervalo)
+            agora = time.monotonic()
+            lag = max(0.0, agora - antes - self.intervalo)
+            self.batida = agora
+            METRICA_LAG.observe(lag)
+            self._anotar_maior(lag)
+
+    def _anotar_maior(self, segundos: float):
+        if segundos > self.maior:
+            self.maior = segundos
+            METRICA_MAIOR_BLOQUEIO.set(segundos)
+
+    # thread separada: se a última batida ficou velha, o loop está preso; fotografa a pilha da thread do loop
+    def _vigiar(self):
+        ultima_capturada = None # uma captura por bloqueio, não uma a cada volta
+        while not self.parar.wait(self.intervalo):
+            batida = self.batida
+            parado = time.monotonic() - batida
+            if parado < self.limite or batida == ultima_capturada:
+                continue
+            ultima_capturada = batida
+            frame = sys._current_frames().get(self.thread_loop)
+            pilha = "".join(traceback.format_stack(frame)) if frame is not None else "(pilha indisponível)"
+            METRICA_BLOQUEIOS.inc(origem=self._origem(frame))
+            self._anotar_maior(parado)
+            logger.warning(f"Event loop travado há {parado * 1000:.0f} ms; pilha da thread do loop:\n{pilha}")
+
+    # frame mais interno do código da aplicação (arquivo:função), para agrupar nas métricas
+    @staticmethod
+    def _origem(frame) -> str:
+        while frame is not None:
+            arquivo = os.path.normcase(frame.f_code.co_filename)
+            if not any(ignorar in arquivo for ignorar in _IGNORAR):
+                return f"{os.path.basename(arquivo)}:{frame.f_code.co_name}"
+            frame = frame.f_back
+        return "desconhecida"